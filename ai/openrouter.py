@@ -1,25 +1,133 @@
 # ai/openrouter.py
+"""
+Cliente de OpenRouter compartido por el proceso.
+
+Una única aiohttp.ClientSession con pool de conexiones (sin handshake TLS por
+llamada), un plazo total (`deadline`, en tiempo del event loop) que baja por
+todas las capas de reintentos en vez de timeouts apilados, y un circuit
+breaker que responde "" al momento mientras el proveedor está caído.
+"""
 import aiohttp
-import json
+import asyncio
+import statistics
+import time
+from collections import deque
 from config import OPENROUTER_CONFIG
 from logger import logger
-import asyncio
- 
-async def get_deepseek_response(prompt: str, image_url: str = None) -> str:
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_CONFIG['key']}",
-        "Content-Type": "application/json",
-        "User-Agent": "gm-bot/1.0"
-    }
 
+REQUEST_TIMEOUT   = 60.0   # Tope por petición si no hay deadline
+KEEPALIVE_SECS    = 60.0
+MAX_CONNECTIONS   = 4
+
+BREAKER_THRESHOLD = 3      # Fallos seguidos que abren el circuito
+BREAKER_COOLDOWN  = 60.0   # Segundos abierto antes de dejar pasar una petición de prueba
+
+_session: aiohttp.ClientSession | None = None
+_latencies: deque = deque(maxlen=200)
+_counters = {"ok": 0, "failed": 0, "short_circuited": 0}
+
+
+class CircuitBreaker:
+    """closed → (N fallos) → open → (cooldown) → half-open: una petición decide."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("[OpenRouter] ✅ Circuito cerrado, el proveedor responde de nuevo")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"[OpenRouter] ⚡ Circuito abierto tras {self.failures} fallos seguidos")
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """La petición de prueba no llegó a decidir (cancelada): otra puede probar."""
+        self._probing = False
+
+
+_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Devuelve la sesión del proceso, creándola en el primer uso."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=KEEPALIVE_SECS),
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_CONFIG['key']}",
+                "User-Agent": "gm-bot/1.0",
+            },
+        )
+    return _session
+
+
+async def close_openrouter() -> None:
+    """Cierra la sesión compartida (llamar al apagar la aplicación)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def deadline_in(seconds: float) -> float:
+    """Deadline absoluto (reloj del event loop) a `seconds` de ahora."""
+    return asyncio.get_running_loop().time() + seconds
+
+
+def _remaining(deadline: float | None) -> float:
+    if deadline is None:
+        return REQUEST_TIMEOUT
+    return min(REQUEST_TIMEOUT, deadline - asyncio.get_running_loop().time())
+
+
+def get_openrouter_stats() -> dict:
+    """Contadores, estado del circuito y percentiles de latencia (s) de las últimas peticiones."""
+    stats = {**_counters, "breaker": _breaker.state}
+    if len(_latencies) >= 2:
+        q = statistics.quantiles(_latencies, n=100, method="inclusive")
+        stats.update(p50=round(q[49], 3), p95=round(q[94], 3), p99=round(q[98], 3))
+    return stats
+
+
+async def get_deepseek_response(prompt: str, image_url: str = None, deadline: float | None = None) -> str:
     content = [{"type": "text", "text": prompt}]
     if image_url:
         # ✅ Si es solo base64, construir el data URI
         if not image_url.startswith("data:") and not image_url.startswith("http"):
             image_url = f"data:image/jpeg;base64,{image_url}"
-        
+
         content.append({
-            "type": "image_url", 
+            "type": "image_url",
             "image_url": {"url": image_url}
         })
 
@@ -29,36 +137,79 @@ async def get_deepseek_response(prompt: str, image_url: str = None) -> str:
         "messages": messages,
         "model": OPENROUTER_CONFIG["model"]
     }
-    
+
+    remaining = _remaining(deadline)
+    if remaining <= 0:
+        logger.warning("[OpenRouter] ⏱️ Deadline agotado, no se lanza la petición")
+        return ""
+    if not _breaker.allow():
+        _counters["short_circuited"] += 1
+        logger.debug("[OpenRouter] Circuito abierto, respuesta vacía inmediata")
+        return ""
+
+    started = time.monotonic()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(OPENROUTER_CONFIG["url"], headers=headers, json=payload, timeout=60) as response:
-                data = await response.json()
-                if response.status == 200 and data.get("choices"):
-                    return data["choices"][0]["message"]["content"]
-                logger.error("Respuesta inválida o vacía: %s", data)
-                return ""
+        session = get_session()
+        async with session.post(
+            OPENROUTER_CONFIG["url"], json=payload,
+            timeout=aiohttp.ClientTimeout(total=remaining),
+        ) as response:
+            data = await response.json(content_type=None)
+    except asyncio.CancelledError:
+        # Cancelada por quien llama (wait_for, shutdown): no es un fallo del proveedor,
+        # pero si era la petición de prueba hay que liberar el half-open
+        _breaker.release_probe()
+        raise
     except Exception as e:
-        logger.error(f"Error en get_deepseek_response: {str(e)}")
+        _breaker.record_failure()
+        _counters["failed"] += 1
+        logger.error(f"Error en get_deepseek_response: {type(e).__name__}: {e}")
+        return ""
+    finally:
+        _latencies.append(time.monotonic() - started)
+
+    if response.status == 429 or response.status >= 500:
+        _breaker.record_failure()
+        _counters["failed"] += 1
+        logger.error("Respuesta de error %s: %s", response.status, data)
         return ""
 
-async def obtener_respuesta_con_reintentos(prompt, image_url=None, max_reintentos=2):
+    _breaker.record_success()
+    _counters["ok"] += 1
+    if response.status == 200 and data.get("choices"):
+        return data["choices"][0]["message"]["content"]
+    logger.error("Respuesta inválida o vacía: %s", data)
+    return ""
+
+async def obtener_respuesta_con_reintentos(prompt, image_url=None, max_reintentos=2, deadline: float | None = None):
     """
     Obtiene respuesta con reintentos RÁPIDOS (sin bloquear el bot)
-    Solo 2 intentos: inmediato y 3 segundos después
+    Solo 2 intentos: inmediato y 5 segundos después.
+    Todos comparten `deadline`: no se espera ni reintenta si ya no queda tiempo.
     """
-    tiempos_espera = [0, 5]  # 0s, 5s
+    tiempos_espera = [0, 5][:max_reintentos]  # 0s, 5s
     for intento, espera in enumerate(tiempos_espera, start=1):
         if espera > 0:
+            if _remaining(deadline) <= espera:
+                logger.warning("⏱️ Sin tiempo para otro intento antes del deadline.")
+                break
+            if _breaker.state == "open":
+                logger.warning("⚡ Proveedor caído (circuito abierto), no se reintenta.")
+                break
             logger.info(f"⏳ Reintentando en {espera} segundos...")
             await asyncio.sleep(espera)
 
-        respuesta = await get_deepseek_response(prompt, image_url)
+        respuesta = await get_deepseek_response(prompt, image_url, deadline=deadline)
 
         if respuesta and len(respuesta.strip()) > 10:
             return respuesta
 
         logger.warning(f"⚠️ Intento {intento} fallido. Respuesta: {respuesta[:100] if respuesta else 'vacía'}")
-    
+
     logger.error("❌ Todos los intentos fallaron.")
     return ""
+
+
+def is_available() -> bool:
+    """False mientras el circuito está abierto (el llamador puede saltarse el LLM)."""
+    return _breaker.state != "open"
@@ -1,15 +1,41 @@
 # bot/app.py
+"""
+Construcción de la aplicación de Telegram y registro de jobs.
+
+Arranque rápido: construir la app no importa el scheduler (ni con él el
+scraper, los parsers y el resto de servicios). Se importa en post_init,
+tras las migraciones de la DB, para que el primer job no cargue con ese
+coste. Selenium, BeautifulSoup, aiohttp y el cliente de OpenRouter siguen
+cargándose solo al usarse.
+"""
+import importlib
+import sys
+import time
+
 from telegram import LinkPreviewOptions
 from telegram import Update
 from telegram.ext import Application, ApplicationBuilder, Defaults, ContextTypes
 from telegram.request import HTTPXRequest
 from telegram.error import NetworkError
-from config import API_TOKEN
-from services.gasolina_scheduler import run_gasolina_daily, run_gasolina_update, run_gasolina_weekly_summary, run_gasolina_monthly_summary
+from config import API_TOKEN, X_REAPER_INTERVAL
+from services.http_client import close_client
+from services.gasolina_db import init_db, close_db
+from services.gasolina_state import flush_state
 from logger import logger
 from datetime import time as dtime
+import asyncio
 import pytz
 
+_SCHEDULER = "services.gasolina_scheduler"
+
+
+def _job(name: str, module: str = _SCHEDULER):
+    """Callback de job que resuelve `module.name` al ejecutarse (el scheduler ya está cargado desde post_init)."""
+    async def job(ctx) -> None:
+        await getattr(importlib.import_module(module), name)(ctx)
+    job.__name__ = job.__qualname__ = name
+    return job
+
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Log the Errors, but ignore transient NetworkErrors to reduce noise."""
@@ -19,6 +45,31 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     # Para otros errores, registrar en el log
     logger.error("Exception while handling an update:", exc_info=context.error)
 
+async def _post_init(app: Application) -> None:
+    """Migraciones de la DB, una sola vez y ya con el bot arrancado, y carga del scheduler."""
+    t0 = time.perf_counter()
+    init_db()
+    logger.info(f"[Arranque] DB inicializada en {time.perf_counter() - t0:.3f}s")
+    t0 = time.perf_counter()
+    importlib.import_module(_SCHEDULER)
+    logger.info(f"[Arranque] {_SCHEDULER} cargado en {time.perf_counter() - t0:.2f}s")
+
+
+async def _post_shutdown(app: Application) -> None:
+    """Persiste el estado pendiente y libera los clientes HTTP, el navegador de X y la conexión a la DB."""
+    flush_state()
+    await close_client()
+    # Solo lo que llegó a cargarse: no importar Selenium/aiohttp para cerrarlos
+    if "ai.openrouter" in sys.modules:
+        await sys.modules["ai.openrouter"].close_openrouter()
+    if "publishers.x_publisher" in sys.modules:
+        await sys.modules["publishers.x_publisher"].close_x_queue()
+    if "services.x_browser" in sys.modules:
+        await asyncio.to_thread(sys.modules["services.x_browser"].close_browser)
+    if "services.x_resources" in sys.modules:
+        sys.modules["services.x_resources"].close_display()
+    close_db()
+
 def build_app() -> Application:
     request = HTTPXRequest(
         connection_pool_size=10, read_timeout=30.0,
@@ -26,13 +77,21 @@ def build_app() -> Application:
         pool_timeout=5.0, http_version="1.1"
     )
     defaults = Defaults(link_preview_options=LinkPreviewOptions(is_disabled=True))
-    app = ApplicationBuilder().token(API_TOKEN).request(request).defaults(defaults).build()
+    app = (
+        ApplicationBuilder()
+        .token(API_TOKEN)
+        .request(request)
+        .defaults(defaults)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     madrid = pytz.timezone("Europe/Madrid")
 
     # ── Job diario 10:10 — envío inicial ──────────────────────
     app.job_queue.run_daily(
-        run_gasolina_daily,
+        _job("run_gasolina_daily"),
         time=dtime(10, 10, tzinfo=madrid),
         name="gasolina_daily",
     )
@@ -41,15 +100,22 @@ def build_app() -> Application:
     update_hours = list(range(11, 24)) + list(range(0, 10))  # 11→23 + 00→09
     for hour in update_hours:
         app.job_queue.run_daily(
-            run_gasolina_update,
+            _job("run_gasolina_update"),
             time=dtime(hour, 10, tzinfo=madrid),
             name=f"gasolina_update_{hour:02d}",
         )
 
+    # ── Dataset nacional 09:50 — ingesta completa ─────────────
+    app.job_queue.run_daily(
+        _job("run_gasolina_dataset"),
+        time=dtime(9, 50, tzinfo=madrid),
+        name="gasolina_dataset",
+    )
+
     # ── Resúmenes Estadísticos ────────────────────────────────
     # Resumen semanal: Domingos a las 20:00 (days=(0,) en python-telegram-bot: 0=domingo, 6=sábado)
     app.job_queue.run_daily(
-        run_gasolina_weekly_summary,
+        _job("run_gasolina_weekly_summary"),
         time=dtime(20, 0, tzinfo=madrid),
         days=(0,),
         name="gasolina_weekly_summary",
@@ -59,10 +125,18 @@ def build_app() -> Application:
     # python-telegram-bot run_monthly está disponible en v20+ o ejecutamos daily y filtramos dentro del job
     # run_gasolina_monthly_summary ya filtra internamente si es día 1, así que lo ejecutamos a diario a las 08:00
     app.job_queue.run_daily(
-        run_gasolina_monthly_summary,
+        _job("run_gasolina_monthly_summary"),
         time=dtime(8, 0, tzinfo=madrid),
         name="gasolina_monthly_summary",
     )
+    # ── Limpieza de X: navegador/display inactivos y procesos huérfanos ──
+    app.job_queue.run_repeating(
+        _job("run_x_reaper", "services.x_resources"),
+        interval=X_REAPER_INTERVAL,
+        first=X_REAPER_INTERVAL,
+        name="x_reaper",
+    )
+
     app.add_error_handler(error_handler)
 
     return app
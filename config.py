@@ -15,6 +15,37 @@ OPENROUTER_CONFIG = {
     "model": os.getenv("OPENROUTER_MODEL_ID")
 }
 
+# Caché persistente de textos acortados con el LLM (ver services/llm_cache.py)
+LLM_CACHE_TTL_DAYS = int(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+
+### SCRAPER
+# Backend de parseo HTML: "lxml" (rápido) o "bs4" (BeautifulSoup/html.parser)
+SCRAPER_PARSER = os.getenv("SCRAPER_PARSER", "lxml").strip().lower()
+
+# Registro de ciudades y gasolineras a seguir (JSON). Si no existe se usa Zaragoza.
+CITIES_FILE = os.getenv("CITIES_FILE", join(dirname(__file__), "data", "ciudades.json"))
+
+# Límite global de peticiones simultáneas del scraper (además del límite por host)
+SCRAPER_MAX_CONCURRENCY = int(os.getenv("SCRAPER_MAX_CONCURRENCY", "16"))
+
+# FlareSolverr como respaldo cuando la web sirve un challenge. Desactivado salvo que se
+# configure, p.ej. http://localhost:8191/v1 con el servicio de docker-compose.yml
+FLARESOLVERR_URL = os.getenv("FLARESOLVERR_URL", "").strip()
+FLARESOLVERR_MAX_TIMEOUT_MS = int(os.getenv("FLARESOLVERR_MAX_TIMEOUT_MS", "60000"))
+
+### X (Selenium)
+# Perfil de Firefox persistente: la sesión de X sobrevive entre posts y reinicios
+X_PROFILE_DIR = os.getenv("X_PROFILE_DIR", join(dirname(__file__), "data", "x_profile"))
+# Reciclar el navegador tras N posts o si su memoria (RSS) supera el límite
+X_BROWSER_MAX_POSTS = int(os.getenv("X_BROWSER_MAX_POSTS", "20"))
+X_BROWSER_MAX_RSS_MB = int(os.getenv("X_BROWSER_MAX_RSS_MB", "1500"))
+# Cerrar el navegador inactivo y el display virtual (Xvfb) tras N segundos sin posts
+X_BROWSER_IDLE_SECS = int(os.getenv("X_BROWSER_IDLE_SECS", "900"))
+X_DISPLAY_IDLE_SECS = int(os.getenv("X_DISPLAY_IDLE_SECS", "300"))
+# Periodo del job que recoge recursos inactivos y procesos huérfanos
+X_REAPER_INTERVAL = int(os.getenv("X_REAPER_INTERVAL", "300"))
+
 # Chat / thread base
 API_TOKEN: str = os.getenv("API_TOKEN", "")
 if not API_TOKEN:
@@ -1,6 +1,8 @@
+import time
+_T0 = time.perf_counter()
+
 import signal
 import sys
-from bot.app import build_app
 import warnings
 from telegram.warnings import PTBUserWarning
 from telegram import Update
@@ -8,7 +10,6 @@ from config import IS_PROD, DEV_CHAT_ID, API_TOKEN, ADHOC_CHAT_ID, get_target_co
 from logger import logger
 import os
 import subprocess
-import time
 
 warnings.filterwarnings(
     "ignore",
@@ -16,43 +17,40 @@ warnings.filterwarnings(
     category=PTBUserWarning,
 )
 
-# ✅ Configurar display virtual para Selenium (X Publisher)
-def setup_xvfb():
-    """Inicia Xvfb si no hay DISPLAY disponible"""
-    if 'DISPLAY' in os.environ:
-        logger.info(f"✅ DISPLAY ya configurado: {os.environ['DISPLAY']}")
-        return
-    
-    os.environ['DISPLAY'] = ':99'
-    
-    try:
-        # Verificar si Xvfb ya está corriendo
-        subprocess.run(
-            ['pgrep', '-f', 'Xvfb.*:99'],
-            check=True,
-            capture_output=True,
-            timeout=5
+
+def import_profile(modules=("bot.app", "services.gasolina_scheduler"), top: int = 20) -> None:
+    """
+    Informe de tiempos de import (python -X importtime) en un proceso limpio.
+    Para cada módulo muestra el tiempo total y los `top` imports más caros
+    (acumulado), para comprobar que el arranque no arrastra módulos pesados.
+    """
+    for module in modules:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
         )
-    except subprocess.CalledProcessError:
-        # Xvfb no está corriendo, iniciarlo
-        try:
-            subprocess.Popen(
-                ['Xvfb', ':99', '-screen', '0', '1920x1080x24', '-ac', '+extension', 'GLX'],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            time.sleep(3)  # Esperar a que Xvfb inicie
-        except FileNotFoundError:
-            logger.warning("⚠️ xvfb no está instalado. Instálalo con: sudo apt-get install xvfb")
-        except Exception as e:
-            logger.error(f"❌ Error iniciando Xvfb: {e}")
-    except subprocess.TimeoutExpired:
-        logger.warning("⚠️ Timeout verificando Xvfb")
-    except Exception as e:
-        logger.error(f"❌ Error configurando Xvfb: {e}")
+        if proc.returncode != 0:
+            last = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ""
+            logger.error(f"[Arranque] ❌ import {module} falló: {last}")
+            continue
+        rows = []   # (acumulado_us, propio_us, nombre)
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), int(self_us), name.strip()))
+        total = next((r[0] for r in rows if r[2] == module), 0)
+        lines = [f"── import {module}: {total / 1e6:.3f}s ({len(rows)} módulos) ──",
+                 f"{'acumulado':>12} {'propio':>10}  módulo"]
+        for cumulative, self_us, name in sorted(rows, reverse=True)[:top]:
+            lines.append(f"{cumulative / 1e3:>10.1f}ms {self_us / 1e3:>8.1f}ms  {name}")
+        logger.info("[Arranque] Tiempos de import\n" + "\n".join(lines))
+
 
 def main():
+    from bot.app import build_app
     app = build_app()
+    logger.info(f"[Arranque] Aplicación lista en {time.perf_counter() - _T0:.2f}s")
 
     def signal_handler(sig, frame):
         print("\n🛑 Señal de parada recibida, cerrando bot...")
@@ -65,7 +63,9 @@ def main():
     app.run_polling(allowed_updates=Update.ALL_TYPES)
     
 if __name__ == "__main__":
-    setup_xvfb()
+    if "--import-profile" in sys.argv:
+        import_profile()
+        sys.exit(0)
 
     logger.info("="*60)
     logger.info("🚀 INICIANDO BOT")
@@ -73,7 +73,7 @@ if __name__ == "__main__":
     logger.info(f"DEV_CHAT_ID: {DEV_CHAT_ID}")
     logger.info(f"TARGET_CONTEXTS: {get_target_contexts()}")
     logger.info(f"CHANNEL: {ADHOC_CHAT_ID}")
-    logger.info(f"DISPLAY: {os.environ.get('DISPLAY', 'No configurado')}")
+    logger.info(f"DISPLAY: {os.environ.get('DISPLAY', 'Xvfb bajo demanda')}")
     logger.info("="*60)
     
     main()
@@ -0,0 +1,140 @@
+# publishers/telegram_broadcast.py
+"""
+Envío concurrente a varios contextos (chat_id, thread_id) respetando los
+límites de Telegram: ~30 mensajes/s por bot y ~20/min por grupo (1/s en
+chats privados). Cada límite es un token bucket compartido por todos los
+envíos del proceso; un RetryAfter pausa el bucket del chat y se reintenta.
+"""
+import asyncio
+from typing import Awaitable, Callable, Iterable
+
+from telegram.error import RetryAfter
+
+from logger import logger
+
+GLOBAL_RATE   = 30.0        # mensajes/s por bot
+GROUP_RATE    = 20 / 60     # mensajes/s por grupo o canal (chat_id negativo)
+GROUP_BURST   = 3
+PRIVATE_RATE  = 1.0         # mensajes/s por chat privado
+MAX_IN_FLIGHT = 32          # peticiones simultáneas como máximo
+MAX_RETRIES   = 3
+
+Context = tuple[int, int | None]
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:  # FIFO entre los que esperan
+            while True:
+                self._refill(loop.time())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Vacía el bucket para que no salga nada durante `seconds`."""
+        self._refill(asyncio.get_running_loop().time())
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+_global_bucket: TokenBucket | None = None
+_chat_buckets: dict[int, TokenBucket] = {}
+
+
+def _bucket_for(chat_id: int) -> TokenBucket:
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        if chat_id < 0:
+            bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+        else:
+            bucket = TokenBucket(PRIVATE_RATE, 1)
+        _chat_buckets[chat_id] = bucket
+    return bucket
+
+
+async def throttle(chat_id: int) -> None:
+    """Espera turno en el bucket del chat y en el global antes de una llamada a la API."""
+    global _global_bucket
+    if _global_bucket is None:
+        _global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+    await _bucket_for(chat_id).acquire()
+    await _global_bucket.acquire()
+
+
+def _retry_seconds(e: RetryAfter) -> float:
+    ra = e.retry_after
+    return ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra)
+
+
+async def send_limited(ctx: Context, send: Callable[[int, int | None], Awaitable]):
+    """send(chat_id, thread_id) respetando los buckets; reintenta tras RetryAfter. None si falla."""
+    chat_id, thread_id = ctx
+    for attempt in range(1, MAX_RETRIES + 1):
+        await throttle(chat_id)
+        try:
+            return await send(chat_id, thread_id)
+        except RetryAfter as e:
+            secs = _retry_seconds(e)
+            logger.warning(f"[Telegram/Broadcast] ⏳ RetryAfter {secs:.0f}s en chat_id={chat_id} (intento {attempt})")
+            _bucket_for(chat_id).pause(secs)
+        except Exception as e:
+            logger.error(f"[Telegram/Broadcast] ❌ Error en chat_id={chat_id}, thread_id={thread_id}: {e}")
+            return None
+    return None
+
+
+async def broadcast(
+    contexts: Iterable[Context],
+    send: Callable[[int, int | None], Awaitable],
+    label: str = "",
+    warmup: bool = False,
+) -> dict[Context, object]:
+    """
+    Ejecuta send(chat_id, thread_id) para cada contexto (sin duplicados) y
+    devuelve {(chat_id, thread_id): resultado} (None si falló).
+    warmup=True envía primero al primer contexto en solitario, p.ej. para que
+    la foto se suba una vez y el resto reutilice el file_id cacheado.
+    """
+    contexts = list(dict.fromkeys(contexts))
+    if not contexts:
+        return {}
+
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    results: dict[Context, object] = {}
+    sem = asyncio.Semaphore(MAX_IN_FLIGHT)
+
+    async def _run(ctx: Context) -> None:
+        async with sem:
+            results[ctx] = await send_limited(ctx, send)
+
+    pending = contexts
+    if warmup:
+        await _run(contexts[0])
+        pending = contexts[1:]
+    await asyncio.gather(*(_run(ctx) for ctx in pending))
+
+    elapsed = loop.time() - t0
+    ok = sum(1 for r in results.values() if r)
+    logger.info(
+        f"[Telegram/Broadcast] {label}: {ok}/{len(contexts)} contextos en {elapsed:.1f}s"
+        + (f" ({len(contexts) / elapsed:.1f}/s)" if elapsed > 0 else "")
+    )
+    # Mismo orden que los contextos de entrada
+    return {ctx: results.get(ctx) for ctx in contexts}
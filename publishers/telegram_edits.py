@@ -0,0 +1,128 @@
+# publishers/telegram_edits.py
+"""
+Motor de edición de captions para muchos mensajes a la vez.
+
+Cada mensaje (chat_id, message_id) tiene como mucho una edición pendiente:
+si llega otra antes de enviarse, la sustituye (coalescing). Antes de llamar
+a la API se compara el hash del contenido con el último enviado para ese
+mensaje y, si es idéntico, no se llama. El contenido es el caption o, si el
+llamador lo indica, la parte que justifica una edición (p.ej. sin la hora). Las ediciones pasan por los mismos
+token buckets que el broadcast (ver telegram_broadcast).
+"""
+import asyncio
+import hashlib
+
+from logger import logger
+from publishers.telegram_broadcast import send_limited
+from publishers.telegram_publisher import edit_or_resend_photo
+from services.gasolina_state import get_state, set_state
+
+CAPTION_HASHES_KEY = "tg_caption_hashes"
+MAX_CAPTION_HASHES = 500   # Solo interesan los posts recientes
+
+MsgKey = tuple[int, int]   # (chat_id, message_id)
+
+_pending: dict[MsgKey, tuple[str, str, str, dict]] = {}   # último caption pedido, su hash, imagen y contadores
+_workers: dict[MsgKey, asyncio.Task] = {}
+_sent_hashes: dict[str, str] | None = None     # "chat_id:message_id" -> hash del contenido enviado
+
+
+def _caption_hash(caption: str) -> str:
+    return hashlib.blake2b(caption.encode(), digest_size=12).hexdigest()
+
+
+def _hashes() -> dict[str, str]:
+    global _sent_hashes
+    if _sent_hashes is None:
+        _sent_hashes = dict(get_state(CAPTION_HASHES_KEY, {}))
+    return _sent_hashes
+
+
+def _remember_hash(chat_id: int, message_id: int, digest: str) -> None:
+    hashes = _hashes()
+    key = f"{chat_id}:{message_id}"
+    hashes.pop(key, None)
+    hashes[key] = digest
+    while len(hashes) > MAX_CAPTION_HASHES:
+        del hashes[next(iter(hashes))]
+
+
+async def _worker(app, chat_id: int, thread_id: int | None, message_id: int) -> int | None:
+    """Procesa las ediciones pendientes de un mensaje hasta vaciar su cola."""
+    key = (chat_id, message_id)
+    result = message_id
+    try:
+        while key in _pending:
+            caption, digest, image_path, stats = _pending.pop(key)
+            if _hashes().get(f"{chat_id}:{result}") == digest:
+                stats["identical"] += 1
+                continue
+            stats["api_calls"] += 1
+            current_id = result
+            new_id = await send_limited(
+                (chat_id, thread_id),
+                lambda c, t: edit_or_resend_photo(
+                    app, c,
+                    thread_id=t,
+                    message_id=current_id,
+                    new_text=caption,
+                    image_path=image_path,
+                ),
+            )
+            if new_id:
+                result = new_id
+                _remember_hash(chat_id, new_id, digest)
+            else:
+                result = None
+                break
+    finally:
+        # Tras un fallo las ediciones que llegaron mientras tanto se descartan:
+        # quien las pidió recibe None de esta misma tarea
+        _pending.pop(key, None)
+        _workers.pop(key, None)
+    return result
+
+
+async def edit_captions(
+    app,
+    messages: list[tuple[int, int | None, int]],
+    caption: str,
+    image_path: str,
+    label: str = "",
+    body: str | None = None,
+) -> dict[tuple[int, int | None], int | None]:
+    """
+    Encola el mismo caption para todos los mensajes [(chat_id, thread_id, message_id)]
+    y espera a que se apliquen. Devuelve {(chat_id, thread_id): message_id válido}
+    (nuevo si hubo que reenviar la foto, None si falló). Si se pasa `body`, se
+    compara ese texto en vez del caption para decidir si la edición es idéntica.
+    """
+    digest = _caption_hash(caption if body is None else body)
+    stats = {"requested": len(messages), "superseded": 0, "identical": 0, "api_calls": 0}
+    tasks = {}
+    for chat_id, thread_id, message_id in messages:
+        key = (chat_id, message_id)
+        previous = _pending.get(key)
+        if previous is not None:
+            previous[3]["superseded"] += 1  # Edición aún sin enviar: la sustituye esta
+        _pending[key] = (caption, digest, image_path, stats)
+        worker = _workers.get(key)
+        if worker is None:
+            worker = asyncio.create_task(_worker(app, chat_id, thread_id, message_id))
+            _workers[key] = worker
+        tasks[(chat_id, thread_id)] = worker
+
+    done = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    results = {
+        ctx: (None if isinstance(r, BaseException) else r)
+        for ctx, r in zip(tasks, done)
+    }
+
+    set_state(CAPTION_HASHES_KEY, dict(_hashes()))
+    # Si otra llamada sustituyó alguna de estas ediciones, la llamada a la API cuenta para ella
+    saved = stats["requested"] - stats["api_calls"]
+    logger.info(
+        f"[Telegram/Edits] {label}: {stats['api_calls']} llamadas para {stats['requested']} ediciones "
+        f"({saved} ahorradas: {stats['identical']} idénticas, {stats['superseded']} sustituidas)"
+    )
+    return results
@@ -1,6 +1,10 @@
-from telegram.error import TelegramError, BadRequest
+from telegram.error import TelegramError, BadRequest, RetryAfter
 from logger import logger
+from services.gasolina_state import get_state, set_state, delete_state, state_keys
+from publishers.telegram_broadcast import throttle
 import asyncio
+import hashlib
+import os
 
 _pending_pin_tasks: set = set()
 
@@ -15,13 +19,81 @@ async def send_telegram_message(app, chat_id, thread_id, text) -> int | None:
         )
         logger.info(f"[Telegram] ✅ Mensaje enviado chat_id={chat_id}, message_id={msg.message_id}")
         return msg.message_id
+    except RetryAfter:
+        raise  # Lo gestiona el llamador (ver telegram_broadcast)
     except TelegramError as e:
         logger.error(f"[Telegram] ❌ Error enviando mensaje: {e}")
         return None
 
+# ── Caché de file_id de Telegram ──────────────────────────────
+# Tras la primera subida, Telegram devuelve un file_id reutilizable por el
+# mismo bot. Se guarda en el estado persistente con clave bot + hash del
+# contenido de la imagen, así que si el fichero cambia se sube de nuevo y la
+# entrada antigua se descarta.
+_MEDIA_PREFIX = "tg_media_"
+# BadRequest que indican un file_id inservible (caducado, de otro bot, mal formado)
+_FILE_ID_ERRORS = ("file identifier", "file_id", "file id", "file_reference")
+_digest_cache: dict[str, tuple[int, int, str]] = {}   # path -> (mtime_ns, size, digest)
+_media_stats = {"hits": 0, "uploads": 0, "bytes_saved": 0}
+
+
+def get_media_cache_stats() -> dict:
+    return dict(_media_stats)
+
+
+def _image_digest(image_path: str) -> tuple[str, int]:
+    """Hash del contenido (recalculado solo si cambian mtime/tamaño). Lanza FileNotFoundError."""
+    st = os.stat(image_path)
+    cached = _digest_cache.get(image_path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2], st.st_size
+    h = hashlib.blake2b(digest_size=16)
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _digest_cache[image_path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest, st.st_size
+
+
+def _remember_file_id(bot_id, image_path: str, digest: str, msg) -> None:
+    if not msg.photo:
+        return
+    prefix = f"{_MEDIA_PREFIX}{bot_id}_"
+    # Descartar file_ids de versiones anteriores de la misma imagen
+    for key in state_keys(prefix):
+        if key != prefix + digest and get_state(key, {}).get("path") == image_path:
+            delete_state(key)
+    set_state(prefix + digest, {"file_id": msg.photo[-1].file_id, "path": image_path})
+
+
 async def send_telegram_photo(app, chat_id, thread_id, text, image_path) -> int | None:
     kw = {"message_thread_id": thread_id} if thread_id else {}
     try:
+        digest, size = _image_digest(image_path)
+        key = f"{_MEDIA_PREFIX}{app.bot.id}_{digest}"
+        cached = get_state(key)
+        if cached:
+            try:
+                msg = await app.bot.send_photo(
+                    chat_id=chat_id,
+                    photo=cached["file_id"],
+                    caption=text,
+                    parse_mode="HTML",
+                    **kw,
+                )
+                _media_stats["hits"] += 1
+                _media_stats["bytes_saved"] += size
+                logger.info(f"[Telegram] ✅ Foto enviada (file_id en caché) chat_id={chat_id}, message_id={msg.message_id}")
+                return msg.message_id
+            except BadRequest as e:
+                # Solo un file_id caducado o de otro bot se invalida y se resube;
+                # el resto (chat inexistente, caption inválido...) no depende de la foto
+                if not any(m in e.message.lower() for m in _FILE_ID_ERRORS):
+                    raise
+                logger.warning(f"[Telegram] ⚠️ file_id en caché rechazado, resubiendo imagen: {e}")
+                delete_state(key)
+
         with open(image_path, "rb") as img:
             msg = await app.bot.send_photo(
                 chat_id=chat_id,
@@ -30,11 +102,15 @@ async def send_telegram_photo(app, chat_id, thread_id, text, image_path) -> int
                 parse_mode="HTML",
                 **kw,
             )
+        _media_stats["uploads"] += 1
+        _remember_file_id(app.bot.id, image_path, digest, msg)
         logger.info(f"[Telegram] ✅ Foto enviada chat_id={chat_id}, message_id={msg.message_id}")
         return msg.message_id
     except FileNotFoundError:
         logger.warning(f"[Telegram] ⚠️ Imagen no encontrada: {image_path}. Enviando mensaje sin foto.")
         return await send_telegram_message(app, chat_id, thread_id, text)
+    except RetryAfter:
+        raise
     except TelegramError as e:
         logger.error(f"[Telegram] ❌ Error enviando foto: {e}")
         return None
@@ -50,6 +126,8 @@ async def edit_telegram_caption(app, chat_id, message_id, new_text) -> bool:
             parse_mode="HTML",
         )
         return True
+    except RetryAfter:
+        raise  # No confundir con "mensaje no encontrado": no hay que reenviar la foto
     except BadRequest as e:
         error_text = str(e).lower()
         if "message is not modified" in error_text:
@@ -118,6 +196,7 @@ async def _delayed_pin_task(app, chat_id, message_id, delay_seconds: int):
     horas = delay_seconds // 3600
     logger.info(f"[Telegram] ⏳ Pin de message_id={message_id} programado en {horas}h")
     await asyncio.sleep(delay_seconds)
+    await throttle(chat_id)  # Varios pins a la vez tras un broadcast
     await pin_telegram_message(app, chat_id, message_id)
 
 
@@ -1,13 +1,38 @@
 # publishers/x_publisher.py
+"""
+Publicación en X a través de una cola en proceso.
+
+Los jobs encolan el post (queue_x_*) y siguen; un único worker lo publica
+con Selenium en su propio hilo (no el executor por defecto), reprograma los
+fallos con backoff sin bloquear a nadie y avisa al terminar (future +
+callback opcional). send_x_* siguen existiendo y esperan al resultado.
+"""
 import asyncio
-import requests
+import inspect
+import statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 from logger import logger
-from services.x_selenium import post_to_x, format_post_for_x
+
+X_MAX_ATTEMPTS   = 3
+X_RETRY_BACKOFF  = 120      # segundos; se duplica en cada reintento
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="x-publish")
+_queue: asyncio.Queue | None = None
+_worker_task: asyncio.Task | None = None
+_retry_handles: set[asyncio.TimerHandle] = set()
+_pending_callbacks: set = set()
+_in_flight = False
+_latencies: deque = deque(maxlen=50)
+_counters = {"done": 0, "failed": 0, "retries": 0}
 
 async def send_x_notification(
     title: str, summary: str, platform: str,
     external_url: str, image_url: str | None,
 ) -> bool:
+    from services.x_selenium import format_post_for_x
     text = await format_post_for_x(
         title=title,
         recommendation=summary or "🎁 Juego gratis por tiempo limitado",
@@ -28,29 +53,159 @@ async def send_x_text(text: str) -> bool:
     return await _post_x(text, None, text[:30])
 
 async def _post_x(text: str, image_bytes: bytes | None, label: str) -> bool:
-    for attempt in range(1, 3):
-        ok = await asyncio.to_thread(post_to_x, text=text, image_bytes=image_bytes, headless=True)
+    """Encola el post y espera a que termine (con sus reintentos)."""
+    return await enqueue_x_post(text, image_bytes, label)
+
+
+# ── Cola de publicación ───────────────────────────────────────
+
+def enqueue_x_post(
+    text: str,
+    image_bytes: bytes | None = None,
+    label: str = "",
+    on_done: Callable[[bool], object] | None = None,
+) -> asyncio.Future:
+    """
+    Encola un post y devuelve al momento un future que se resuelve con True/False
+    cuando se publica o se agotan los reintentos. on_done(ok) puede ser una
+    función o una corrutina.
+    """
+    global _queue, _worker_task
+    loop = asyncio.get_running_loop()
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if _worker_task is None or _worker_task.done():
+        _worker_task = loop.create_task(_worker())
+
+    job = {
+        "text": text,
+        "image_bytes": image_bytes,
+        "label": (label or text[:30])[:50],
+        "attempt": 1,
+        "enqueued": loop.time(),
+        "future": loop.create_future(),
+        "on_done": on_done,
+    }
+    _queue.put_nowait(job)
+    logger.info(f"[X/Cola] 📥 Encolado: {job['label']} (en cola: {_queue.qsize()})")
+    return job["future"]
+
+
+def queue_x_text(text: str, on_done: Callable[[bool], object] | None = None) -> asyncio.Future:
+    """Como send_x_text pero sin esperar a la publicación."""
+    return enqueue_x_post(text, None, text[:30], on_done)
+
+
+def queue_x_text_with_image(
+    text: str, image_path: str, on_done: Callable[[bool], object] | None = None,
+) -> asyncio.Future:
+    """Como send_x_text_with_image pero sin esperar a la publicación."""
+    return enqueue_x_post(text, _read_image(image_path), text[:30], on_done)
+
+
+async def _worker() -> None:
+    global _in_flight
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await _queue.get()
+        _in_flight = True
+        try:
+            # Import diferido: Selenium se carga con el primer post, no al arrancar el bot.
+            # Dentro del try: si falla, falla este job y el worker sigue vivo
+            from services.x_selenium import post_to_x
+            ok = await loop.run_in_executor(
+                _executor,
+                lambda: post_to_x(text=job["text"], image_bytes=job["image_bytes"], headless=True),
+            )
+        except Exception as e:
+            logger.error(f"[X/Cola] ❌ Error inesperado publicando {job['label']}: {e}", exc_info=True)
+            ok = False
+        finally:
+            _in_flight = False
+            _queue.task_done()
+
         if ok:
-            logger.info(f"[X] ✅ Publicado: {label[:50]}")
-            return True
-        if attempt < 2:
-            logger.warning(f"[X] ⚠️ Intento {attempt} fallido, reintentando en 2 min...")
-            await asyncio.sleep(120)
-    logger.error(f"[X] ❌ Falló publicación tras 2 intentos: {label[:50]}")
-    return False
+            logger.info(f"[X] ✅ Publicado: {job['label']}")
+            _finish(job, True)
+        elif job["attempt"] < X_MAX_ATTEMPTS:
+            delay = X_RETRY_BACKOFF * 2 ** (job["attempt"] - 1)
+            logger.warning(f"[X] ⚠️ Intento {job['attempt']} fallido, reintentando en {delay // 60} min...")
+            job["attempt"] += 1
+            _counters["retries"] += 1
+            _schedule_retry(loop, job, delay)
+        else:
+            logger.error(f"[X] ❌ Falló publicación tras {X_MAX_ATTEMPTS} intentos: {job['label']}")
+            _finish(job, False)
+
+
+def _schedule_retry(loop, job: dict, delay: float) -> None:
+    def _requeue():
+        _retry_handles.discard(handle)
+        _queue.put_nowait(job)
+    handle = loop.call_later(delay, _requeue)
+    _retry_handles.add(handle)
+
+
+def _finish(job: dict, ok: bool) -> None:
+    latency = asyncio.get_running_loop().time() - job["enqueued"]
+    _latencies.append(latency)
+    _counters["done" if ok else "failed"] += 1
+    logger.info(f"[X/Cola] ⏱️ {job['label']}: {'ok' if ok else 'fallido'} en {latency:.1f}s desde que se encoló")
+
+    if not job["future"].done():
+        job["future"].set_result(ok)
+    if job["on_done"]:
+        try:
+            result = job["on_done"](ok)
+            if inspect.isawaitable(result):
+                # Guardamos referencia para evitar que el GC destruya la task antes de terminar
+                task = asyncio.ensure_future(result)
+                _pending_callbacks.add(task)
+                task.add_done_callback(_pending_callbacks.discard)
+        except Exception as e:
+            logger.error(f"[X/Cola] ❌ Error en callback de {job['label']}: {e}", exc_info=True)
+
+
+def get_x_queue_stats() -> dict:
+    """Profundidad de la cola y latencia encolado → publicado."""
+    return {
+        "depth": _queue.qsize() if _queue else 0,
+        "retrying": len(_retry_handles),
+        "in_flight": _in_flight,
+        **_counters,
+        "last_latency": round(_latencies[-1], 1) if _latencies else None,
+        "median_latency": round(statistics.median(_latencies), 1) if _latencies else None,
+    }
+
+
+async def close_x_queue() -> None:
+    """Shutdown: cancela el worker y los reintentos pendientes."""
+    global _worker_task
+    pending = (_queue.qsize() if _queue else 0) + len(_retry_handles)
+    if pending:
+        logger.warning(f"[X/Cola] ⚠️ Cerrando con {pending} posts sin publicar")
+    for handle in list(_retry_handles):
+        handle.cancel()
+    _retry_handles.clear()
+    if _worker_task is not None:
+        _worker_task.cancel()
+        _worker_task = None
+    _executor.shutdown(wait=False, cancel_futures=True)
 
 def _download_bytes(url: str) -> bytes:
+    import requests
     r = requests.get(url, timeout=30)
     r.raise_for_status()
     return r.content
 
-async def send_x_text_with_image(text: str, image_path: str) -> bool:
-    """Publica texto + imagen local en X. Usado para gasolina."""
+def _read_image(image_path: str) -> bytes | None:
     try:
         with open(image_path, "rb") as f:
-            image_bytes = f.read()
+            return f.read()
     except FileNotFoundError:
         logger.warning(f"[X] ⚠️ Imagen no encontrada: {image_path}. Publicando sin imagen.")
-        image_bytes = None
+        return None
 
-    return await _post_x(text, image_bytes, text[:30])
+async def send_x_text_with_image(text: str, image_path: str) -> bool:
+    """Publica texto + imagen local en X. Usado para gasolina."""
+    return await _post_x(text, _read_image(image_path), text[:30])
@@ -0,0 +1,76 @@
+# services/flaresolverr.py
+"""
+Cliente mínimo de la API de FlareSolverr (ver docker-compose.yml).
+
+FlareSolverr resuelve el challenge con un navegador real y devuelve el HTML
+junto con las cookies (cf_clearance...) y el User-Agent usados. Se mantiene
+una única sesión de FlareSolverr (sessions.create) para que el navegador y
+sus cookies se reutilicen entre resoluciones; si el servicio la pierde
+(reinicio del contenedor) se crea otra.
+"""
+import httpx
+
+from logger import logger
+
+
+class FlareSolverrError(RuntimeError):
+    """FlareSolverr no disponible o no pudo resolver la petición."""
+
+
+class FlareSolverr:
+    def __init__(self, endpoint: str, max_timeout_ms: int = 60000):
+        self.endpoint = endpoint
+        self.max_timeout_ms = max_timeout_ms
+        self.session_id: str | None = None
+
+    async def _call(self, client: httpx.AsyncClient, payload: dict) -> dict:
+        try:
+            r = await client.post(
+                self.endpoint, json=payload,
+                timeout=httpx.Timeout(self.max_timeout_ms / 1000 + 15, connect=5.0),
+            )
+            data = r.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise FlareSolverrError(f"{payload['cmd']}: {type(e).__name__}: {e}") from e
+        if data.get("status") != "ok":
+            raise FlareSolverrError(f"{payload['cmd']}: {data.get('message') or data}")
+        return data
+
+    async def _ensure_session(self, client: httpx.AsyncClient) -> str:
+        if self.session_id is None:
+            data = await self._call(client, {"cmd": "sessions.create"})
+            self.session_id = data["session"]
+            logger.info(f"[FlareSolverr] Sesión creada: {self.session_id}")
+        return self.session_id
+
+    async def get(self, client: httpx.AsyncClient, url: str) -> dict:
+        """
+        Resuelve GET `url` en la sesión compartida. Devuelve la `solution` de
+        FlareSolverr: {url, status, headers, response, cookies, userAgent}.
+        """
+        for attempt in (1, 2):
+            payload = {
+                "cmd": "request.get",
+                "url": url,
+                "session": await self._ensure_session(client),
+                "maxTimeout": self.max_timeout_ms,
+            }
+            try:
+                return (await self._call(client, payload))["solution"]
+            except FlareSolverrError as e:
+                # Sesión perdida (p.ej. contenedor reiniciado): crear otra y reintentar una vez
+                if attempt == 1 and "session" in str(e).lower():
+                    logger.warning(f"[FlareSolverr] ⚠️ Sesión {self.session_id} no válida, recreando")
+                    self.session_id = None
+                    continue
+                raise
+
+    async def close(self, client: httpx.AsyncClient) -> None:
+        """Destruye la sesión (libera el navegador en el contenedor)."""
+        if self.session_id is None:
+            return
+        try:
+            await self._call(client, {"cmd": "sessions.destroy", "session": self.session_id})
+        except FlareSolverrError as e:
+            logger.warning(f"[FlareSolverr] ⚠️ No se pudo cerrar la sesión: {e}")
+        self.session_id = None
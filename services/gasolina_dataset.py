@@ -0,0 +1,183 @@
+# services/gasolina_dataset.py
+"""
+Ingesta del dataset nacional de precios (Ministerio, ~12k estaciones).
+
+El documento (JSON o XML) se lee en streaming registro a registro, se
+normaliza y se carga en gasolina_db en una única transacción. Funciona
+offline con `ingest_dataset_file(path)` sobre un fichero ya descargado.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from datetime import date
+
+from logger import logger
+from services.gasolina_db import insert_dataset
+from services.http_client import download
+
+URL_DATASET  = "https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/PreciosCarburantes/EstacionesTerrestres/"
+DATASET_FILE = "data/dataset_estaciones.json"
+
+_ARRAY_KEY = "ListaEESSPrecio"
+_CHUNK     = 1 << 16
+_XML_ESCAPE = re.compile(r"_x([0-9A-Fa-f]{4})_")
+
+
+# ── Lectura en streaming ──────────────────────────────────────
+
+def iter_json_records(fp):
+    """
+    Itera los objetos de `ListaEESSPrecio` sin cargar el documento entero:
+    lee por bloques y decodifica cada objeto con JSONDecoder.raw_decode.
+    """
+    decoder = json.JSONDecoder()
+    marker = f'"{_ARRAY_KEY}"'
+    buf = ""
+
+    # 1) Avanzar hasta el '[' del array
+    while True:
+        idx = buf.find(marker)
+        if idx >= 0:
+            bracket = buf.find("[", idx + len(marker))
+            if bracket >= 0:
+                buf = buf[bracket + 1:]
+                break
+        chunk = fp.read(_CHUNK)
+        if not chunk:
+            return
+        buf += chunk
+
+    # 2) Decodificar objeto a objeto
+    pos = 0
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            chunk = fp.read(_CHUNK)
+            if not chunk:
+                return
+            buf, pos = chunk, 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Objeto partido entre bloques: leer más y reintentar
+            chunk = fp.read(_CHUNK)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
+
+
+def _xml_name(tag: str) -> str:
+    """'{ns}Precio_x0020_Gasoleo_x0020_A' -> 'Precio Gasoleo A'"""
+    local = tag.rsplit("}", 1)[-1]
+    return _XML_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), local)
+
+
+def iter_xml_records(fp):
+    """Itera los <EESSPrecio> con iterparse, liberando cada nodo tras leerlo."""
+    lista = None
+    for event, elem in ET.iterparse(fp, events=("start", "end")):
+        name = _xml_name(elem.tag)
+        if event == "start":
+            if name == _ARRAY_KEY:
+                lista = elem
+            continue
+        if name == "EESSPrecio":
+            yield {_xml_name(child.tag): (child.text or "") for child in elem}
+            if lista is not None:
+                lista.remove(elem)
+            else:
+                elem.clear()
+
+
+# ── Normalización ─────────────────────────────────────────────
+
+def _to_float(value) -> float | None:
+    if not value:
+        return None
+    try:
+        return float(str(value).strip().replace(",", "."))
+    except ValueError:
+        return None
+
+
+def normalize_record(raw: dict) -> dict | None:
+    """Registro del Ministerio -> dict listo para insert_dataset (None si no es válido)."""
+    ideess = (raw.get("IDEESS") or "").strip()
+    if not ideess:
+        return None
+
+    precios = {}
+    for key, value in raw.items():
+        if key.startswith("Precio "):
+            precio = _to_float(value)
+            if precio is not None:
+                precios[key[len("Precio "):]] = precio
+
+    def _s(key: str) -> str:
+        return (raw.get(key) or "").strip()
+
+    return {
+        "ideess": ideess,
+        "rotulo": _s("Rótulo"),
+        "direccion": _s("Dirección"),
+        "localidad": _s("Localidad"),
+        "municipio": _s("Municipio"),
+        "provincia": _s("Provincia"),
+        "cp": _s("C.P."),
+        "latitud": _to_float(raw.get("Latitud")),
+        "longitud": _to_float(raw.get("Longitud (WGS84)")),
+        "precios": precios,
+    }
+
+
+# ── Ingesta ───────────────────────────────────────────────────
+
+def ingest_dataset_file(path: str, date_str: str | None = None) -> dict:
+    """
+    Carga un fichero JSON o XML del dataset en la base de datos.
+    Devuelve {estaciones, precios, segundos, filas_por_segundo}.
+    """
+    date_str = date_str or date.today().isoformat()
+    is_xml = path.lower().endswith(".xml")
+
+    start = time.perf_counter()
+    if is_xml:
+        with open(path, "rb") as fp:
+            records = (r for r in map(normalize_record, iter_xml_records(fp)) if r)
+            n_estaciones, n_precios = insert_dataset(date_str, records)
+    else:
+        with open(path, encoding="utf-8-sig") as fp:
+            records = (r for r in map(normalize_record, iter_json_records(fp)) if r)
+            n_estaciones, n_precios = insert_dataset(date_str, records)
+    elapsed = time.perf_counter() - start
+
+    filas = n_estaciones + n_precios
+    result = {
+        "estaciones": n_estaciones,
+        "precios": n_precios,
+        "segundos": round(elapsed, 3),
+        "filas_por_segundo": round(filas / elapsed) if elapsed > 0 else filas,
+    }
+    logger.info(
+        f"[Dataset] ✅ {n_estaciones} estaciones / {n_precios} precios cargados "
+        f"en {result['segundos']}s ({result['filas_por_segundo']} filas/s)"
+    )
+    return result
+
+
+async def fetch_and_ingest_dataset(date_str: str | None = None) -> dict:
+    """Descarga el dataset nacional y lo ingesta en un hilo (no bloquea el loop)."""
+    os.makedirs("data", exist_ok=True)
+    size = await download(URL_DATASET, DATASET_FILE, headers={"Accept": "application/json"})
+    logger.info(f"[Dataset] Descargados {size / 1_048_576:.1f} MB")
+    return await asyncio.to_thread(ingest_dataset_file, DATASET_FILE, date_str)
@@ -1,13 +1,112 @@
 import sqlite3
 import os
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from logger import logger
 
 DB_FILE = "data/gasolina_history.db"
 
-def init_db():
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+# ── Conexión persistente ──────────────────────────────────────
+# Una única conexión por proceso en modo WAL. isolation_level=None deja las
+# transacciones en nuestras manos (BEGIN/COMMIT explícitos en transaction()).
+# El lock la protege cuando se usa desde hilos (p.ej. ingesta del dataset).
+_conn: sqlite3.Connection | None = None
+_lock = threading.RLock()
+
+# Versión de los datos de precios: se incrementa en cada escritura de
+# insert_precios_top para invalidar cachés derivadas (ver gasolina_stats).
+_data_version = 0
+
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # Seguro con WAL; evita fsync en cada commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",    # ~16 MB de caché de páginas
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _open_connection() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = _open_connection()
+        return _conn
+
+
+@contextmanager
+def transaction():
+    """
+    Bloque transaccional sobre la conexión compartida (también válido para lecturas).
+    Si ya hay una transacción abierta en este hilo, se reutiliza.
+    """
+    with _lock:
+        conn = get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def get_data_version() -> int:
+    return _data_version
+
+
+def close_db() -> None:
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+# ── Rollups por bloques ───────────────────────────────────────
+# Bloques alineados de 2**nivel días (nivel < ROLLUP_NIVELES), con los días
+# contados desde 1970-01-01: cualquier rango de fechas se cubre con O(log n)
+# bloques, así que las estadísticas leen unas pocas filas por estación
+# aunque el rango sea de un año.
+ROLLUP_NIVELES = 10
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _dia(date_str: str) -> int:
+    return date.fromisoformat(date_str).toordinal() - _EPOCH
+
+
+def bloques_rango(desde: str, hasta: str) -> list[tuple[int, int]]:
+    """(nivel, inicio) de los bloques que cubren exactamente [desde, hasta] (fechas ISO, ambas incluidas)."""
+    bloques = []
+    dia, fin = _dia(desde), _dia(hasta)
+    while dia <= fin:
+        # El mayor bloque alineado que empieza en `dia` sin pasarse de `fin`
+        nivel = 0
+        while nivel + 1 < ROLLUP_NIVELES and dia % (2 << nivel) == 0 and dia + (2 << nivel) - 1 <= fin:
+            nivel += 1
+        bloques.append((nivel, dia))
+        dia += 1 << nivel
+    return bloques
+
+
+# ── Migraciones versionadas (PRAGMA user_version) ─────────────
+
+def _migration_1(c):
+    """Esquema base de precios_top con ciudad, deduplicación e índices"""
     c.execute('''
         CREATE TABLE IF NOT EXISTS precios_top (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -15,50 +114,420 @@ def init_db():
             date TEXT,
             estacion TEXT,
             tipo_combustible TEXT,
-            precio REAL
+            precio REAL,
+            ciudad TEXT NOT NULL DEFAULT 'zgza'
         )
     ''')
-    # Deduplicar filas existentes antes de crear el índice único (migración segura)
+    # Bases anteriores al multi-ciudad: las filas antiguas son todas de Zaragoza
+    columnas = {row[1] for row in c.execute("PRAGMA table_info(precios_top)")}
+    if "ciudad" not in columnas:
+        c.execute("ALTER TABLE precios_top ADD COLUMN ciudad TEXT NOT NULL DEFAULT 'zgza'")
+    c.execute("DROP INDEX IF EXISTS idx_precios_fuel_date")
+    c.execute("DROP INDEX IF EXISTS idx_precios_unique")
+    # Deduplicar filas existentes antes de crear el índice único (solo una vez)
     c.execute('''
         DELETE FROM precios_top
         WHERE id NOT IN (
             SELECT MIN(id) FROM precios_top
-            GROUP BY date, estacion, tipo_combustible
+            GROUP BY ciudad, date, estacion, tipo_combustible
         )
     ''')
-    # Índice compuesto para las consultas de estadísticas (filtro por combustible + rango de fechas)
+    # Índice compuesto para las consultas de estadísticas (ciudad + combustible + rango de fechas)
     c.execute('''
-        CREATE INDEX IF NOT EXISTS idx_precios_fuel_date
-        ON precios_top(tipo_combustible, date)
+        CREATE INDEX IF NOT EXISTS idx_precios_ciudad_fuel_date
+        ON precios_top(ciudad, tipo_combustible, date)
     ''')
     # Índice único para upserts eficientes sin SELECT previo
     c.execute('''
-        CREATE UNIQUE INDEX IF NOT EXISTS idx_precios_unique
-        ON precios_top(date, estacion, tipo_combustible)
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_precios_ciudad_unique
+        ON precios_top(ciudad, date, estacion, tipo_combustible)
+    ''')
+
+
+def _migration_2(c):
+    """Tablas del dataset nacional (ver services/gasolina_dataset.py)"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS estaciones (
+            ideess TEXT PRIMARY KEY,
+            rotulo TEXT,
+            direccion TEXT,
+            localidad TEXT,
+            municipio TEXT,
+            provincia TEXT,
+            cp TEXT,
+            latitud REAL,
+            longitud REAL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS precios_estaciones (
+            date TEXT,
+            ideess TEXT,
+            tipo_combustible TEXT,
+            precio REAL,
+            PRIMARY KEY (date, ideess, tipo_combustible)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migration_3(c):
+    """Rollups diarios por estación y mínimo diario por ciudad"""
+    # Por día, combustible y estación: extremos, media (sum/n de los precios distintos
+    # que ha tenido en el día) y último precio del día
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_diario (
+            ciudad TEXT NOT NULL,
+            tipo_combustible TEXT NOT NULL,
+            date TEXT NOT NULL,
+            estacion TEXT NOT NULL,
+            precio_min REAL,
+            precio_max REAL,
+            precio_sum REAL,
+            n INTEGER,
+            precio_last REAL,
+            PRIMARY KEY (ciudad, tipo_combustible, date, estacion)
+        ) WITHOUT ROWID
+    ''')
+    # Mínimo del día entre todas las gasolineras seguidas de la ciudad
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_ciudad_diario (
+            ciudad TEXT NOT NULL,
+            tipo_combustible TEXT NOT NULL,
+            date TEXT NOT NULL,
+            precio_min REAL,
+            PRIMARY KEY (ciudad, tipo_combustible, date)
+        ) WITHOUT ROWID
+    ''')
+    # Backfill desde el histórico existente
+    c.execute('''
+        INSERT OR IGNORE INTO rollup_diario
+            (ciudad, tipo_combustible, date, estacion, precio_min, precio_max, precio_sum, n, precio_last)
+        SELECT ciudad, tipo_combustible, date, estacion, precio, precio, precio, 1, precio
+        FROM precios_top
+        WHERE precio IS NOT NULL
+    ''')
+    c.execute('''
+        INSERT OR IGNORE INTO rollup_ciudad_diario (ciudad, tipo_combustible, date, precio_min)
+        SELECT ciudad, tipo_combustible, date, MIN(precio)
+        FROM precios_top
+        WHERE precio IS NOT NULL
+        GROUP BY ciudad, tipo_combustible, date
+    ''')
+    # Bloques de 2**nivel días por estación (para la variación) y por ciudad
+    # (extremos con su fecha y estación), ver bloques_rango
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_bloques (
+            ciudad TEXT NOT NULL,
+            tipo_combustible TEXT NOT NULL,
+            nivel INTEGER NOT NULL,
+            inicio INTEGER NOT NULL,
+            estacion TEXT NOT NULL,
+            precio_min REAL,
+            precio_max REAL,
+            PRIMARY KEY (ciudad, tipo_combustible, nivel, inicio, estacion)
+        ) WITHOUT ROWID
     ''')
-    conn.commit()
-    conn.close()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_bloques_ciudad (
+            ciudad TEXT NOT NULL,
+            tipo_combustible TEXT NOT NULL,
+            nivel INTEGER NOT NULL,
+            inicio INTEGER NOT NULL,
+            precio_max REAL,
+            fecha_max TEXT,
+            estacion_max TEXT,
+            precio_min REAL,
+            fecha_min TEXT,
+            estacion_min TEXT,
+            PRIMARY KEY (ciudad, tipo_combustible, nivel, inicio)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        INSERT OR IGNORE INTO rollup_bloques
+            (ciudad, tipo_combustible, nivel, inicio, estacion, precio_min, precio_max)
+        SELECT ciudad, tipo_combustible, 0, CAST(julianday(date) - 2440587.5 AS INTEGER), estacion, precio_min, precio_max
+        FROM rollup_diario
+    ''')
+    # Cada nivel sale del anterior: la mitad de filas en cada paso
+    for nivel in range(1, ROLLUP_NIVELES):
+        c.execute(f'''
+            INSERT OR IGNORE INTO rollup_bloques
+                (ciudad, tipo_combustible, nivel, inicio, estacion, precio_min, precio_max)
+            SELECT ciudad, tipo_combustible, {nivel}, (inicio >> {nivel}) << {nivel}, estacion,
+                   MIN(precio_min), MAX(precio_max)
+            FROM rollup_bloques
+            WHERE nivel = {nivel - 1}
+            GROUP BY ciudad, tipo_combustible, inicio >> {nivel}, estacion
+        ''')
+    # Nivel 0 de la ciudad: extremos de cada día, desempate por nombre de estación
+    c.execute('''
+        INSERT OR IGNORE INTO rollup_bloques_ciudad
+            (ciudad, tipo_combustible, nivel, inicio,
+             precio_max, fecha_max, estacion_max, precio_min, fecha_min, estacion_min)
+        SELECT d.ciudad, d.tipo_combustible, 0, CAST(julianday(d.date) - 2440587.5 AS INTEGER),
+               d.precio_max, d.date,
+               (SELECT MIN(r.estacion) FROM rollup_diario r
+                WHERE r.ciudad = d.ciudad AND r.tipo_combustible = d.tipo_combustible
+                  AND r.date = d.date AND r.precio_max = d.precio_max),
+               d.precio_min, d.date,
+               (SELECT MIN(r.estacion) FROM rollup_diario r
+                WHERE r.ciudad = d.ciudad AND r.tipo_combustible = d.tipo_combustible
+                  AND r.date = d.date AND r.precio_min = d.precio_min)
+        FROM (
+            SELECT ciudad, tipo_combustible, date, MAX(precio_max) AS precio_max, MIN(precio_min) AS precio_min
+            FROM rollup_diario
+            GROUP BY ciudad, tipo_combustible, date
+        ) d
+    ''')
+    for nivel in range(1, ROLLUP_NIVELES):
+        c.execute(f'''
+            WITH hijos AS (
+                SELECT ciudad, tipo_combustible, (inicio >> {nivel}) << {nivel} AS inicio,
+                       precio_max, fecha_max, estacion_max, precio_min, fecha_min, estacion_min,
+                       ROW_NUMBER() OVER (PARTITION BY ciudad, tipo_combustible, inicio >> {nivel}
+                                          ORDER BY precio_max DESC, fecha_max, estacion_max) AS rn_max,
+                       ROW_NUMBER() OVER (PARTITION BY ciudad, tipo_combustible, inicio >> {nivel}
+                                          ORDER BY precio_min, fecha_min, estacion_min) AS rn_min
+                FROM rollup_bloques_ciudad
+                WHERE nivel = {nivel - 1}
+            )
+            INSERT OR IGNORE INTO rollup_bloques_ciudad
+                (ciudad, tipo_combustible, nivel, inicio,
+                 precio_max, fecha_max, estacion_max, precio_min, fecha_min, estacion_min)
+            SELECT a.ciudad, a.tipo_combustible, {nivel}, a.inicio,
+                   a.precio_max, a.fecha_max, a.estacion_max, b.precio_min, b.fecha_min, b.estacion_min
+            FROM hijos a
+            JOIN hijos b ON b.ciudad = a.ciudad AND b.tipo_combustible = a.tipo_combustible
+                        AND b.inicio = a.inicio AND b.rn_min = 1
+            WHERE a.rn_max = 1
+        ''')
+
+
+def _migration_4(c):
+    """Tabla clave/valor del estado de los jobs (ver services/gasolina_state.py)"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS estado (
+            clave TEXT PRIMARY KEY,
+            valor TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migration_5(c):
+    """Caché persistente de acortados del LLM (ver services/llm_cache.py)"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS cache_llm (
+            clave TEXT PRIMARY KEY,
+            salida TEXT NOT NULL,
+            creado REAL NOT NULL,
+            usado REAL NOT NULL,
+            latencia REAL,
+            hits INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_cache_llm_usado ON cache_llm(usado)")
+
+
+# Añadir siempre al final: posición + 1 = versión del esquema
+MIGRATIONS = [_migration_1, _migration_2, _migration_3, _migration_4, _migration_5]
+
+
+def init_db():
+    """Aplica las migraciones pendientes, cada una en su propia transacción."""
+    conn = get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with transaction() as c:
+            migration(c)
+            c.execute(f"PRAGMA user_version = {target}")
+        logger.info(f"[DB] Migración {target} aplicada: {migration.__doc__}")
+
+
+# ── Escrituras ────────────────────────────────────────────────
+
+# Un precio repetido (lo normal entre updates horarios) no reescribe la fila:
+# timestamp queda como la hora del último cambio
+_UPSERT_TOP = '''
+    INSERT INTO precios_top (ciudad, date, estacion, tipo_combustible, precio)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(ciudad, date, estacion, tipo_combustible)
+    DO UPDATE SET precio = excluded.precio, timestamp = CURRENT_TIMESTAMP
+    WHERE precio IS NOT excluded.precio
+'''
+
+_UPSERT_ROLLUP = '''
+    INSERT INTO rollup_diario
+        (ciudad, tipo_combustible, date, estacion, precio_min, precio_max, precio_sum, n, precio_last)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+    ON CONFLICT(ciudad, tipo_combustible, date, estacion) DO UPDATE SET
+        precio_min  = MIN(precio_min, excluded.precio_min),
+        precio_max  = MAX(precio_max, excluded.precio_max),
+        precio_sum  = precio_sum + excluded.precio_sum,
+        n           = n + 1,
+        precio_last = excluded.precio_last
+'''
+
+_UPSERT_ROLLUP_CIUDAD = '''
+    INSERT INTO rollup_ciudad_diario (ciudad, tipo_combustible, date, precio_min)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(ciudad, tipo_combustible, date) DO UPDATE SET
+        precio_min = MIN(precio_min, excluded.precio_min)
+'''
 
-def insert_precios_top(date_str: str, top_data: dict):
+_UPSERT_BLOQUE = '''
+    INSERT INTO rollup_bloques (ciudad, tipo_combustible, nivel, inicio, estacion, precio_min, precio_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ciudad, tipo_combustible, nivel, inicio, estacion) DO UPDATE SET
+        precio_min = MIN(precio_min, excluded.precio_min),
+        precio_max = MAX(precio_max, excluded.precio_max)
+'''
+
+# Gana el precio más alto (más bajo), luego la fecha más antigua y luego el nombre
+_MEJOR_MAX = "(-excluded.precio_max, excluded.fecha_max, excluded.estacion_max) < (-precio_max, fecha_max, estacion_max)"
+_MEJOR_MIN = "(excluded.precio_min, excluded.fecha_min, excluded.estacion_min) < (precio_min, fecha_min, estacion_min)"
+
+_UPSERT_BLOQUE_CIUDAD = f'''
+    INSERT INTO rollup_bloques_ciudad
+        (ciudad, tipo_combustible, nivel, inicio,
+         precio_max, fecha_max, estacion_max, precio_min, fecha_min, estacion_min)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ciudad, tipo_combustible, nivel, inicio) DO UPDATE SET
+        precio_max   = CASE WHEN {_MEJOR_MAX} THEN excluded.precio_max ELSE precio_max END,
+        fecha_max    = CASE WHEN {_MEJOR_MAX} THEN excluded.fecha_max ELSE fecha_max END,
+        estacion_max = CASE WHEN {_MEJOR_MAX} THEN excluded.estacion_max ELSE estacion_max END,
+        precio_min   = CASE WHEN {_MEJOR_MIN} THEN excluded.precio_min ELSE precio_min END,
+        fecha_min    = CASE WHEN {_MEJOR_MIN} THEN excluded.fecha_min ELSE fecha_min END,
+        estacion_min = CASE WHEN {_MEJOR_MIN} THEN excluded.estacion_min ELSE estacion_min END
+'''
+
+def insert_precios_top(date_str: str, top_data: dict, ciudad: str = "zgza"):
     """
     Inserta o actualiza (si ya existe para esa fecha) los precios de las gasolineras top.
-    top_data: {estacion: {tipo: precio_str}}
+    En la misma transacción mantiene los rollups diarios (rollup_diario / rollup_ciudad_diario)
+    y los de bloques (rollup_bloques / rollup_bloques_ciudad) con las filas cuyo precio
+    cambia respecto al último guardado del día: el update horario repite casi todo.
+    top_data: {estacion: {tipo: Price}} (ver services/gasolina_price.py)
+    ciudad: clave de la ciudad en el registro (services/gasolina_registry.py)
     """
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    for estacion, fuels in top_data.items():
-        for tipo, precio_str in fuels.items():
-            try:
-                precio = float(precio_str.replace("€", "").replace(",", ".").strip())
-                c.execute('''
-                    INSERT INTO precios_top (date, estacion, tipo_combustible, precio)
-                    VALUES (?, ?, ?, ?)
-                    ON CONFLICT(date, estacion, tipo_combustible)
-                    DO UPDATE SET precio = excluded.precio, timestamp = CURRENT_TIMESTAMP
-                ''', (date_str, estacion, tipo, precio))
-            except ValueError:
-                continue
-
-    conn.commit()
-    conn.close()
+    precios = [
+        (estacion, tipo, price.euros)
+        for estacion, fuels in top_data.items()
+        for tipo, price in fuels.items()
+        if price.milli is not None
+    ]
+    if not precios:
+        return
+    dia = _dia(date_str)
+    inicios = [(nivel, dia >> nivel << nivel) for nivel in range(ROLLUP_NIVELES)]
+    global _data_version
+    with transaction() as c:
+        actuales = {
+            (estacion, tipo): precio
+            for estacion, tipo, precio in c.execute(
+                "SELECT estacion, tipo_combustible, precio FROM precios_top WHERE ciudad = ? AND date = ?",
+                (ciudad, date_str),
+            )
+        }
+        cambios = [(e, t, p) for e, t, p in precios if actuales.get((e, t)) != p]
+        if not cambios:
+            return
+
+        rollups = []
+        bloques = []
+        # Extremos de los cambios por combustible, con el mismo desempate que _MEJOR_MAX / _MEJOR_MIN.
+        # Los precios que no cambian ya están en los rollups (MIN/MAX no varían al repetirlos)
+        maximos: dict[str, tuple[float, str]] = {}
+        minimos: dict[str, tuple[float, str]] = {}
+        for estacion, tipo, precio in cambios:
+            rollups.append((ciudad, tipo, date_str, estacion, precio, precio, precio, precio))
+            bloques.extend((ciudad, tipo, nivel, inicio, estacion, precio, precio) for nivel, inicio in inicios)
+            if tipo not in maximos or (-precio, estacion) < (-maximos[tipo][0], maximos[tipo][1]):
+                maximos[tipo] = (precio, estacion)
+            if tipo not in minimos or (precio, estacion) < minimos[tipo]:
+                minimos[tipo] = (precio, estacion)
+        bloques_ciudad = []
+        for tipo, (p_max, e_max) in maximos.items():
+            p_min, e_min = minimos[tipo]
+            bloques_ciudad.extend(
+                (ciudad, tipo, nivel, inicio, p_max, date_str, e_max, p_min, date_str, e_min)
+                for nivel, inicio in inicios
+            )
+
+        c.executemany(_UPSERT_TOP, [(ciudad, date_str, e, t, p) for e, t, p in cambios])
+        c.executemany(_UPSERT_ROLLUP, rollups)
+        c.executemany(
+            _UPSERT_ROLLUP_CIUDAD,
+            [(ciudad, tipo, date_str, precio) for tipo, (precio, _) in minimos.items()],
+        )
+        c.executemany(_UPSERT_BLOQUE, bloques)
+        c.executemany(_UPSERT_BLOQUE_CIUDAD, bloques_ciudad)
+    _data_version += 1   # Tras el COMMIT: nadie cachea estadísticas de antes con la versión nueva
+
+_DATASET_BATCH = 5000
+
+def insert_dataset(date_str: str, records) -> tuple[int, int]:
+    """
+    Carga masiva del dataset nacional en UNA transacción, sobre una conexión
+    propia: los registros se vuelcan por lotes de _DATASET_BATCH a tablas
+    temporales de esa conexión (sin bloquear la base ni el lock de la
+    compartida) y al final se pasan a estaciones / precios_estaciones de una
+    vez. Si la carga falla no queda nada a medias; con WAL los lectores ven
+    el día anterior hasta el COMMIT.
+    records: iterable (puede ser un generador en streaming) de dicts normalizados
+    {ideess, rotulo, direccion, localidad, municipio, provincia, cp, latitud, longitud, precios: {tipo: float}}
+    Devuelve (n_estaciones, n_precios).
+    """
+    n_estaciones = 0
+    n_precios = 0
+    estaciones_batch = []
+    precios_batch = []
+
+    conn = _open_connection()
+    try:
+        conn.execute("CREATE TEMP TABLE carga_estaciones AS SELECT * FROM estaciones WHERE 0")
+        conn.execute("CREATE TEMP TABLE carga_precios AS SELECT * FROM precios_estaciones WHERE 0")
+
+        def _flush():
+            conn.executemany("INSERT INTO carga_estaciones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", estaciones_batch)
+            conn.executemany("INSERT INTO carga_precios VALUES (?, ?, ?, ?)", precios_batch)
+            estaciones_batch.clear()
+            precios_batch.clear()
+
+        for r in records:
+            estaciones_batch.append((
+                r["ideess"], r["rotulo"], r["direccion"], r["localidad"],
+                r["municipio"], r["provincia"], r["cp"], r["latitud"], r["longitud"],
+            ))
+            for tipo, precio in r["precios"].items():
+                precios_batch.append((date_str, r["ideess"], tipo, precio))
+            n_estaciones += 1
+            n_precios += len(r["precios"])
+            if len(precios_batch) >= _DATASET_BATCH:
+                _flush()
+        _flush()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # WHERE true: sin él SQLite confunde el ON CONFLICT con un JOIN
+            conn.execute('''
+                INSERT INTO estaciones (ideess, rotulo, direccion, localidad, municipio, provincia, cp, latitud, longitud)
+                SELECT * FROM carga_estaciones WHERE true
+                ON CONFLICT(ideess) DO UPDATE SET
+                    rotulo = excluded.rotulo, direccion = excluded.direccion,
+                    localidad = excluded.localidad, municipio = excluded.municipio,
+                    provincia = excluded.provincia, cp = excluded.cp,
+                    latitud = excluded.latitud, longitud = excluded.longitud
+            ''')
+            conn.execute('''
+                INSERT INTO precios_estaciones (date, ideess, tipo_combustible, precio)
+                SELECT * FROM carga_precios WHERE true
+                ON CONFLICT(date, ideess, tipo_combustible) DO UPDATE SET precio = excluded.precio
+            ''')
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return n_estaciones, n_precios
@@ -0,0 +1,174 @@
+# services/gasolina_parsers.py
+"""
+Backends de parseo HTML para las cards `div.cuadro-precios`.
+
+Cada backend expone:
+  - cheapest_cards(html) -> [(tipo, precio_raw, estacion, direccion, href)]
+  - station_cards(html)  -> [(tipo, precio_raw)]
+
+"bs4" reproduce el parseo original con BeautifulSoup/html.parser; "lxml"
+extrae los mismos campos con XPath precompilado sobre el árbol C de lxml,
+sin construir el árbol Python de BeautifulSoup. Se elige con SCRAPER_PARSER.
+"""
+from config import SCRAPER_PARSER
+from logger import logger
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = None
+    lxml_html = None
+
+
+class Bs4Parser:
+    name = "bs4"
+
+    def cheapest_cards(self, html: str) -> list[tuple]:
+        from bs4 import BeautifulSoup  # Import diferido: solo si se usa este backend
+        soup = BeautifulSoup(html, "html.parser")
+        cards = []
+        for card in soup.select("div.cuadro-precios"):
+            try:
+                tipo_el = card.select_one("h2.uk-h4, h2.uk-h2")
+                precio_el = card.select_one("[itemprop='price']") or card.select_one(".uk-h2")
+                estacion_el = card.select_one(".uk-text-large")
+                dir_el = card.select_one("span")
+                link_el = card.select_one("a[href]")
+
+                if not tipo_el or not precio_el:
+                    continue
+
+                cards.append((
+                    tipo_el.get_text(strip=True),
+                    precio_el.get("content") or precio_el.get_text(strip=True),
+                    estacion_el.get_text(strip=True) if estacion_el else "",
+                    dir_el.get_text(strip=True) if dir_el else "",
+                    link_el["href"] if link_el else None,
+                ))
+            except Exception as e:
+                logger.warning(f"[Scraper] Error parseando card (cheapest): {e}")
+        return cards
+
+    def station_cards(self, html: str) -> list[tuple]:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        cards = []
+        for card in soup.select("div.cuadro-precios"):
+            try:
+                tipo_el = card.select_one("[itemprop='name'], h2.uk-h4")
+                precio_el = card.select_one("[itemprop='price'], .uk-h2")
+                if not tipo_el or not precio_el:
+                    continue
+                cards.append((
+                    tipo_el.get_text(strip=True),
+                    precio_el.get("content") or precio_el.get_text(strip=True),
+                ))
+            except Exception as e:
+                logger.warning(f"[Scraper] Error parseando card (station): {e}")
+        return cards
+
+
+def _has_class(cls: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+
+class LxmlParser:
+    """Mismos selectores que Bs4Parser traducidos a XPath (primer match en orden de documento)."""
+    name = "lxml"
+
+    def __init__(self):
+        self._parser = lxml_html.HTMLParser(encoding="utf-8")
+        self._cards = etree.XPath(f"//div[{_has_class('cuadro-precios')}]")
+        # cheapest
+        self._tipo_cheapest = etree.XPath(f"(.//h2[{_has_class('uk-h4')} or {_has_class('uk-h2')}])[1]")
+        self._precio_itemprop = etree.XPath("(.//*[@itemprop='price'])[1]")
+        self._precio_h2 = etree.XPath(f"(.//*[{_has_class('uk-h2')}])[1]")
+        self._estacion = etree.XPath(f"(.//*[{_has_class('uk-text-large')}])[1]")
+        self._direccion = etree.XPath("(.//span)[1]")
+        self._link = etree.XPath("(.//a[@href])[1]")
+        # station
+        self._tipo_station = etree.XPath(
+            f"(.//*[@itemprop='name' or (self::h2 and {_has_class('uk-h4')})])[1]"
+        )
+        self._precio_station = etree.XPath(
+            f"(.//*[@itemprop='price' or {_has_class('uk-h2')}])[1]"
+        )
+        # Texto visible: BeautifulSoup.get_text no cuenta <script>, <style> ni <template>
+        self._text_nodes = etree.XPath(
+            ".//text()[not(ancestor::script or ancestor::style or ancestor::template)]"
+        )
+
+    def _iter_cards(self, html: str):
+        try:
+            root = lxml_html.fromstring(html.encode("utf-8"), parser=self._parser)
+        except etree.ParserError:
+            # Documento vacío: BeautifulSoup devolvería simplemente 0 cards
+            return []
+        return self._cards(root)
+
+    @staticmethod
+    def _first(xpath, card):
+        found = xpath(card)
+        return found[0] if found else None
+
+    def _text(self, el) -> str:
+        # Equivalente a BeautifulSoup.get_text(strip=True)
+        return "".join(t.strip() for t in self._text_nodes(el))
+
+    def cheapest_cards(self, html: str) -> list[tuple]:
+        cards = []
+        for card in self._iter_cards(html):
+            try:
+                tipo_el = self._first(self._tipo_cheapest, card)
+                precio_el = self._first(self._precio_itemprop, card)
+                if precio_el is None:
+                    precio_el = self._first(self._precio_h2, card)
+                if tipo_el is None or precio_el is None:
+                    continue
+                estacion_el = self._first(self._estacion, card)
+                dir_el = self._first(self._direccion, card)
+                link_el = self._first(self._link, card)
+
+                cards.append((
+                    self._text(tipo_el),
+                    precio_el.get("content") or self._text(precio_el),
+                    self._text(estacion_el) if estacion_el is not None else "",
+                    self._text(dir_el) if dir_el is not None else "",
+                    link_el.get("href") if link_el is not None else None,
+                ))
+            except Exception as e:
+                logger.warning(f"[Scraper] Error parseando card (cheapest): {e}")
+        return cards
+
+    def station_cards(self, html: str) -> list[tuple]:
+        cards = []
+        for card in self._iter_cards(html):
+            try:
+                tipo_el = self._first(self._tipo_station, card)
+                precio_el = self._first(self._precio_station, card)
+                if tipo_el is None or precio_el is None:
+                    continue
+                cards.append((
+                    self._text(tipo_el),
+                    precio_el.get("content") or self._text(precio_el),
+                ))
+            except Exception as e:
+                logger.warning(f"[Scraper] Error parseando card (station): {e}")
+        return cards
+
+
+_parser = None
+
+
+def get_parser():
+    """Backend configurado en SCRAPER_PARSER ("lxml" por defecto, "bs4" como respaldo)."""
+    global _parser
+    if _parser is None:
+        if SCRAPER_PARSER == "lxml" and etree is not None:
+            _parser = LxmlParser()
+        else:
+            if SCRAPER_PARSER == "lxml":
+                logger.warning("[Scraper] ⚠️ lxml no está instalado, usando BeautifulSoup")
+            _parser = Bs4Parser()
+        logger.info(f"[Scraper] Parser HTML: {_parser.name}")
+    return _parser
@@ -0,0 +1,36 @@
+# services/gasolina_price.py
+"""
+Tipo único de precio: entero en milésimas de euro + texto original.
+
+Se construye una sola vez en el scraper (Price.parse) y lo usan tal cual el
+cálculo de ganadores, la persistencia, el diff de snapshots y los
+formateadores (str(price) devuelve el texto mostrado, p.ej. "1,459 €").
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import NamedTuple, Optional
+
+
+class Price(NamedTuple):
+    milli: Optional[int]   # 1,459 € -> 1459. None si el texto no es numérico ("N/D")
+    text: str              # Texto normalizado para mostrar: "1,459 €"
+
+    def __str__(self) -> str:
+        return self.text
+
+    @property
+    def euros(self) -> Optional[float]:
+        return None if self.milli is None else self.milli / 1000
+
+    @classmethod
+    def parse(cls, raw: str) -> "Price":
+        """
+        "1.459", "1,459€", "1,459\xa0€" -> Price(1459, "1,459 €").
+        Mismo texto que generaba el scraper: sin espacios ni €, coma decimal y " €".
+        """
+        clean = raw.replace("\xa0", "").replace("€", "").replace(" ", "").strip()
+        clean = clean.replace(".", ",")
+        try:
+            milli = int((Decimal(clean.replace(",", ".")) * 1000).to_integral_value(ROUND_HALF_UP))
+        except (InvalidOperation, ValueError, OverflowError):   # "N/D", "NaN", "Infinity"
+            milli = None
+        return cls(milli, clean + " €")
@@ -0,0 +1,86 @@
+# services/gasolina_registry.py
+"""
+Registro de ciudades y gasolineras a seguir.
+
+Se lee de CITIES_FILE (JSON), una lista de ciudades:
+
+    [
+      {
+        "key": "zgza",                      # prefijo de estado y valor de `ciudad` en la DB
+        "name": "Zaragoza",                 # nombre mostrado en los posts
+        "url": "https://preciocombustible.es/zaragoza/zaragoza",
+        "stations": {"Family Energy": "https://..."},
+        "image": "data/image_zaragoza.jpg", # opcional
+        "chat_id": -100123,                 # opcional, por defecto el chat general
+        "x": true                           # opcional, publicar también en X
+      }
+    ]
+
+Si el fichero no existe se usa solo Zaragoza con las gasolineras de siempre.
+"""
+import json
+import os
+
+from config import CITIES_FILE
+from logger import logger
+
+DEFAULT_CITY_KEY = "zgza"
+
+DEFAULT_CITIES = [
+    {
+        "key": DEFAULT_CITY_KEY,
+        "name": "Zaragoza",
+        "url": "https://preciocombustible.es/zaragoza/zaragoza",
+        "stations": {
+            "Family Energy": "https://preciocombustible.es/zaragoza/zaragoza/11519-family-energy",
+            "Bonarea":       "https://preciocombustible.es/zaragoza/zaragoza/13290-bonarea",
+            "CostCo":        "https://preciocombustible.es/zaragoza/zaragoza/16078-costco",
+            "GasExpress":    "https://preciocombustible.es/zaragoza/zaragoza/15376-gasexpress",
+        },
+        "image": "data/image_zaragoza.jpg",
+        "x": True,
+    },
+]
+
+_cities: list[dict] | None = None
+
+
+def _normalize_city(raw: dict) -> dict:
+    key = raw["key"]
+    return {
+        "key": key,
+        "name": raw.get("name", key),
+        "url": raw["url"],
+        "stations": dict(raw.get("stations", {})),
+        "image": raw.get("image", f"data/image_{key}.jpg"),
+        "chat_id": raw.get("chat_id"),
+        "x": bool(raw.get("x", False)),
+    }
+
+
+def load_cities(reload: bool = False) -> list[dict]:
+    """Devuelve las ciudades configuradas (cacheadas tras la primera lectura)."""
+    global _cities
+    if _cities is not None and not reload:
+        return _cities
+
+    cities = DEFAULT_CITIES
+    if os.path.exists(CITIES_FILE):
+        try:
+            with open(CITIES_FILE, encoding="utf-8") as f:
+                cities = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"[Registro] ❌ Error leyendo {CITIES_FILE}, usando Zaragoza por defecto: {e}")
+            cities = DEFAULT_CITIES
+
+    _cities = [_normalize_city(c) for c in cities]
+    n_stations = sum(len(c["stations"]) for c in _cities)
+    logger.info(f"[Registro] {len(_cities)} ciudades, {n_stations} gasolineras en seguimiento")
+    return _cities
+
+
+def get_city(key: str) -> dict | None:
+    for city in load_cities():
+        if city["key"] == key:
+            return city
+    return None
@@ -1,202 +1,239 @@
 # services/gasolina_scheduler.py
 import asyncio
-import json
-import os
 from datetime import date, datetime, timedelta
-from typing import List, Tuple
 import pytz
 import random
+import sys
 
 from logger import logger
-from config import IS_PROD, DEV_CHAT_ID, ADHOC_CHAT_ID
+from config import IS_PROD, DEV_CHAT_ID, ADHOC_CHAT_ID, TARGET_CONTEXTS, get_target_contexts
 from services.gasolina_scraper import (
     fetch_spain_cheapest,
-    fetch_zaragoza_cheapest,
-    fetch_top_stations,
+    fetch_city,
+    fetch_cities,
     format_combined_telegram,
     format_cheapest_x,
+    get_page_cache_stats,
 )
-from publishers.telegram_publisher import send_telegram_photo, edit_or_resend_photo, schedule_delayed_pin, unpin_telegram_message
-from publishers.x_publisher import send_x_text_with_image, send_x_text
+from publishers.telegram_publisher import send_telegram_photo, schedule_delayed_pin, unpin_telegram_message
+from publishers.x_publisher import queue_x_text_with_image, queue_x_text, get_x_queue_stats
 from publishers.telegram_publisher import send_telegram_message
-from services.gasolina_db import init_db, insert_precios_top
-from services.gasolina_stats import obtener_estadisticas_periodo, formato_estadisticas_telegram
+from publishers.telegram_broadcast import broadcast
+from publishers.telegram_edits import edit_captions
+from services.gasolina_db import insert_precios_top
+from services.gasolina_dataset import fetch_and_ingest_dataset
+from services.gasolina_stats import obtener_estadisticas_periodo, formato_estadisticas_telegram, get_stats_cache_stats
+from services.gasolina_registry import load_cities
+from services.gasolina_state import get_state, set_state, delete_state
+from services.gasolina_snapshot import PriceSnapshot
+from services.http_client import get_fetch_backend_stats
+from services.llm_cache import get_llm_cache_stats
+from services.gasolina_x_packer import get_packer_stats
 
-STATE_FILE   = "data/gasolina_state.json"
-IMG_ZARAGOZA = "data/image_zaragoza.jpg"
 IMG_ESPAÑA   = "data/image_españa.jpg"
 MADRID_TZ    = pytz.timezone("Europe/Madrid")
 
 
 # ── Estado ────────────────────────────────────────────────────
-
-def _load_state() -> dict:
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE) as f:
-            return json.load(f)
-    return {}
-
-
-def _save_state(state: dict) -> None:
-    os.makedirs("data", exist_ok=True)
-    tmp = STATE_FILE + ".tmp"
-    try:
-        with open(tmp, "w") as f:
-            json.dump(state, f, indent=2)
-        os.replace(tmp, STATE_FILE)  # Atomic write — evita JSON corrupto
-    except Exception as e:
-        logger.error(f"[Gasolina] ❌ Error guardando estado: {e}")
+# Persistido por clave en services/gasolina_state.py
 
 def _today() -> str:
     return datetime.now(MADRID_TZ).date().isoformat()
 
-# Inicializar DB
-init_db()
+# La DB (migraciones) se inicializa una vez tras arrancar, en el post_init
+# de bot/app.py, no como efecto secundario de importar este módulo.
 
 
-def _already_sent_today(state: dict, key: str) -> bool:
-    return state.get(key) == _today()
+def _already_sent_today(key: str) -> bool:
+    return get_state(key) == _today()
 
 
-def _mark_sent(state: dict, key: str) -> None:
-    state[key] = _today()
+def _mark_sent(key: str) -> None:
+    set_state(key, _today())
 
 
-# ── Helpers de datos ──────────────────────────────────────────
+def _k(city: dict, suffix: str) -> str:
+    """Clave de estado por ciudad: Zaragoza conserva las claves históricas zgza_*."""
+    return f"{city['key']}_{suffix}"
 
-def _normalize_price(price: str) -> str:
-    """Normaliza precio: strip, espacios simples, € consistente."""
-    return price.strip().replace("\u00a0", " ").replace("  ", " ")
 
-def _serialize_data(zgza_data: dict, top_data: dict) -> dict:
-    return {
-        "zgza": {k: _normalize_price(v["precio"]) for k, v in zgza_data.items()},
-        "top":  {
-            station: {fuel: _normalize_price(price) for fuel, price in fuels.items()}
-            for station, fuels in top_data.items()
-        },
-    }
+def _city_chat_id(city: dict) -> int:
+    """Chat único de antes del broadcast (solo para leer el message_id heredado)."""
+    if city.get("chat_id") and IS_PROD:
+        return city["chat_id"]
+    return ADHOC_CHAT_ID if IS_PROD else DEV_CHAT_ID
 
-def _data_changed(old: dict, new: dict) -> bool:
-    """Compara si los precios han cambiado respecto al último snapshot."""
-    return old != new
 
-def _snapshot_price_changes(old: dict, new: dict) -> List[Tuple[str, str, str, str]]:
+def _city_contexts(city: dict) -> list[tuple[int, int | None]]:
     """
-    Devuelve cambios detectados como:
-    [(scope, fuel, old_price, new_price), ...]
-    scope: nombre de estacion en top, o "Más barata Zaragoza" para bloque zgza.
+    Destinos (chat_id, thread_id) de Telegram de una ciudad.
+    Prod: el chat propio de la ciudad o, si no tiene, ADHOC_CHAT_ID + TARGET_CONTEXTS.
+    Dev: DEV_CHAT_ID.
     """
-    changes: List[Tuple[str, str, str, str]] = []
-
-    old_zgza = (old or {}).get("zgza", {})
-    new_zgza = (new or {}).get("zgza", {})
-    for fuel in sorted(set(old_zgza.keys()) | set(new_zgza.keys())):
-        old_price = old_zgza.get(fuel, "N/A")
-        new_price = new_zgza.get(fuel, "N/A")
-        if old_price != new_price:
-            changes.append(("Más barata Zaragoza", fuel, old_price, new_price))
-
-    old_top = (old or {}).get("top", {})
-    new_top = (new or {}).get("top", {})
-    for station in sorted(set(old_top.keys()) | set(new_top.keys())):
-        old_fuels = old_top.get(station, {})
-        new_fuels = new_top.get(station, {})
-        for fuel in sorted(set(old_fuels.keys()) | set(new_fuels.keys())):
-            old_price = old_fuels.get(fuel, "N/A")
-            new_price = new_fuels.get(fuel, "N/A")
-            if old_price != new_price:
-                changes.append((station, fuel, old_price, new_price))
-
-    return changes
+    if not IS_PROD:
+        return get_target_contexts()
+    if city.get("chat_id"):
+        return [(city["chat_id"], None)]
+    contexts = [(ADHOC_CHAT_ID, None)] if ADHOC_CHAT_ID else []
+    contexts += TARGET_CONTEXTS
+    return list(dict.fromkeys(contexts)) or get_target_contexts()
+
+
+def _get_messages(city: dict) -> list[tuple[int, int | None, int]]:
+    """Posts del día por contexto: [(chat_id, thread_id, message_id), ...]."""
+    messages = get_state(_k(city, "messages"))
+    if messages is None:
+        legacy_id = get_state(_k(city, "message_id"))
+        return [(_city_chat_id(city), None, legacy_id)] if legacy_id else []
+    return [tuple(m) for m in messages]
+
+
+def _set_messages(city: dict, messages) -> None:
+    set_state(_k(city, "messages"), [list(m) for m in messages])
+    delete_state(_k(city, "message_id"))
 
 
 # ── Job 10:00 — envío diario ──────────────────────────────────
+# España y cada ciudad son pipelines independientes que corren a la vez:
+# cada uno tiene sus propios reintentos y solo escribe sus propias claves
+# de estado, así que un scrape de España caído no retrasa el post de Zaragoza.
+
+DAILY_ATTEMPTS    = 3
+DAILY_RETRY_DELAY = 60 * 5   # segundos entre reintentos de un mismo pipeline
+
 
 async def run_gasolina_daily(ctx) -> None:
     app   = ctx.application
-    state = _load_state()
-    chat_id = ADHOC_CHAT_ID if IS_PROD else DEV_CHAT_ID
 
-    # ── 1. España → X con imagen ──────────────────────────────
-    for attempt in range(1, 4):
-        if _already_sent_today(state, "spain_x"):
-            break
-        try:
-            logger.info(f"[Gasolina/Daily] España - Intento {attempt}")
-            spain_data = await fetch_spain_cheapest()
-            if spain_data:
-                text_x = await format_cheapest_x(spain_data, "España")
-                if IS_PROD:
-                    await send_x_text_with_image(text_x, IMG_ESPAÑA)
-                else:
-                    logger.info(f"[Gasolina/DEV] X España:\n{text_x}")
-                _mark_sent(state, "spain_x")
-                _save_state(state)
-                break
-            else:
-                logger.warning("[Gasolina/Daily] No hay datos de España, no se envía nada hoy.")
-                break # Si no hay datos devueltos, no vale la pena reintentar, quizá el scraper falló al parsear pero no lanzó error.
-        except Exception as e:
-            logger.error(f"[Gasolina/Daily] Error España (Intento {attempt}): {e}")
-            if attempt < 3:
-                await asyncio.sleep(60 * 5) # 5 minutos de espera entre reintentos
-
-    # ── 2. Zaragoza → Telegram (con imagen) + X ───────────────
-    for attempt in range(1, 4):
-        if _already_sent_today(state, "zgza_combined"):
-            break
+    pipelines = {"España": _run_spain_daily()}
+    for city in load_cities():
+        pipelines[city["name"]] = _run_city_daily(app, city)
+
+    results = await asyncio.gather(*pipelines.values(), return_exceptions=True)
+    for name, result in zip(pipelines, results):
+        if isinstance(result, BaseException):
+            logger.error(f"[Gasolina/Daily] Pipeline {name} abortado: {result}", exc_info=result)
+
+    logger.info(f"[Gasolina/Daily] Cola de X: {get_x_queue_stats()}")
+    # ai.openrouter solo está cargado si algún texto necesitó el LLM
+    openrouter = sys.modules.get("ai.openrouter")
+    logger.info(
+        f"[Gasolina/Daily] Empaquetado X: {get_packer_stats()} | Caché de acortados LLM: {get_llm_cache_stats()} "
+        f"| OpenRouter: {openrouter.get_openrouter_stats() if openrouter else 'sin uso'}"
+    )
+
+
+async def _with_retries(name: str, sent_key: str, step) -> None:
+    """
+    Ejecuta `step` hasta DAILY_ATTEMPTS veces, esperando DAILY_RETRY_DELAY
+    entre fallos. Se detiene en cuanto `sent_key` consta como enviado hoy o
+    `step` termina sin excepción (con o sin datos).
+    """
+    for attempt in range(1, DAILY_ATTEMPTS + 1):
+        if _already_sent_today(sent_key):
+            return
         try:
-            logger.info(f"[Gasolina/Daily] Zaragoza - Intento {attempt}")
-            zgza_data, top_data = await asyncio.gather(
-                fetch_zaragoza_cheapest(),
-                fetch_top_stations(),
-            )
-            if zgza_data:
-                # Desfijar mensaje del día anterior antes de enviar el nuevo
-                old_msg_id = state.get("zgza_message_id")
-                if old_msg_id:
-                    await unpin_telegram_message(app, chat_id, old_msg_id)
-
-                text_tg = format_combined_telegram(zgza_data, top_data, "Zaragoza")
-                text_x  = await format_cheapest_x(zgza_data, "Zaragoza")
-
-                msg_id = await send_telegram_photo(app, chat_id, None, text_tg, IMG_ZARAGOZA)
-
-                if IS_PROD:
-                    await send_x_text(text_x)
-                else:
-                    logger.info(f"[Gasolina/DEV] X Zaragoza:\n{text_x}")
-
-                # Programar el pin (no bloquea)
-                if msg_id:
-                    delay = random.choice([3, 4, 5])
-                    schedule_delayed_pin(app, chat_id, msg_id, delay_hours=delay)
-
-                _mark_sent(state, "zgza_combined")
-
-                # Guardar message_id y snapshot de datos para updates horarios
-                if msg_id:
-                    state["zgza_message_id"]   = msg_id
-                    state["zgza_message_date"]  = _today()
-                    serialized = _serialize_data(zgza_data, top_data)
-                    state["zgza_last_snapshot"] = serialized
-                    state["zgza_initial_snapshot"] = serialized
-                    _save_state(state)
-                    
-                # Guardar en base de datos historica
-                insert_precios_top(_today(), top_data)
-                
-                break
-            else:
-                logger.warning("[Gasolina/Daily] No hay datos de Zaragoza, no se envía nada hoy.")
-                break # Evitamos bucle si el scraper devuelve null de manera válida
+            logger.info(f"[Gasolina/Daily] {name} - Intento {attempt}")
+            await step()
+            return
         except Exception as e:
-            logger.error(f"[Gasolina/Daily] Error Zaragoza (Intento {attempt}): {e}")
-            if attempt < 3:
-                await asyncio.sleep(60 * 5) # 5 minutos de espera entre reintentos
+            logger.error(f"[Gasolina/Daily] Error {name} (Intento {attempt}): {e}")
+            if attempt < DAILY_ATTEMPTS:
+                await asyncio.sleep(DAILY_RETRY_DELAY)
+
+
+async def _run_spain_daily() -> None:
+    """España → X con imagen."""
+    await _with_retries("España", "spain_x", _send_spain_daily)
+
+
+async def _send_spain_daily() -> None:
+    spain_data = await fetch_spain_cheapest()
+    if not spain_data:
+        # Si no hay datos devueltos no vale la pena reintentar: quizá el scraper
+        # falló al parsear pero no lanzó error.
+        logger.warning("[Gasolina/Daily] No hay datos de España, no se envía nada hoy.")
+        return
+
+    text_x = await format_cheapest_x(spain_data, "España")
+    if IS_PROD:
+        # Encolado: la publicación (y sus reintentos) no retrasa el resto del job.
+        # Consta como enviado cuando la cola confirma el post, no al encolarlo
+        queue_x_text_with_image(text_x, IMG_ESPAÑA, on_done=_on_spain_posted)
+    else:
+        logger.info(f"[Gasolina/DEV] X España:\n{text_x}")
+        _mark_sent("spain_x")
+
+
+def _on_spain_posted(ok: bool) -> None:
+    if ok:
+        _mark_sent("spain_x")
+    else:
+        logger.error("[Gasolina/Daily] El post de España en X falló tras todos los reintentos de la cola.")
+
 
-    _save_state(state)
+async def _run_city_daily(app, city: dict) -> None:
+    """Ciudad → Telegram (con imagen) + X."""
+    await _with_retries(city["name"], _k(city, "combined"), lambda: _send_city_daily(app, city))
+
+
+async def _send_city_daily(app, city: dict) -> None:
+    name     = city["name"]
+    contexts = _city_contexts(city)
+
+    zgza_data, top_data = await fetch_city(city)
+    if not zgza_data:
+        # Evitamos bucle si el scraper devuelve null de manera válida
+        logger.warning(f"[Gasolina/Daily] No hay datos de {name}, no se envía nada hoy.")
+        return
+
+    # Desfijar los mensajes del día anterior antes de enviar los nuevos
+    old_ids = {(c, t): m for c, t, m in _get_messages(city)}
+    if old_ids:
+        await broadcast(
+            old_ids,
+            lambda c, t: unpin_telegram_message(app, c, old_ids[(c, t)]),
+            label=f"Desfijar {name}",
+        )
+
+    text_tg = format_combined_telegram(zgza_data, top_data, name)
+    # warmup: la primera subida deja el file_id en caché para el resto
+    sent = await broadcast(
+        contexts,
+        lambda c, t: send_telegram_photo(app, c, t, text_tg, city["image"]),
+        label=f"Diario {name}",
+        warmup=True,
+    )
+    messages = [(c, t, m) for (c, t), m in sent.items() if m]
+
+    if city["x"]:
+        text_x = await format_cheapest_x(zgza_data, name)
+        if IS_PROD:
+            queue_x_text(text_x)
+        else:
+            logger.info(f"[Gasolina/DEV] X {name}:\n{text_x}")
+
+    # Programar los pins (no bloquea)
+    delay = random.choice([3, 4, 5])
+    for c, _t, m in messages:
+        schedule_delayed_pin(app, c, m, delay_hours=delay)
+
+    _mark_sent(_k(city, "combined"))
+
+    # Guardar message_ids y snapshot de datos para updates horarios.
+    # Sin awaits entre estas escrituras: el estado de la ciudad se actualiza
+    # de una vez, sin intercalarse con otros pipelines.
+    if messages:
+        _set_messages(city, messages)
+        set_state(_k(city, "message_date"), _today())
+        snapshot   = PriceSnapshot.from_data(zgza_data, top_data)
+        serialized = snapshot.to_json()
+        set_state(_k(city, "last_snapshot"), serialized)
+        set_state(_k(city, "last_fingerprint"), snapshot.fingerprint)
+        set_state(_k(city, "initial_snapshot"), serialized)
+
+    # Guardar en base de datos historica
+    insert_precios_top(_today(), top_data, city["key"])
 
 
 # ── Job horario — actualizar caption ─────────────────────────
@@ -204,20 +241,12 @@ async def run_gasolina_daily(ctx) -> None:
 async def run_gasolina_update(ctx) -> None:
     """
     Se ejecuta cada hora (11:00 → 09:00 del día siguiente).
-    Edita el caption del post de Telegram con datos frescos.
+    Edita el caption del post de Telegram de cada ciudad con datos frescos.
     Siempre actualiza la hora; los datos solo si cambiaron.
     """
-    app     = ctx.application
-    state   = _load_state()
-    chat_id = ADHOC_CHAT_ID if IS_PROD else DEV_CHAT_ID
-
-    msg_id       = state.get("zgza_message_id")
-    msg_date     = state.get("zgza_message_date")
-    last_snapshot = state.get("zgza_last_snapshot", {})
-    initial_snapshot = state.get("zgza_initial_snapshot", {})
+    app   = ctx.application
 
     now_madrid = datetime.now(MADRID_TZ)
-    hora_str   = now_madrid.strftime("%H:%M")
 
     # El post diario es a las 10:10.
     # Antes de las 10:00 (por ejemplo en el job de las 00:10 a 09:10), el post válido es el de ayer.
@@ -231,122 +260,149 @@ async def run_gasolina_update(ctx) -> None:
         # A partir de las 10:00, tiene que ser el post de hoy
         valid_date = _today()
 
-    if not msg_id or msg_date != valid_date:
-        logger.info(f"[Gasolina/Update] Sin post activo de la jornada (esperado={valid_date}, actual={msg_date}), nada que editar.")
+    active = []
+    for city in load_cities():
+        msg_date = get_state(_k(city, "message_date"))
+        if not _get_messages(city) or msg_date != valid_date:
+            logger.info(f"[Gasolina/Update] {city['name']}: sin post activo de la jornada (esperado={valid_date}, actual={msg_date}), nada que editar.")
+            continue
+        active.append(city)
+
+    if not active:
         return
 
-    try:
-        zgza_data, top_data = await asyncio.gather(
-            fetch_zaragoza_cheapest(),
-            fetch_top_stations(),
-        )
+    # Un único fan-out para todas las ciudades (límites global y por host en el cliente HTTP)
+    scraped = await fetch_cities(active)
 
-        if not zgza_data:
-            logger.warning("[Gasolina/Update] Sin datos scrapeados, skip.")
-            return
+    page_stats = get_page_cache_stats()
+    logger.info(
+        f"[Gasolina/Update] Caché de páginas hoy: {page_stats['hits']} parseos evitados "
+        f"(304={page_stats['not_modified']}, hash={page_stats['hash_hits']}), "
+        f"{page_stats['misses']} parseos completos | Backends HTTP: {get_fetch_backend_stats()}"
+    )
 
-        new_snapshot = _serialize_data(zgza_data, top_data)
+    for city in active:
+        result = scraped.get(city["key"])
+        if result is None:
+            continue
+        try:
+            await _update_city(app, city, *result, now_madrid.strftime("%H:%M"))
+        except Exception as e:
+            logger.error(f"[Gasolina/Update] Error {city['name']}: {e}", exc_info=True)
 
-        logger.debug(f"[Gasolina/Update] OLD snapshot: {json.dumps(last_snapshot, ensure_ascii=False)}")
-        logger.debug(f"[Gasolina/Update] NEW snapshot: {json.dumps(new_snapshot, ensure_ascii=False)}")
 
-        changed      = _data_changed(last_snapshot, new_snapshot)
+async def _update_city(app, city: dict, zgza_data: dict, top_data: dict, hora_str: str) -> None:
+    name     = city["name"]
+    messages = _get_messages(city)
 
-        if changed:
-            for station, fuel, old_price, new_price in _snapshot_price_changes(last_snapshot, new_snapshot):
-                logger.info(
-                    f"[Gasolina/Update] ✅ ({hora_str}) {station} | {fuel}: {old_price} -> {new_price}"
-                )
-            state["zgza_last_snapshot"] = new_snapshot
+    last_snapshot    = get_state(_k(city, "last_snapshot"), {})
+    initial_snapshot = get_state(_k(city, "initial_snapshot"), {})
 
-        # Siempre regenerar el caption con la hora actualizada
-        # (datos frescos si cambiaron, último snapshot si no)
-        data_to_render = zgza_data if changed else _snapshot_to_render(last_snapshot, zgza_data)
-        top_to_render  = top_data  if changed else _snapshot_top_to_render(last_snapshot, top_data)
+    if not zgza_data:
+        logger.warning(f"[Gasolina/Update] {name}: sin datos scrapeados, skip.")
+        return
 
-        new_caption = format_combined_telegram(
-            data_to_render, top_to_render, "Zaragoza",
-            updated_at=hora_str,
-            has_changes=changed,
-            initial_snapshot=initial_snapshot,
-        )
+    new_snapshot = PriceSnapshot.from_data(zgza_data, top_data)
 
-        valid_msg_id = await edit_or_resend_photo(
-            app, chat_id,
-            thread_id=None,
-            message_id=msg_id,
-            new_text=new_caption,
-            image_path=IMG_ZARAGOZA,
-        )
+    # La huella se guarda junto al snapshot: si no ha cambiado nada no se
+    # deserializa el snapshot anterior, solo se comparan dos cadenas
+    old_fingerprint = get_state(_k(city, "last_fingerprint"))
+    if old_fingerprint is None:
+        # Estado previo a la huella persistida: calcularla una vez y guardarla
+        old_fingerprint = PriceSnapshot.from_json(last_snapshot).fingerprint
+        set_state(_k(city, "last_fingerprint"), old_fingerprint)
 
-        if valid_msg_id and valid_msg_id != msg_id:
-            # El mensaje fue reenviado → actualizar el id en estado
-            logger.info(f"[Gasolina/Update] 🔄 Nuevo message_id: {msg_id} → {valid_msg_id}")
-            state["zgza_message_id"] = valid_msg_id
-            state["zgza_message_date"] = _today()
+    logger.debug(f"[Gasolina/Update] OLD snapshot: {old_fingerprint}")
+    logger.debug(f"[Gasolina/Update] NEW snapshot: {new_snapshot.fingerprint}")
 
-        _save_state(state)
+    changed = old_fingerprint != new_snapshot.fingerprint
 
-        # Guardar en base de datos historica si hubo cambios
-        if changed:
-            insert_precios_top(_today(), top_data)
+    if changed:
+        old_snapshot = PriceSnapshot.from_json(last_snapshot)
+        for station, fuel, old_price, new_price in old_snapshot.diff(new_snapshot, name):
+            logger.info(
+                f"[Gasolina/Update] ✅ ({hora_str}) {station} | {fuel}: {old_price} -> {new_price}"
+            )
+        set_state(_k(city, "last_snapshot"), new_snapshot.to_json())
+        set_state(_k(city, "last_fingerprint"), new_snapshot.fingerprint)
+
+    # Siempre regenerar el caption con la hora actualizada. Sin cambios los
+    # datos frescos son los del último snapshot, y traen la estructura completa
+    # (estacion/direccion/url)
+    new_caption = format_combined_telegram(
+        zgza_data, top_data, name,
+        updated_at=hora_str,
+        has_changes=changed,
+        initial_snapshot=initial_snapshot,
+    )
+
+    # Coalesce y descarta ediciones idénticas a la última enviada a cada mensaje.
+    # La cabecera solo lleva la hora: si el resto no cambia, no se edita
+    body = new_caption.split("\n", 1)[-1]
+    results = await edit_captions(app, messages, new_caption, city["image"], label=f"Update {name}", body=body)
+
+    updated = []
+    for c, t, msg_id in messages:
+        valid_msg_id = results.get((c, t))
+        if valid_msg_id and valid_msg_id != msg_id:
+            # El mensaje fue reenviado → actualizar el id en estado
+            logger.info(f"[Gasolina/Update] 🔄 {name}: chat_id={c} nuevo message_id: {msg_id} → {valid_msg_id}")
+            msg_id = valid_msg_id
+        updated.append((c, t, msg_id))
+    if updated != messages:
+        _set_messages(city, updated)
+        set_state(_k(city, "message_date"), _today())
 
-    except Exception as e:
-        logger.error(f"[Gasolina/Update] Error: {e}", exc_info=True)
+    # Guardar en base de datos historica si hubo cambios
+    if changed:
+        insert_precios_top(_today(), top_data, city["key"])
 
 
-def _snapshot_to_render(snapshot: dict, fresh_data: dict) -> dict:
-    """
-    Si no hubo cambios, devuelve los datos originales del scrape fresco
-    (que tienen la estructura completa con estacion/direccion/url).
-    Si el snapshot no tiene cambios los datos frescos son iguales, así que
-    simplemente usamos fresh_data directamente.
-    """
-    return fresh_data if fresh_data else snapshot.get("zgza", {})
+# ── Dataset nacional ──────────────────────────────────────────
 
-def _snapshot_top_to_render(snapshot: dict, fresh_top: dict) -> dict:
-    return fresh_top
+async def run_gasolina_dataset(ctx) -> None:
+    """Descarga e ingesta el dataset nacional completo de estaciones."""
+    try:
+        await fetch_and_ingest_dataset(_today())
+    except Exception as e:
+        logger.error(f"[Gasolina/Dataset] ❌ Error ingestando dataset nacional: {e}", exc_info=True)
 
 # ── Resúmenes Estadísticos ────────────────────────────────────
 
 async def run_gasolina_weekly_summary(ctx) -> None:
-    """Envía el resumen semanal (últimos 7 días)"""
-    app = ctx.application
-    chat_id = ADHOC_CHAT_ID if IS_PROD else DEV_CHAT_ID
-
-    stats = obtener_estadisticas_periodo(dias=7)
-    if not stats:
-        logger.warning("[Gasolina/Semanal] Sin datos para el resumen semanal.")
-        return
-
-    text_tg = formato_estadisticas_telegram(stats, "Semanal")
-
-    try:
-        await send_telegram_message(app, chat_id, None, text_tg)
-        logger.info("[Gasolina/Semanal] ✅ Resumen semanal enviado con éxito.")
-    except Exception as e:
-        logger.error(f"[Gasolina/Semanal] ❌ Error enviando resumen semanal: {e}", exc_info=True)
+    """Envía el resumen semanal (últimos 7 días) de cada ciudad"""
+    for city in load_cities():
+        await _send_summary(ctx.application, city, dias=7, periodo="Semanal", tag="Semanal")
 
 
 async def run_gasolina_monthly_summary(ctx) -> None:
-    """Envía el resumen mensual (últimos 30 días)"""
-    app = ctx.application
-    chat_id = ADHOC_CHAT_ID if IS_PROD else DEV_CHAT_ID
-
+    """Envía el resumen mensual (últimos 30 días) de cada ciudad"""
     # Solo ejecutar el día 1 de cada mes
     hoy = datetime.now(MADRID_TZ)
     if hoy.day != 1:
         return
 
-    stats = obtener_estadisticas_periodo(dias=30)
+    for city in load_cities():
+        await _send_summary(ctx.application, city, dias=30, periodo="Mensual", tag="Mensual")
+
+
+async def _send_summary(app, city: dict, dias: int, periodo: str, tag: str) -> None:
+    name    = city["name"]
+
+    stats = obtener_estadisticas_periodo(dias=dias, ciudad=city["key"])
+    logger.debug(f"[Gasolina/{tag}] Caché de estadísticas: {get_stats_cache_stats()}")
     if not stats:
-        logger.warning("[Gasolina/Mensual] Sin datos para el resumen mensual.")
+        logger.warning(f"[Gasolina/{tag}] {name}: sin datos para el resumen {periodo.lower()}.")
         return
 
-    text_tg = formato_estadisticas_telegram(stats, "Mensual")
+    text_tg = formato_estadisticas_telegram(stats, periodo, name)
 
     try:
-        await send_telegram_message(app, chat_id, None, text_tg)
-        logger.info("[Gasolina/Mensual] ✅ Resumen mensual enviado con éxito.")
+        await broadcast(
+            _city_contexts(city),
+            lambda c, t: send_telegram_message(app, c, t, text_tg),
+            label=f"Resumen {periodo.lower()} {name}",
+        )
+        logger.info(f"[Gasolina/{tag}] ✅ Resumen {periodo.lower()} de {name} enviado con éxito.")
     except Exception as e:
-        logger.error(f"[Gasolina/Mensual] ❌ Error enviando resumen mensual: {e}", exc_info=True)
+        logger.error(f"[Gasolina/{tag}] ❌ Error enviando resumen {periodo.lower()} de {name}: {e}", exc_info=True)
@@ -1,160 +1,207 @@
 # services/gasolina_scraper.py
 import asyncio
+import copy
+import hashlib
 import re
-import requests
-from bs4 import BeautifulSoup
 from datetime import date
+from typing import Callable
 from logger import logger
-try:
-    from twitter_text import parse_tweet
-except ImportError:
-    def parse_tweet(text):
-        class Dummy:
-            pass
-        d = Dummy()
-        d.weightedLength = len(text)
-        return d
-from services.x_selenium import optimize_recommendation_for_x
-
-UA = "mi-scraper/1.0 (contacto: tu_email@dominio)"
+from services.http_client import fetch
+from services.gasolina_parsers import get_parser
+from services.gasolina_registry import DEFAULT_CITY_KEY, get_city
+from services.gasolina_price import Price
+from services.gasolina_x_packer import pack_fuel_lines, parse_tweet, render_lines, STEPS
 
 # ── URLs ──────────────────────────────────────────────────────
+# Las URLs de cada ciudad y sus gasolineras viven en services/gasolina_registry.py
 URL_SPAIN   = "https://preciocombustible.es/"
-URL_ZGZA    = "https://preciocombustible.es/zaragoza/zaragoza"
-URLS_TOP    = {
-    "Family Energy": "https://preciocombustible.es/zaragoza/zaragoza/11519-family-energy",
-    "Bonarea":       "https://preciocombustible.es/zaragoza/zaragoza/13290-bonarea",
-    "CostCo":        "https://preciocombustible.es/zaragoza/zaragoza/16078-costco",
-    "GasExpress":    "https://preciocombustible.es/zaragoza/zaragoza/15376-gasexpress",
-}
 
 FUEL_ORDER = ["Gasolina 95 E5", "Gasolina 98 E5", "Gasoleo A", "Gasoleo Premium"]
 
 
-def _get_html(url: str) -> str:
-    r = requests.get(url, headers={"User-Agent": UA}, timeout=30)
-    r.raise_for_status()
-    return r.text
+# ── Caché de páginas (GET condicional + hash de la zona de precios) ──
+# url -> {"etag", "last_modified", "hash", "parsed"}
+_page_cache: dict[str, dict] = {}
+_page_stats: dict = {"fecha": None, "not_modified": 0, "hash_hits": 0, "misses": 0}
+
+_CARD_OPEN = re.compile(r"""<div\b[^>]*\bclass=["'][^"']*\bcuadro-precios\b""", re.I)
+_DIV_TAG   = re.compile(r"<(/?)div\b", re.I)
+
+
+def _card_end(html: str, start: int) -> int:
+    """Posición tras el </div> que cierra la card abierta en `start` (cuenta los div anidados)."""
+    depth = 0
+    for m in _DIV_TAG.finditer(html, start):
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            end = html.find(">", m.end())
+            return len(html) if end < 0 else end + 1
+    return len(html)
+
+
+def _relevant_region(html: str) -> str:
+    """
+    Solo las cards de precios (div.cuadro-precios), que es lo único que leen
+    los parsers: sin cabeceras, scripts ni tablas, y cada card completa por
+    larga que sea. Sin cards, el HTML entero.
+    """
+    cards = []
+    end = 0
+    for m in _CARD_OPEN.finditer(html):
+        if m.start() < end:
+            continue   # Dentro de la card anterior
+        end = _card_end(html, m.start())
+        cards.append(html[m.start():end])
+    return "\n".join(cards) if cards else html
+
+
+def _count_page(kind: str) -> None:
+    hoy = date.today().isoformat()
+    if _page_stats["fecha"] != hoy:
+        _page_stats.update(fecha=hoy, not_modified=0, hash_hits=0, misses=0)
+    _page_stats[kind] += 1
+
+
+def get_page_cache_stats() -> dict:
+    """
+    Contadores del día: not_modified (304), hash_hits (200 con la zona de
+    precios idéntica) y misses (parseo completo). hits = parseos evitados.
+    """
+    stats = dict(_page_stats)
+    stats["hits"] = stats["not_modified"] + stats["hash_hits"]
+    return stats
+
+
+async def _fetch_parsed(url: str, parse: Callable[[str], dict]) -> dict:
+    """
+    Descarga `url` con GET condicional y solo la parsea si la zona de precios
+    cambió; si no, devuelve una copia del último resultado parseado.
+    """
+    entry = _page_cache.get(url)
+    headers = {}
+    if entry:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    r = await fetch(url, headers=headers or None)
+
+    if r.status_code == 304 and entry:
+        _count_page("not_modified")
+        return copy.deepcopy(entry["parsed"])
+
+    html = r.text
+    digest = hashlib.blake2b(_relevant_region(html).encode(), digest_size=16).hexdigest()
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+
+    if entry and entry["hash"] == digest:
+        entry.update(etag=etag, last_modified=last_modified)
+        _count_page("hash_hits")
+        return copy.deepcopy(entry["parsed"])
+
+    parsed = parse(html)
+    _count_page("misses")
+    if parsed:
+        _page_cache[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "hash": digest,
+            "parsed": copy.deepcopy(parsed),
+        }
+    return parsed
 
 def _find_top_winners(top_data: dict) -> dict[str, set[str]]:
     """
     Devuelve {fuel_type: {station1, station2, ...}} con las gasolineras
     más baratas por tipo de combustible dentro del top.
-    Soporta empates.
+    Soporta empates (comparación exacta en milésimas de euro).
     """
-    min_prices: dict[str, float] = {}
+    min_prices: dict[str, int] = {}
     winners: dict[str, set[str]] = {}
 
-    def _parse(price_str: str) -> float:
-        return float(price_str.replace("€", "").replace(",", ".").strip())
-
-    # Primera pasada: encontrar precio mínimo por combustible
-    for station, fuels in top_data.items():
-        for fuel, price_str in fuels.items():
-            try:
-                price = _parse(price_str)
-                if fuel not in min_prices or price < min_prices[fuel]:
-                    min_prices[fuel] = price
-            except ValueError:
-                continue
-
-    # Segunda pasada: marcar ganadores (con soporte de empate)
     for station, fuels in top_data.items():
-        for fuel, price_str in fuels.items():
-            try:
-                price = _parse(price_str)
-                if fuel in min_prices and price == min_prices[fuel]:
-                    winners.setdefault(fuel, set()).add(station)
-            except ValueError:
+        for fuel, price in fuels.items():
+            if price.milli is None:
                 continue
+            best = min_prices.get(fuel)
+            if best is None or price.milli < best:
+                min_prices[fuel] = price.milli
+                winners[fuel] = {station}
+            elif price.milli == best:
+                winners[fuel].add(station)
 
     return winners
 
 def _parse_cheapest_block(html: str) -> dict[str, dict]:
     """
     Parsea el bloque uk-grid con los precios más baratos por tipo.
-    Devuelve {tipo: {precio, estacion, direccion, url}}
+    Devuelve {tipo: {precio: Price, estacion, direccion, url}}
     """
-    soup = BeautifulSoup(html, "html.parser")
     results = {}
-
-    for card in soup.select("div.cuadro-precios"):
-        try:
-            tipo_el = card.select_one("h2.uk-h4, h2.uk-h2")
-            precio_el = card.select_one("[itemprop='price']") or card.select_one(".uk-h2")
-            estacion_el = card.select_one(".uk-text-large")
-            dir_el = card.select_one("span")
-            link_el = card.select_one("a[href]")
-
-            if not tipo_el or not precio_el:
-                continue
-
-            tipo = tipo_el.get_text(strip=True)
-            raw  = precio_el.get("content") or precio_el.get_text(strip=True)
-            raw  = raw.replace("\xa0", "").replace("€", "").replace(" ", "").strip()
-            raw  = raw.replace(".", ",")
-            precio = raw + " €"
-
-            results[tipo] = {
-                "precio": precio,
-                "estacion": estacion_el.get_text(strip=True) if estacion_el else "",
-                "direccion": dir_el.get_text(strip=True) if dir_el else "",
-                "url": "https://preciocombustible.es" + link_el["href"] if link_el else "",
-            }
-        except Exception as e:
-            logger.warning(f"[Scraper] Error parseando card (cheapest): {e}")
-            continue
-
+    for tipo, raw, estacion, direccion, href in get_parser().cheapest_cards(html):
+        results[tipo] = {
+            "precio": Price.parse(raw),
+            "estacion": estacion,
+            "direccion": direccion,
+            "url": "https://preciocombustible.es" + href if href is not None else "",
+        }
     return results
 
-def _parse_station_block(html: str) -> dict[str, str]:
+def _parse_station_block(html: str) -> dict[str, Price]:
     """
     Parsea la página de una gasolinera concreta.
-    Devuelve {tipo: precio}
+    Devuelve {tipo: Price}
     """
-    soup = BeautifulSoup(html, "html.parser")
-    results = {}
-
-    for card in soup.select("div.cuadro-precios"):
-        try:
-            tipo_el = card.select_one("[itemprop='name'], h2.uk-h4")
-            precio_el = card.select_one("[itemprop='price'], .uk-h2")
-            if not tipo_el or not precio_el:
-                continue
-            tipo = tipo_el.get_text(strip=True)
-            raw  = precio_el.get("content") or precio_el.get_text(strip=True)
-            raw  = raw.replace("\xa0", "").replace("€", "").replace(" ", "").strip()
-            raw  = raw.replace(".", ",")
-            precio = raw + " €"
-            results[tipo] = precio
-        except Exception as e:
-            logger.warning(f"[Scraper] Error parseando card (station): {e}")
-            continue
-
-    return results
+    return {tipo: Price.parse(raw) for tipo, raw in get_parser().station_cards(html)}
 
 async def fetch_spain_cheapest() -> dict[str, dict]:
     """Precios más baratos a nivel España."""
-    html = await asyncio.to_thread(_get_html, URL_SPAIN)
-    return _parse_cheapest_block(html)
+    return await _fetch_parsed(URL_SPAIN, _parse_cheapest_block)
 
-async def fetch_zaragoza_cheapest() -> dict[str, dict]:
-    """Precios más baratos en Zaragoza ciudad."""
-    html = await asyncio.to_thread(_get_html, URL_ZGZA)
-    return _parse_cheapest_block(html)
+async def fetch_city_cheapest(city: dict) -> dict[str, dict]:
+    """Precios más baratos de una ciudad del registro."""
+    return await _fetch_parsed(city["url"], _parse_cheapest_block)
 
-async def fetch_top_stations() -> dict[str, dict[str, str]]:
+async def fetch_city_stations(city: dict) -> dict[str, dict[str, Price]]:
+    """Precios de las gasolineras seguidas en una ciudad. {estacion: {tipo: precio}}"""
     async def _fetch_one(name, url):
         try:
-            html = await asyncio.to_thread(_get_html, url)
-            return name, _parse_station_block(html)
+            return name, await _fetch_parsed(url, _parse_station_block)
         except Exception as e:
-            logger.warning(f"[Gasolina] Error scraping {name}: {e}")
+            logger.warning(f"[Gasolina] Error scraping {name} ({city['name']}): {e}")
             return name, {}
 
-    pairs = await asyncio.gather(*[_fetch_one(n, u) for n, u in URLS_TOP.items()])
+    pairs = await asyncio.gather(*[_fetch_one(n, u) for n, u in city["stations"].items()])
     return dict(pairs)
 
+async def fetch_city(city: dict) -> tuple[dict, dict]:
+    """(más baratas, gasolineras seguidas) de una ciudad, en paralelo."""
+    return await asyncio.gather(fetch_city_cheapest(city), fetch_city_stations(city))
+
+async def fetch_cities(cities: list[dict]) -> dict[str, tuple[dict, dict] | None]:
+    """
+    Scrapea todas las ciudades a la vez. La concurrencia real la acotan los
+    límites global y por host del cliente HTTP compartido.
+    Devuelve {city_key: (cheapest, top)} o None si falló la página de la ciudad.
+    """
+    async def _one(city):
+        try:
+            return city["key"], await fetch_city(city)
+        except Exception as e:
+            logger.warning(f"[Gasolina] Error scraping ciudad {city['name']}: {e}")
+            return city["key"], None
+
+    return dict(await asyncio.gather(*[_one(c) for c in cities]))
+
+async def fetch_zaragoza_cheapest() -> dict[str, dict]:
+    """Precios más baratos en Zaragoza ciudad."""
+    return await fetch_city_cheapest(get_city(DEFAULT_CITY_KEY))
+
+async def fetch_top_stations() -> dict[str, dict[str, Price]]:
+    return await fetch_city_stations(get_city(DEFAULT_CITY_KEY))
+
 # ── Formateadores de texto ────────────────────────────────────
 
 def format_cheapest_telegram(data: dict, zona: str) -> str:
@@ -175,30 +222,29 @@ async def format_cheapest_x(data: dict, zona: str) -> str:
     header = f"⛽ Gasolinera más barata {zona} — {hoy}"
     hashtags = f"\n\n#gasolina #chollos #ofertas #{zona}"
 
-    # Construir líneas de combustible
-    fuel_lines = []
-    for tipo in FUEL_ORDER:
-        if tipo not in data:
-            continue
-        d = data[tipo]
-        fuel_lines.append(f"{tipo}: {d['precio']} ({d['estacion']})")
+    # Líneas de combustible: (tipo, precio, estación)
+    entries = [
+        (tipo, str(data[tipo]["precio"]), data[tipo]["estacion"])
+        for tipo in FUEL_ORDER if tipo in data
+    ]
 
     # Calcular espacio disponible para las líneas de combustible
     fixed = header + "\n\n" + hashtags
     fixed_weight = parse_tweet(fixed).weightedLength
     available = 280 - fixed_weight - 1  # -1 por el \n entre header y fuels
 
-    fuels_text = "\n".join(fuel_lines)
-
-    # Si no caben, recortar nombres de estación con LLM
-    if parse_tweet(fuels_text).weightedLength > available:
-        fuels_text = await optimize_recommendation_for_x(fuels_text, available)
+    # Abreviaturas deterministas; el LLM solo si ni la versión más corta cabe
+    fuels_text = pack_fuel_lines(entries, available)
+    if fuels_text is None:
+        # Import diferido: Selenium y el cliente de OpenRouter solo se cargan si hace falta el LLM
+        from services.x_selenium import optimize_recommendation_for_x
+        fuels_text = await optimize_recommendation_for_x(render_lines(entries, STEPS[0]), available)
 
     return header + "\n\n" + fuels_text + hashtags
 
-def format_top4_telegram(data: dict[str, dict]) -> str:
+def format_top4_telegram(data: dict[str, dict], city: str = "Zaragoza") -> str:
     hoy = date.today().strftime("%d/%m/%Y")
-    lines = [f"⛽ <b>Top gasolineras Zaragoza — {hoy}</b>\n"]
+    lines = [f"⛽ <b>Top gasolineras {city} — {hoy}</b>\n"]
     for station, fuels in data.items():
         if not fuels:
             continue
@@ -249,7 +295,7 @@ def format_combined_telegram(
             price = fuels[fuel]
             # Precio inicial si existe y es diferente
             initial_price = (initial_snapshot or {}).get("top", {}).get(station, {}).get(fuel)
-            if initial_price and initial_price != price:
+            if initial_price and initial_price != price.text:
                 price_display = f"{initial_price} → <b>{price}</b>"
             else:
                 price_display = price
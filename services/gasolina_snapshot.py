@@ -0,0 +1,129 @@
+# services/gasolina_snapshot.py
+"""
+Snapshot compacto de precios con huella precalculada.
+
+Guarda los precios como tuplas ordenadas (bloque "más baratas" y pares
+estación/combustible) y una huella blake2b estable entre procesos, de modo
+que "¿ha cambiado algo?" es una comparación de huellas y el diff es un
+merge lineal de dos secuencias ordenadas.
+
+Se convierte al formato JSON de siempre del estado:
+    {"zgza": {fuel: precio}, "top": {estacion: {fuel: precio}}}
+("zgza" = bloque de más baratas de la ciudad, nombre histórico).
+En memoria los precios son Price (services/gasolina_price.py); en JSON, su texto.
+"""
+import hashlib
+from typing import List, Tuple
+
+from services.gasolina_price import Price
+
+NA = "N/A"
+
+_FIELD_SEP  = "\x1f"
+_RECORD_SEP = "\x1e"
+
+
+def _fingerprint(cheapest, stations, top) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for section in (cheapest, stations, top):
+        for record in section:
+            if isinstance(record, tuple):
+                record = _FIELD_SEP.join(str(field) for field in record)
+            h.update(record.encode())
+            h.update(_RECORD_SEP.encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _merge_diff(old, new, key_len: int):
+    """
+    Merge lineal de dos secuencias ordenadas de tuplas (clave..., precio).
+    Produce (clave, precio_viejo, precio_nuevo) para cada diferencia.
+    """
+    i = j = 0
+    while i < len(old) or j < len(new):
+        ko = old[i][:key_len] if i < len(old) else None
+        kn = new[j][:key_len] if j < len(new) else None
+        if kn is None or (ko is not None and ko < kn):
+            yield ko, old[i][key_len], NA
+            i += 1
+        elif ko is None or kn < ko:
+            yield kn, NA, new[j][key_len]
+            j += 1
+        else:
+            if old[i][key_len] != new[j][key_len]:
+                yield ko, old[i][key_len], new[j][key_len]
+            i += 1
+            j += 1
+
+
+class PriceSnapshot:
+    __slots__ = ("cheapest", "stations", "top", "fingerprint")
+
+    def __init__(self, cheapest, stations, top):
+        # cheapest: ((fuel, Price), ...)    ordenado por fuel
+        # stations: (estacion, ...)         ordenado (incluye estaciones sin precios)
+        # top:      ((estacion, fuel, Price), ...) ordenado por (estacion, fuel)
+        self.cheapest = tuple(sorted(cheapest))
+        self.stations = tuple(sorted(stations))
+        self.top = tuple(sorted(top))
+        self.fingerprint = _fingerprint(self.cheapest, self.stations, self.top)
+
+    @classmethod
+    def from_data(cls, zgza_data: dict, top_data: dict) -> "PriceSnapshot":
+        """Desde la salida del scraper ({tipo: {precio: Price, ...}}, {estacion: {tipo: Price}})."""
+        return cls(
+            ((fuel, d["precio"]) for fuel, d in zgza_data.items()),
+            top_data.keys(),
+            (
+                (station, fuel, price)
+                for station, fuels in top_data.items()
+                for fuel, price in fuels.items()
+            ),
+        )
+
+    @classmethod
+    def from_json(cls, data: dict | None) -> "PriceSnapshot":
+        data = data or {}
+        top = data.get("top", {})
+        return cls(
+            ((fuel, Price.parse(price)) for fuel, price in data.get("zgza", {}).items()),
+            top.keys(),
+            (
+                (station, fuel, Price.parse(price))
+                for station, fuels in top.items()
+                for fuel, price in fuels.items()
+            ),
+        )
+
+    def to_json(self) -> dict:
+        top = {station: {} for station in self.stations}
+        for station, fuel, price in self.top:
+            top.setdefault(station, {})[fuel] = price.text
+        return {"zgza": {fuel: price.text for fuel, price in self.cheapest}, "top": top}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PriceSnapshot):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self) -> int:
+        return hash(self.fingerprint)
+
+    def diff(self, new: "PriceSnapshot", city_name: str = "Zaragoza") -> List[Tuple[str, str, str, str]]:
+        """
+        Devuelve cambios detectados como:
+        [(scope, fuel, old_price, new_price), ...]
+        scope: nombre de estacion en top, o "Más barata <ciudad>" para bloque zgza.
+        """
+        if self.fingerprint == new.fingerprint:
+            return []
+        changes = [
+            (f"Más barata {city_name}", fuel, old, nw)
+            for (fuel,), old, nw in _merge_diff(self.cheapest, new.cheapest, 1)
+        ]
+        changes.extend(
+            (station, fuel, old, nw)
+            for (station, fuel), old, nw in _merge_diff(self.top, new.top, 2)
+        )
+        return changes
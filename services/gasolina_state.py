@@ -0,0 +1,120 @@
+# services/gasolina_state.py
+"""
+Estado persistente de los jobs (message ids, snapshots, envíos del día...).
+
+Sustituye a data/gasolina_state.json: cada clave es una fila de la tabla
+`estado` (valor en JSON compacto) en la base de datos de gasolina_db.
+Las lecturas salen de una caché en memoria cargada una vez; las escrituras
+actualizan la caché al momento y se persisten por clave (write-behind) en
+una sola transacción, sin reescribir el resto del estado.
+
+Los valores devueltos por get_state no deben mutarse in situ: para cambiar
+algo, construir el valor nuevo y llamar a set_state.
+"""
+import asyncio
+import json
+import os
+
+from logger import logger
+from services.gasolina_db import transaction
+
+LEGACY_STATE_FILE = "data/gasolina_state.json"
+FLUSH_DELAY = 2.0   # segundos que se agrupan escrituras antes de persistir
+
+_cache: dict | None = None
+_dirty: set[str] = set()
+_flush_handle: asyncio.TimerHandle | None = None
+
+_MISSING = object()
+
+
+def _load() -> dict:
+    global _cache
+    if _cache is None:
+        with transaction() as c:
+            rows = c.execute("SELECT clave, valor FROM estado").fetchall()
+        _cache = {row["clave"]: json.loads(row["valor"]) for row in rows}
+        if not _cache:
+            _import_legacy_file()
+    return _cache
+
+
+def _import_legacy_file() -> None:
+    """Migra una sola vez el antiguo gasolina_state.json a la tabla."""
+    if not os.path.exists(LEGACY_STATE_FILE):
+        return
+    try:
+        with open(LEGACY_STATE_FILE) as f:
+            legacy = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"[Estado] ❌ No se pudo leer {LEGACY_STATE_FILE}: {e}")
+        return
+    _cache.update(legacy)
+    _dirty.update(legacy)
+    flush_state()
+    os.replace(LEGACY_STATE_FILE, LEGACY_STATE_FILE + ".migrated")
+    logger.info(f"[Estado] Migradas {len(legacy)} claves desde {LEGACY_STATE_FILE}")
+
+
+def get_state(key: str, default=None):
+    return _load().get(key, default)
+
+
+def set_state(key: str, value) -> None:
+    cache = _load()
+    if cache.get(key, _MISSING) == value:
+        return
+    cache[key] = value
+    _dirty.add(key)
+    _schedule_flush()
+
+
+def delete_state(key: str) -> None:
+    cache = _load()
+    if key in cache:
+        del cache[key]
+        _dirty.add(key)
+        _schedule_flush()
+
+
+def state_keys(prefix: str = "") -> list[str]:
+    return [k for k in _load() if k.startswith(prefix)]
+
+
+def _schedule_flush() -> None:
+    global _flush_handle
+    if _flush_handle is not None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_state()  # Sin event loop (scripts, shutdown): persistir ya
+        return
+    _flush_handle = loop.call_later(FLUSH_DELAY, flush_state)
+
+
+def flush_state() -> None:
+    """Persiste las claves modificadas en una única transacción."""
+    global _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    if not _dirty or _cache is None:
+        return
+
+    keys = list(_dirty)
+    _dirty.clear()
+    upserts = [(k, json.dumps(_cache[k], ensure_ascii=False, separators=(",", ":"))) for k in keys if k in _cache]
+    deletes = [(k,) for k in keys if k not in _cache]
+    try:
+        with transaction() as c:
+            if upserts:
+                c.executemany('''
+                    INSERT INTO estado (clave, valor) VALUES (?, ?)
+                    ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+                ''', upserts)
+            if deletes:
+                c.executemany("DELETE FROM estado WHERE clave = ?", deletes)
+    except Exception as e:
+        _dirty.update(keys)  # Reintentar en el próximo flush
+        logger.error(f"[Estado] ❌ Error guardando estado: {e}")
@@ -1,98 +1,153 @@
-import sqlite3
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import copy
+import json
 import os
-from .gasolina_db import DB_FILE
+from .gasolina_db import DB_FILE, bloques_rango, transaction, get_data_version
 
 FUEL_ORDER = ["Gasolina 95 E5", "Gasolina 98 E5", "Gasoleo A", "Gasoleo Premium"]
 
-def obtener_estadisticas_periodo(dias: int):
+DIAS_NOMBRE = {
+    "0": "Domingo", "1": "Lunes", "2": "Martes",
+    "3": "Miércoles", "4": "Jueves", "5": "Viernes", "6": "Sábado"
+}
+
+# Las estadísticas se leen solo de los rollups (mantenidos por
+# insert_precios_top): el rango se cubre con bloques de 2**n días (ver
+# gasolina_db.bloques_rango), así que el coste apenas depende del rango
+# pedido y no del tamaño del histórico. Una sola sentencia para todas las
+# familias y combustibles; empates deterministas (fecha más antigua, luego
+# nombre de estación / día de la semana).
+# Solo la variación agrupa por estación (unas pocas filas por estación y
+# bloque); los extremos salen ya desempatados de rollup_bloques_ciudad.
+# CROSS JOIN fija `bloques` como bucle exterior: una búsqueda por bloque.
+_STATS_SQL = '''
+    WITH bloques AS MATERIALIZED (
+        SELECT json_extract(value, '$[0]') AS nivel, json_extract(value, '$[1]') AS inicio
+        FROM json_each(?)
+    ),
+    extremos AS (
+        SELECT r.tipo_combustible AS fuel, r.precio_max, r.fecha_max, r.estacion_max,
+               r.precio_min, r.fecha_min, r.estacion_min,
+               ROW_NUMBER() OVER (PARTITION BY r.tipo_combustible ORDER BY r.precio_max DESC, r.fecha_max, r.estacion_max) AS rn_max,
+               ROW_NUMBER() OVER (PARTITION BY r.tipo_combustible ORDER BY r.precio_min, r.fecha_min, r.estacion_min) AS rn_min
+        FROM bloques b CROSS JOIN rollup_bloques_ciudad r
+        WHERE r.ciudad = ? AND r.tipo_combustible IN (FUELS) AND r.nivel = b.nivel AND r.inicio = b.inicio
+    ),
+    por_estacion AS (
+        SELECT r.tipo_combustible AS fuel, r.estacion, MAX(r.precio_max) - MIN(r.precio_min) AS variacion
+        FROM bloques b CROSS JOIN rollup_bloques r
+        WHERE r.ciudad = ? AND r.tipo_combustible IN (FUELS) AND r.nivel = b.nivel AND r.inicio = b.inicio
+        GROUP BY r.tipo_combustible, r.estacion
+    ),
+    variaciones AS (
+        SELECT fuel, estacion, variacion,
+               ROW_NUMBER() OVER (PARTITION BY fuel ORDER BY variacion DESC, estacion) AS rn
+        FROM por_estacion
+    ),
+    dias AS (
+        -- SQLite: strftime('%w', date) -> 0 (Domingo) - 6 (Sábado)
+        -- Promedio del precio mínimo de la ciudad en cada día de la semana
+        SELECT tipo_combustible AS fuel, strftime('%w', date) AS dia_semana, AVG(precio_min) AS precio_medio,
+               ROW_NUMBER() OVER (PARTITION BY tipo_combustible ORDER BY AVG(precio_min), strftime('%w', date)) AS rn
+        FROM rollup_ciudad_diario
+        WHERE ciudad = ? AND tipo_combustible IN (FUELS) AND date >= ?
+        GROUP BY tipo_combustible, dia_semana
+    )
+    SELECT 'max' AS familia, fuel, estacion_max AS clave, fecha_max AS date, precio_max AS valor FROM extremos WHERE rn_max = 1
+    UNION ALL
+    SELECT 'min', fuel, estacion_min, fecha_min, precio_min FROM extremos WHERE rn_min = 1
+    UNION ALL
+    SELECT 'var', fuel, estacion, NULL, variacion FROM variaciones WHERE rn = 1
+    UNION ALL
+    SELECT 'dia', fuel, dia_semana, NULL, precio_medio FROM dias WHERE rn = 1
+'''.replace("FUELS", ", ".join("?" * len(FUEL_ORDER)))
+
+# ── Caché de estadísticas ─────────────────────────────────────
+# Clave: (dias, ciudad, fecha_inicio, versión de datos). Cada cambio de precio
+# guardado por insert_precios_top sube la versión, así que las entradas antiguas dejan
+# de ser alcanzables y acaban saliendo por LRU.
+STATS_CACHE_SIZE = 32
+_stats_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_stats_cache_counters = {"hits": 0, "misses": 0}
+
+
+def get_stats_cache_stats() -> dict:
+    total = _stats_cache_counters["hits"] + _stats_cache_counters["misses"]
+    return {
+        **_stats_cache_counters,
+        "size": len(_stats_cache),
+        "hit_rate": round(_stats_cache_counters["hits"] / total, 3) if total else 0.0,
+    }
+
+
+def obtener_estadisticas_periodo(dias: int, ciudad: str = "zgza"):
     """
-    Obtiene las estadísticas de los últimos `dias` días.
+    Obtiene las estadísticas de los últimos `dias` días para una ciudad.
+    Cacheado mientras no cambien los datos ni el día.
     """
     if not os.path.exists(DB_FILE):
         return None
 
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-
     fecha_inicio = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d")
 
-    stats = {
-        "picos": {},
-        "variacion": {},
-        "dias_baratos": {}
-    }
-
-    # 1. Picos más altos y bajos por combustible
-    for fuel in FUEL_ORDER:
-        c.execute('''
-            SELECT estacion, MAX(precio) as precio_max, date
-            FROM precios_top
-            WHERE tipo_combustible = ? AND date >= ?
-        ''', (fuel, fecha_inicio))
-        row_max = c.fetchone()
-
-        c.execute('''
-            SELECT estacion, MIN(precio) as precio_min, date
-            FROM precios_top
-            WHERE tipo_combustible = ? AND date >= ?
-        ''', (fuel, fecha_inicio))
-        row_min = c.fetchone()
-
-        if row_max and row_max['precio_max'] is not None and row_min and row_min['precio_min'] is not None:
-            stats["picos"][fuel] = {
-                "max": {"estacion": row_max["estacion"], "precio": row_max["precio_max"], "fecha": row_max["date"]},
-                "min": {"estacion": row_min["estacion"], "precio": row_min["precio_min"], "fecha": row_min["date"]}
-            }
-
-    # 2. Gasolinera con mayor variación de precio (por combustible)
-    for fuel in FUEL_ORDER:
-        c.execute('''
-            SELECT estacion, (MAX(precio) - MIN(precio)) as variacion
-            FROM precios_top
-            WHERE tipo_combustible = ? AND date >= ?
-            GROUP BY estacion
-            ORDER BY variacion DESC
-            LIMIT 1
-        ''', (fuel, fecha_inicio))
-        row = c.fetchone()
-        if row and row['variacion'] is not None and row['variacion'] > 0:
-            stats["variacion"][fuel] = {"estacion": row["estacion"], "variacion": round(row["variacion"], 3)}
-
-    # 3. Día de la semana más barato por combustible
-    # Promedio del precio mínimo de cada día de la semana
-    for fuel in FUEL_ORDER:
-        # SQLite: strftime('%w', date) -> 0 (Domingo) - 6 (Sábado)
-        c.execute('''
-            SELECT strftime('%w', date) as dia_semana, AVG(precio) as precio_medio
-            FROM (
-                SELECT date, MIN(precio) as precio
-                FROM precios_top
-                WHERE tipo_combustible = ? AND date >= ?
-                GROUP BY date
-            )
-            GROUP BY dia_semana
-            ORDER BY precio_medio ASC
-            LIMIT 1
-        ''', (fuel, fecha_inicio))
-        row = c.fetchone()
-        if row:
-            dias_nombre = {
-                "0": "Domingo", "1": "Lunes", "2": "Martes",
-                "3": "Miércoles", "4": "Jueves", "5": "Viernes", "6": "Sábado"
+    key = (dias, ciudad, fecha_inicio, get_data_version())
+    cached = _stats_cache.get(key)
+    if cached is not None:
+        _stats_cache.move_to_end(key)
+        _stats_cache_counters["hits"] += 1
+        return copy.deepcopy(cached)
+
+    _stats_cache_counters["misses"] += 1
+    stats = _calcular_estadisticas(ciudad, fecha_inicio)
+    _stats_cache[key] = stats
+    if len(_stats_cache) > STATS_CACHE_SIZE:
+        _stats_cache.popitem(last=False)
+    return copy.deepcopy(stats)
+
+
+def _calcular_estadisticas(ciudad: str, fecha_inicio: str) -> dict:
+    with transaction() as conn:
+        hasta = conn.execute("SELECT MAX(date) FROM rollup_ciudad_diario WHERE ciudad = ?", (ciudad,)).fetchone()[0]
+        bloques = bloques_rango(fecha_inicio, hasta) if hasta else []
+        filtro = (ciudad, *FUEL_ORDER)
+        rows = conn.execute(_STATS_SQL, (json.dumps(bloques), *filtro, *filtro, *filtro, fecha_inicio)).fetchall()
+
+    picos: dict[str, dict] = {}
+    variacion: dict[str, dict] = {}
+    dias_baratos: dict[str, dict] = {}
+
+    for row in rows:
+        familia, fuel = row["familia"], row["fuel"]
+        if familia in ("max", "min"):
+            # 1. Picos más altos y bajos por combustible
+            picos.setdefault(fuel, {})[familia] = {
+                "estacion": row["clave"], "precio": row["valor"], "fecha": row["date"],
             }
-            dia_str = str(row["dia_semana"])
-            stats["dias_baratos"][fuel] = {"dia": dias_nombre.get(dia_str, dia_str), "precio_medio": round(row["precio_medio"], 3)}
-
-    conn.close()
-    return stats
+        elif familia == "var":
+            # 2. Gasolinera con mayor variación de precio (por combustible)
+            if row["valor"] is not None and row["valor"] > 0:
+                variacion[fuel] = {"estacion": row["clave"], "variacion": round(row["valor"], 3)}
+        else:
+            # 3. Día de la semana más barato por combustible
+            dia_str = str(row["clave"])
+            dias_baratos[fuel] = {"dia": DIAS_NOMBRE.get(dia_str, dia_str), "precio_medio": round(row["valor"], 3)}
+
+    # Mismo orden de claves que FUEL_ORDER
+    return {
+        "picos": {f: picos[f] for f in FUEL_ORDER if f in picos},
+        "variacion": {f: variacion[f] for f in FUEL_ORDER if f in variacion},
+        "dias_baratos": {f: dias_baratos[f] for f in FUEL_ORDER if f in dias_baratos},
+    }
 
-def formato_estadisticas_telegram(stats: dict, periodo_nombre: str) -> str:
+def formato_estadisticas_telegram(stats: dict, periodo_nombre: str, city: str | None = None) -> str:
     if not stats:
         return f"⛽ <b>No hay datos suficientes para el resumen {periodo_nombre.lower()}.</b>"
 
-    lines = [f"📊 <b>Resumen {periodo_nombre} de Gasolineras TOP</b>\n"]
+    titulo = f"Resumen {periodo_nombre} de Gasolineras TOP"
+    if city:
+        titulo += f" — {city}"
+    lines = [f"📊 <b>{titulo}</b>\n"]
 
     if stats["picos"]:
         lines.append("📈 <b>Picos de Precio</b>")
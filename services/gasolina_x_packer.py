@@ -0,0 +1,137 @@
+# services/gasolina_x_packer.py
+"""
+Empaquetado determinista de las líneas de combustible para X.
+
+Cuando "Gasolina 95 E5: 1,459 € (Estación)" no cabe en el presupuesto del
+tweet se prueba una escalera fija de abreviaturas, de la menos a la más
+agresiva, aplicada a todas las líneas a la vez:
+
+    nombres de estación con abreviaturas de diccionario ("Estación de Servicio" -> "E.S.")
+    combustible corto ("Gasolina 95 E5" -> "G95 E5")
+    precio compacto ("1,459 €" -> "1,459€")
+    combustible mínimo ("G95") y estación recortada
+
+Se devuelve el primer peldaño cuyo peso (parse_tweet) cabe. Ningún peldaño
+quita estaciones: si ni el más agresivo cabe, el llamador recurre al LLM
+(optimize_recommendation_for_x).
+"""
+import re
+from typing import NamedTuple
+
+try:
+    from twitter_text import parse_tweet
+except ImportError:
+    def parse_tweet(text):
+        class Dummy:
+            pass
+        d = Dummy()
+        d.weightedLength = len(text)
+        return d
+
+# Variantes por combustible, de la más larga a la más corta (índice = nivel)
+FUEL_ABBREVIATIONS = {
+    "Gasolina 95 E5":  ["Gasolina 95 E5", "G95 E5", "G95"],
+    "Gasolina 98 E5":  ["Gasolina 98 E5", "G98 E5", "G98"],
+    "Gasoleo A":       ["Gasoleo A", "Diésel", "GOA"],
+    "Gasoleo Premium": ["Gasoleo Premium", "Diésel Prem.", "GOP"],
+}
+
+# Abreviaturas de palabras habituales en nombres de estación (sin distinguir mayúsculas)
+STATION_ABBREVIATIONS = [
+    (r"estaci[oó]n de servicio", "E.S."),
+    (r"area de servicio|área de servicio", "A.S."),
+    (r"autoservicio", "Autoserv."),
+    (r"gasolinera", "Gas."),
+    (r"cooperativa", "Coop."),
+    (r"carburantes", "Carb."),
+    (r"combustibles", "Comb."),
+    (r"petr[oó]leos", "Petr."),
+    (r"servicio", "Serv."),
+    (r"(?:,|\s)\s*s\.?\s*[la]\.?(?:u\.?)?$", ""),   # Sufijo societario separado: S.L., S.A., S.L.U.
+]
+_STATION_PATTERNS = [(re.compile(rf"\b(?:{p})" if p[0].isalpha() else p, re.IGNORECASE), r)
+                     for p, r in STATION_ABBREVIATIONS]
+
+_CONNECTORS = {"de", "del", "la", "las", "el", "los", "y"}
+_STATION_TRUNCATE = [None, None, 20, 12]   # Máx. caracteres por nivel de estación (None = sin recortar)
+
+
+class Step(NamedTuple):
+    fuel: int      # Índice en FUEL_ABBREVIATIONS
+    price: int     # 0 = "1,459 €", 1 = "1,459€"
+    station: int   # 0 completa, 1 abreviada, 2-3 abreviada y recortada
+
+
+# Escalera de menos a más abreviado
+STEPS = [
+    Step(0, 0, 0),
+    Step(0, 0, 1),
+    Step(1, 0, 1),
+    Step(1, 1, 1),
+    Step(2, 1, 1),
+    Step(2, 1, 2),
+    Step(2, 1, 3),
+]
+
+_counters = {"fits": 0, "packed": 0, "no_fit": 0}
+
+
+def get_packer_stats() -> dict:
+    """fits: cabía sin tocar; packed: resuelto con abreviaturas; no_fit: hizo falta el LLM."""
+    return dict(_counters)
+
+
+def _fuel(tipo: str, level: int) -> str:
+    variants = FUEL_ABBREVIATIONS.get(tipo, [tipo])
+    return variants[min(level, len(variants) - 1)]
+
+
+def _price(precio: str, level: int) -> str:
+    return precio.replace(" €", "€") if level else precio
+
+
+def _station(estacion: str, level: int) -> str:
+    if level == 0 or not estacion:
+        return estacion
+    short = estacion
+    for pattern, repl in _STATION_PATTERNS:
+        short = pattern.sub(repl, short)
+    short = " ".join(short.split())
+    limit = _STATION_TRUNCATE[level]
+    if limit and len(short) > limit:
+        head = short[:limit]
+        if " " in head:
+            # Cortar en palabra completa, sin dejar conectores colgando ("Petr. del")
+            words = head.rsplit(" ", 1)[0].split()
+            while len(words) > 1 and words[-1].lower() in _CONNECTORS:
+                words.pop()
+            short = " ".join(words).rstrip(",;:- ")
+        else:
+            short = head[:-1].rstrip(".,;:- ") + "."
+    return short
+
+
+def render_lines(entries: list[tuple[str, str, str]], step: Step) -> str:
+    """entries: [(tipo, precio, estacion), ...] -> líneas con el nivel de abreviatura de `step`."""
+    lines = []
+    for tipo, precio, estacion in entries:
+        line = f"{_fuel(tipo, step.fuel)}: {_price(precio, step.price)}"
+        station = _station(estacion, step.station)
+        if station:
+            line += f" ({station})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def pack_fuel_lines(entries: list[tuple[str, str, str]], available: int) -> str | None:
+    """
+    Devuelve las líneas con la menor abreviatura cuyo peso cabe en `available`,
+    o None si ni el peldaño más agresivo cabe.
+    """
+    for i, step in enumerate(STEPS):
+        text = render_lines(entries, step)
+        if parse_tweet(text).weightedLength <= available:
+            _counters["fits" if i == 0 else "packed"] += 1
+            return text
+    _counters["no_fit"] += 1
+    return None
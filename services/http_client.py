@@ -0,0 +1,224 @@
+# services/http_client.py
+"""
+Cliente HTTP asíncrono compartido por el scraper.
+
+Un único httpx.AsyncClient por proceso (keep-alive + pool de conexiones),
+límite de peticiones concurrentes global y por host, compresión (gzip/deflate, y br
+si está instalado brotli) y HTTP/2 si está disponible el paquete `h2`.
+
+Cadena de backends en fetch(): primero el cliente normal; solo si la
+respuesta es un challenge (Cloudflare) se pide la página a FlareSolverr.
+Sus cookies (cf_clearance) y su User-Agent se quedan en el cliente para
+ese host, así que las peticiones siguientes vuelven a ir por la vía barata.
+"""
+import asyncio
+import os
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import SCRAPER_MAX_CONCURRENCY, FLARESOLVERR_URL, FLARESOLVERR_MAX_TIMEOUT_MS
+from logger import logger
+from services.flaresolverr import FlareSolverr, FlareSolverrError
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+UA = "mi-scraper/1.0 (contacto: tu_email@dominio)"
+
+MAX_PER_HOST    = 4      # Peticiones simultáneas contra un mismo host
+MAX_CONNECTIONS = 20
+KEEPALIVE_SECS  = 60.0
+TIMEOUT         = httpx.Timeout(30.0, connect=10.0)
+
+_client: httpx.AsyncClient | None = None
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+_global_semaphore: asyncio.Semaphore | None = None
+
+# ── Respaldo FlareSolverr ─────────────────────────────────────
+_CHALLENGE_STATUS  = (403, 429, 503)
+_CHALLENGE_MARKERS = ("cf-chl", "challenge-platform", "<title>Just a moment", "Attention Required! | Cloudflare")
+_CHALLENGE_TITLES  = ("<title>Just a moment", "<title>Attention Required! | Cloudflare")
+_CHALLENGE_SCAN    = 32 * 1024   # Los challenges son páginas pequeñas: basta el principio
+
+_flaresolverr = FlareSolverr(FLARESOLVERR_URL, FLARESOLVERR_MAX_TIMEOUT_MS) if FLARESOLVERR_URL else None
+_solve_lock: asyncio.Lock | None = None          # Una resolución a la vez (FlareSolverr con 1 CPU)
+_host_headers: dict[str, dict[str, str]] = {}   # host -> User-Agent con el que se obtuvo cf_clearance
+_solves: dict[str, int] = {}                    # host -> nº de resoluciones (detecta las concurrentes)
+_backend_stats = {"plain": 0, "challenged": 0, "solved": 0, "failed": 0}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Devuelve el cliente del proceso, creándolo en el primer uso."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers={"User-Agent": UA},
+            http2=HTTP2_AVAILABLE,
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_SECS,
+            ),
+        )
+        logger.info(f"[HTTP] Cliente compartido creado (http2={HTTP2_AVAILABLE})")
+    return _client
+
+
+def _global_limit() -> asyncio.Semaphore:
+    global _global_semaphore
+    if _global_semaphore is None:
+        _global_semaphore = asyncio.Semaphore(SCRAPER_MAX_CONCURRENCY)
+    return _global_semaphore
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    sem = _host_semaphores.get(host)
+    if sem is None:
+        sem = _host_semaphores[host] = asyncio.Semaphore(MAX_PER_HOST)
+    return sem
+
+
+def is_challenge(r: httpx.Response) -> bool:
+    """True si la respuesta es una página de challenge en vez del contenido."""
+    if r.headers.get("cf-mitigated") == "challenge":
+        return True
+    if r.status_code == 200:
+        # Las páginas normales de un sitio tras Cloudflare también cargan
+        # /cdn-cgi/challenge-platform: con 200 solo cuenta el título del interstitial
+        markers = _CHALLENGE_TITLES
+    elif r.status_code in _CHALLENGE_STATUS:
+        markers = _CHALLENGE_MARKERS
+    else:
+        return False
+    head = r.text[:_CHALLENGE_SCAN]
+    return any(marker in head for marker in markers)
+
+
+def _with_host_headers(url: str, headers: dict | None) -> dict | None:
+    extra = _host_headers.get(urlsplit(url).netloc)
+    if not extra:
+        return headers
+    return {**extra, **(headers or {})}
+
+
+def get_fetch_backend_stats() -> dict:
+    """
+    plain: sin challenge; challenged: recibieron challenge; solved/failed:
+    llamadas a FlareSolverr. expensive_ratio = fracción de peticiones que
+    acabaron en FlareSolverr (los challenges concurrentes comparten una).
+    """
+    total = _backend_stats["plain"] + _backend_stats["challenged"]
+    expensive = _backend_stats["solved"] + _backend_stats["failed"]
+    return {
+        **_backend_stats,
+        "expensive_ratio": round(expensive / total, 3) if total else 0.0,
+    }
+
+
+async def _get_plain(url: str, headers: dict | None) -> httpx.Response:
+    async with _host_semaphore(url), _global_limit():
+        return await get_client().get(url, headers=_with_host_headers(url, headers))
+
+
+async def _solve_challenge(url: str, headers: dict | None, challenged: httpx.Response) -> httpx.Response:
+    """
+    Resuelve el challenge con FlareSolverr e instala sus cookies y su User-Agent
+    para el host. Si otra corrutina lo resolvió mientras esperábamos el lock,
+    basta con repetir la petición normal.
+    """
+    global _solve_lock
+    if _solve_lock is None:
+        _solve_lock = asyncio.Lock()
+    host = urlsplit(url).netloc
+    generation = _solves.get(host, 0)
+    async with _solve_lock:
+        if _solves.get(host, 0) != generation:
+            retry = await _get_plain(url, headers)
+            if not is_challenge(retry):
+                return retry
+
+        try:
+            solution = await _flaresolverr.get(get_client(), url)
+        except FlareSolverrError as e:
+            _backend_stats["failed"] += 1
+            logger.error(f"[HTTP] ❌ FlareSolverr no pudo resolver {url}: {e}")
+            return challenged
+
+        client = get_client()
+        for c in solution.get("cookies") or []:
+            client.cookies.set(c["name"], c["value"], domain=c.get("domain", host), path=c.get("path", "/"))
+        if solution.get("userAgent"):
+            # cf_clearance va ligado al User-Agent con el que se obtuvo
+            _host_headers[host] = {"User-Agent": solution["userAgent"]}
+        _solves[host] = _solves.get(host, 0) + 1
+        _backend_stats["solved"] += 1
+        logger.info(f"[HTTP] 🛡️ Challenge resuelto con FlareSolverr: {url} ({len(solution.get('cookies') or [])} cookies)")
+
+    return httpx.Response(
+        status_code=solution.get("status") or 200,
+        headers={k: v for k, v in (solution.get("headers") or {}).items()
+                 if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")},
+        text=solution.get("response") or "",
+        request=httpx.Request("GET", url),
+    )
+
+
+async def fetch(url: str, headers: dict | None = None) -> httpx.Response:
+    """
+    GET respetando el límite global y por host; si llega un challenge y hay
+    FlareSolverr configurado, se resuelve por esa vía. Lanza
+    httpx.HTTPStatusError en 4xx/5xx; un 304 (GET condicional) se devuelve
+    tal cual para que el llamador reutilice su copia.
+    """
+    r = await _get_plain(url, headers)
+    if _flaresolverr is not None and is_challenge(r):
+        _backend_stats["challenged"] += 1
+        logger.warning(f"[HTTP] ⚠️ Challenge en {url} (HTTP {r.status_code}), recurriendo a FlareSolverr")
+        r = await _solve_challenge(url, headers, r)
+    else:
+        _backend_stats["plain"] += 1
+    if r.status_code != 304:
+        r.raise_for_status()
+    return r
+
+
+async def get_html(url: str) -> str:
+    r = await fetch(url)
+    return r.text
+
+
+async def download(url: str, path: str, headers: dict | None = None) -> int:
+    """Descarga en streaming a `path` (escritura atómica). Devuelve los bytes escritos."""
+    tmp = path + ".tmp"
+    written = 0
+    async with _host_semaphore(url), _global_limit():
+        async with get_client().stream("GET", url, headers=_with_host_headers(url, headers)) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                async for chunk in r.aiter_bytes():
+                    f.write(chunk)
+                    written += len(chunk)
+    os.replace(tmp, path)
+    return written
+
+
+async def close_client() -> None:
+    """Cierra el cliente compartido (llamar al apagar la aplicación)."""
+    global _client, _global_semaphore, _solve_lock
+    if _client is not None and not _client.is_closed:
+        if _flaresolverr is not None:
+            await _flaresolverr.close(_client)
+        await _client.aclose()
+    _client = None
+    _global_semaphore = None
+    _solve_lock = None
+    _host_semaphores.clear()
+    _host_headers.clear()
+    _solves.clear()
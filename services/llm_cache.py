@@ -0,0 +1,92 @@
+# services/llm_cache.py
+"""
+Caché persistente de los acortados de texto hechos con el LLM.
+
+Los textos a acortar (líneas de combustible con nombres de estación) apenas
+cambian de un día a otro, así que cada resultado se guarda en la tabla
+`cache_llm` con clave hash(modelo, presupuesto de caracteres, texto). Las
+entradas caducan a los LLM_CACHE_TTL_DAYS días y, por encima de
+LLM_CACHE_MAX_ENTRIES, se descartan las usadas hace más tiempo (LRU por
+`usado`). Cada entrada guarda lo que tardó el LLM en generarla para poder
+contar la latencia ahorrada en cada acierto.
+"""
+import hashlib
+import time
+
+from config import OPENROUTER_CONFIG, LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES
+from logger import logger
+from services.gasolina_db import transaction
+
+_counters = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evicted": 0}
+_latency = {"saved_s": 0.0, "llm_s": 0.0}
+
+
+def _key(text: str, budget: int, model: str | None) -> str:
+    raw = f"{model or ''}\x1f{budget}\x1f{text}".encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def get_shortened(text: str, budget: int, model: str | None = None) -> str | None:
+    """Devuelve el acortado en caché (y lo marca como usado) o None."""
+    model = model or OPENROUTER_CONFIG["model"]
+    key = _key(text, budget, model)
+    now = time.time()
+    try:
+        with transaction() as c:
+            row = c.execute(
+                "SELECT salida, creado, latencia FROM cache_llm WHERE clave = ?", (key,)
+            ).fetchone()
+            if row is None:
+                _counters["misses"] += 1
+                return None
+            if now - row["creado"] > LLM_CACHE_TTL_DAYS * 86400:
+                c.execute("DELETE FROM cache_llm WHERE clave = ?", (key,))
+                _counters["expired"] += 1
+                _counters["misses"] += 1
+                return None
+            c.execute("UPDATE cache_llm SET usado = ?, hits = hits + 1 WHERE clave = ?", (now, key))
+    except Exception as e:
+        logger.error(f"[LLM/Cache] ❌ Error leyendo caché: {e}")
+        return None
+
+    _counters["hits"] += 1
+    _latency["saved_s"] += row["latencia"] or 0.0
+    return row["salida"]
+
+
+def store_shortened(text: str, budget: int, result: str, latency: float, model: str | None = None) -> None:
+    """Guarda un acortado generado por el LLM y aplica el límite LRU."""
+    model = model or OPENROUTER_CONFIG["model"]
+    now = time.time()
+    _latency["llm_s"] += latency
+    try:
+        with transaction() as c:
+            c.execute('''
+                INSERT INTO cache_llm (clave, salida, creado, usado, latencia, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(clave) DO UPDATE SET
+                    salida = excluded.salida, creado = excluded.creado,
+                    usado = excluded.usado, latencia = excluded.latencia
+            ''', (_key(text, budget, model), result, now, now, latency))
+            evicted = c.execute('''
+                DELETE FROM cache_llm WHERE clave IN (
+                    SELECT clave FROM cache_llm ORDER BY usado DESC LIMIT -1 OFFSET ?
+                )
+            ''', (LLM_CACHE_MAX_ENTRIES,)).rowcount
+    except Exception as e:
+        logger.error(f"[LLM/Cache] ❌ Error guardando en caché: {e}")
+        return
+
+    _counters["stores"] += 1
+    _counters["evicted"] += max(evicted, 0)
+
+
+def get_llm_cache_stats() -> dict:
+    """Aciertos, fallos, hit rate y segundos de LLM ahorrados / gastados."""
+    total = _counters["hits"] + _counters["misses"]
+    return {
+        **_counters,
+        "hit_rate": round(_counters["hits"] / total, 3) if total else 0.0,
+        "saved_s": round(_latency["saved_s"], 2),
+        "llm_s": round(_latency["llm_s"], 2),
+    }
@@ -0,0 +1,314 @@
+# services/x_browser.py
+"""
+Sesión de Firefox persistente para publicar en X.
+
+En vez de arrancar un Firefox por post, se mantiene uno vivo con un perfil
+persistente (X_PROFILE_DIR) y la sesión de X ya restaurada. Antes de cada
+post se comprueba que sigue respondiendo; se recicla tras
+X_BROWSER_MAX_POSTS posts, si el árbol de procesos supera
+X_BROWSER_MAX_RSS_MB o si un post falla (estado desconocido). Inactivo lo
+cierra el job de limpieza (housekeeping, ver services/x_resources.py), que
+también arranca y para el display virtual de los modos no headless.
+
+Se usa desde hilos (post_to_x corre en asyncio.to_thread): el lock
+garantiza un único post a la vez sobre el navegador.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.firefox.service import Service
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+
+from config import X_PROFILE_DIR, X_BROWSER_MAX_POSTS, X_BROWSER_MAX_RSS_MB
+from logger import logger
+from services.x_resources import ensure_display
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COOKIES_FILE = os.path.join(BASE_DIR, "cookies.json")
+GECKODRIVER_PATH = "/usr/local/bin/geckodriver"
+
+X_HOME = "https://x.com/home"
+PAGE_TIMEOUT = 20   # Máximo para que cargue /home (o redirija a login)
+
+_lock = threading.Lock()
+_driver = None
+_headless: bool | None = None
+_posts = 0
+_peak_rss_mb = 0.0
+_last_used = 0.0
+
+
+class XSessionError(RuntimeError):
+    """No se pudo abrir el navegador o restaurar la sesión de X."""
+
+
+# ── Métricas por fase ─────────────────────────────────────────
+
+class PhaseTimer:
+    """Cronómetro por fases: mark(fase) guarda el tiempo desde la marca anterior."""
+    __slots__ = ("start", "last", "phases")
+
+    def __init__(self):
+        self.start = self.last = time.monotonic()
+        self.phases: dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        now = time.monotonic()
+        self.phases[phase] = round(self.phases.get(phase, 0.0) + now - self.last, 2)
+        self.last = now
+
+    @property
+    def total(self) -> float:
+        return round(time.monotonic() - self.start, 2)
+
+
+_post_times: deque = deque(maxlen=50)
+
+
+def record_post_metrics(timer: PhaseTimer, ok: bool, reused: bool) -> None:
+    """Log estructurado (JSON) de un post con sus fases y la mediana reciente."""
+    total = timer.total
+    if ok:
+        _post_times.append(total)
+    metrics = {
+        "ok": ok,
+        "reused": reused,
+        "total": total,
+        "median_recent": round(statistics.median(_post_times), 2) if _post_times else None,
+        "rss_mb": round(browser_rss_mb()),
+        "phases": timer.phases,
+    }
+    logger.info(f"[X/Metrics] {json.dumps(metrics, ensure_ascii=False)}")
+
+
+# ── Memoria del árbol de procesos (geckodriver + firefox) ─────
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _tree(root_pid: int) -> list[int]:
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(_children(pid))
+    return pids
+
+
+def _tree_rss_mb(root_pid: int) -> float:
+    return sum(_rss_mb(pid) for pid in _tree(root_pid))
+
+
+def browser_rss_mb() -> float:
+    """RSS total (MB) de geckodriver y sus Firefox; 0 si no hay navegador."""
+    try:
+        return _tree_rss_mb(_driver.service.process.pid) if _driver else 0.0
+    except AttributeError:
+        return 0.0
+
+
+def browser_pids() -> set[int]:
+    """PIDs de geckodriver y sus Firefox del navegador vivo."""
+    try:
+        return set(_tree(_driver.service.process.pid)) if _driver else set()
+    except AttributeError:
+        return set()
+
+
+def needs_display() -> bool:
+    """True si hay un navegador no headless vivo (usa el display virtual)."""
+    return _driver is not None and _headless is False
+
+
+def posts_in_session() -> int:
+    """Posts publicados con el navegador actual (0 = recién arrancado)."""
+    return _posts
+
+
+def get_browser_stats() -> dict:
+    return {
+        "alive": _driver is not None,
+        "posts": _posts,
+        "rss_mb": round(browser_rss_mb(), 1),
+        "peak_rss_mb": round(_peak_rss_mb, 1),
+    }
+
+
+# ── Ciclo de vida ─────────────────────────────────────────────
+
+def _is_login(url: str) -> bool:
+    return "/login" in url or "/i/flow/login" in url
+
+
+def _launch(headless: bool):
+    os.makedirs(X_PROFILE_DIR, exist_ok=True)
+    if not headless:
+        ensure_display()   # Xvfb bajo demanda, solo para Firefox con ventana
+    options = Options()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("-profile")
+    options.add_argument(X_PROFILE_DIR)
+    if headless:
+        options.add_argument("--headless")
+    return webdriver.Firefox(service=Service(GECKODRIVER_PATH), options=options)
+
+
+def _open_home(driver) -> None:
+    """Navega a /home y espera a la columna principal o a la redirección a login."""
+    driver.get(X_HOME)
+    WebDriverWait(driver, PAGE_TIMEOUT).until(
+        lambda d: _is_login(d.current_url)
+        or d.find_elements(By.CSS_SELECTOR, "[data-testid='primaryColumn']")
+    )
+
+
+def _restore_login(driver, timer: PhaseTimer | None = None) -> None:
+    """Abre /home; si el perfil no tiene sesión, inyecta cookies.json una vez."""
+    _open_home(driver)
+    if timer:
+        timer.mark("navigation")
+    if not _is_login(driver.current_url):
+        return
+
+    if not os.path.exists(COOKIES_FILE):
+        raise XSessionError(f"Cookies no encontradas en {COOKIES_FILE}")
+
+    # add_cookie exige estar ya en el dominio
+    driver.get("https://x.com")
+    WebDriverWait(driver, PAGE_TIMEOUT).until(
+        lambda d: d.execute_script("return document.readyState") != "loading"
+    )
+    with open(COOKIES_FILE) as f:
+        cookies = json.load(f)
+    for c in cookies:
+        c.pop("sameSite", None)
+        driver.add_cookie(c)
+
+    _open_home(driver)
+    if timer:
+        timer.mark("cookie_restore")
+    if _is_login(driver.current_url):
+        raise XSessionError(f"Sesión inválida: X redirigió a login ({driver.current_url})")
+
+
+def _healthy(driver) -> bool:
+    try:
+        return bool(driver.window_handles) and driver.execute_script("return document.readyState") is not None
+    except Exception:
+        return False
+
+
+def _quit(reason: str) -> None:
+    global _driver, _headless, _posts
+    if _driver is None:
+        return
+    logger.info(f"[X/Browser] ♻️ Cerrando navegador ({reason}) tras {_posts} posts")
+    try:
+        _driver.quit()
+    except Exception as e:
+        logger.warning(f"[X/Browser] ⚠️ Error cerrando navegador: {e}")
+    _driver = None
+    _headless = None
+    _posts = 0
+
+
+def acquire_driver(headless: bool = True, timer: PhaseTimer | None = None):
+    """
+    Bloquea el navegador para un post y lo devuelve en /home con sesión.
+    Siempre emparejar con release_driver(). Lanza XSessionError si no hay sesión.
+    timer recibe las fases launch / navigation / cookie_restore.
+    """
+    global _driver, _headless
+    _lock.acquire()
+    try:
+        if _driver is not None and (_headless != headless or not _healthy(_driver)):
+            _quit("no responde" if _headless == headless else "cambio de modo headless")
+
+        if _driver is None:
+            t0 = time.monotonic()
+            _driver = _launch(headless)
+            _headless = headless
+            if timer:
+                timer.mark("launch")
+            _restore_login(_driver, timer)
+            logger.info(f"[X/Browser] 🚀 Navegador listo en {time.monotonic() - t0:.1f}s (perfil {X_PROFILE_DIR})")
+        else:
+            _restore_login(_driver, timer)
+        return _driver
+    except Exception:
+        _quit("error al abrir sesión")
+        _lock.release()
+        raise
+
+
+def release_driver(ok: bool) -> None:
+    """Libera el navegador; lo recicla si el post falló o por posts / memoria."""
+    global _posts, _peak_rss_mb, _last_used
+    try:
+        _posts += 1
+        _last_used = time.monotonic()
+        rss = browser_rss_mb()
+        _peak_rss_mb = max(_peak_rss_mb, rss)
+        if not ok:
+            _quit("post fallido")
+        elif _posts >= X_BROWSER_MAX_POSTS:
+            _quit(f"límite de {X_BROWSER_MAX_POSTS} posts")
+        elif rss > X_BROWSER_MAX_RSS_MB:
+            _quit(f"RSS {rss:.0f} MB > {X_BROWSER_MAX_RSS_MB} MB")
+    finally:
+        _lock.release()
+
+
+def housekeeping(idle_secs: float, reap_orphans) -> bool | None:
+    """
+    Limpieza periódica sin esperar: None si hay un post en curso. Si no,
+    cierra el navegador inactivo más de `idle_secs` o por encima del límite
+    de RSS, llama a reap_orphans(pids_vivos) y devuelve si cerró el navegador.
+    """
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        closed = False
+        if _driver is not None:
+            rss = browser_rss_mb()
+            if rss > X_BROWSER_MAX_RSS_MB:
+                _quit(f"RSS {rss:.0f} MB > {X_BROWSER_MAX_RSS_MB} MB")
+                closed = True
+            elif time.monotonic() - _last_used > idle_secs:
+                _quit(f"{idle_secs:.0f}s inactivo")
+                closed = True
+        reap_orphans(browser_pids())
+        return closed
+    finally:
+        _lock.release()
+
+
+def close_browser() -> None:
+    """Cierre ordenado (shutdown del bot)."""
+    with _lock:
+        _quit("shutdown")
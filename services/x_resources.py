@@ -0,0 +1,228 @@
+# services/x_resources.py
+"""
+Display virtual y limpieza de recursos del navegador de X.
+
+Xvfb ya no se arranca al iniciar el bot: ensure_display() lo levanta solo
+cuando un post necesita un Firefox no headless, y el job periódico
+run_x_reaper lo para tras X_DISPLAY_IDLE_SECS sin uso. El mismo job cierra
+el navegador inactivo (X_BROWSER_IDLE_SECS) o que supera
+X_BROWSER_MAX_RSS_MB, y mata Firefox/geckodriver huérfanos de posts
+anteriores que ya no pertenecen al navegador vivo.
+
+No importa Selenium: el navegador (services.x_browser) solo se consulta si
+ya está cargado.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from config import X_PROFILE_DIR, X_BROWSER_IDLE_SECS, X_DISPLAY_IDLE_SECS
+from logger import logger
+
+DISPLAY_NUM   = 99
+XVFB_CMD      = ["Xvfb", f":{DISPLAY_NUM}", "-screen", "0", "1920x1080x24", "-ac", "+extension", "GLX"]
+XVFB_READY_TIMEOUT = 10.0   # Máximo para que aparezca el socket del display
+
+_lock = threading.RLock()
+_xvfb: subprocess.Popen | None = None
+_xvfb_pid: int | None = None        # Propio o adoptado (Xvfb :99 de una ejecución anterior)
+_display_last_used = 0.0
+_external_display = "DISPLAY" in os.environ   # Display del sistema: no es nuestro, no se toca
+_counters = {"display_starts": 0, "display_stops": 0, "browser_closes": 0, "reaped": 0}
+_peak_rss_mb = 0.0
+
+
+def _socket_path() -> str:
+    return f"/tmp/.X11-unix/X{DISPLAY_NUM}"
+
+
+def _pgrep(pattern: str) -> list[int]:
+    try:
+        out = subprocess.run(["pgrep", "-f", pattern], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    return [int(p) for p in out.split() if int(p) != os.getpid()]
+
+
+def _alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def ensure_display() -> None:
+    """
+    Garantiza un DISPLAY para un Firefox no headless. Reutiliza el del sistema
+    o un Xvfb :99 ya vivo; si no, lo arranca y espera a su socket.
+    Lanza RuntimeError si Xvfb no está instalado o no arranca a tiempo.
+    """
+    global _xvfb, _xvfb_pid, _display_last_used
+    with _lock:
+        _display_last_used = time.monotonic()
+        if _external_display or _alive(_xvfb_pid):
+            return
+
+        existing = _pgrep(f"Xvfb.*:{DISPLAY_NUM}")
+        if existing:
+            _xvfb, _xvfb_pid = None, existing[0]
+            logger.info(f"[X/Display] Reutilizando Xvfb :{DISPLAY_NUM} existente (pid {_xvfb_pid})")
+        else:
+            try:
+                _xvfb = subprocess.Popen(XVFB_CMD, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except FileNotFoundError:
+                raise RuntimeError("Xvfb no está instalado. Instálalo con: sudo apt-get install xvfb")
+            _xvfb_pid = _xvfb.pid
+            deadline = time.monotonic() + XVFB_READY_TIMEOUT
+            while not os.path.exists(_socket_path()):
+                if _xvfb.poll() is not None or time.monotonic() > deadline:
+                    _stop_display("no arrancó")
+                    raise RuntimeError(f"Xvfb :{DISPLAY_NUM} no arrancó en {XVFB_READY_TIMEOUT:.0f}s")
+                time.sleep(0.05)
+            _counters["display_starts"] += 1
+            logger.info(f"[X/Display] 🖥️ Xvfb :{DISPLAY_NUM} arrancado bajo demanda (pid {_xvfb_pid})")
+        os.environ["DISPLAY"] = f":{DISPLAY_NUM}"
+
+
+def _stop_display(reason: str) -> None:
+    global _xvfb, _xvfb_pid
+    with _lock:
+        if _xvfb_pid is None:
+            return
+        logger.info(f"[X/Display] Parando Xvfb :{DISPLAY_NUM} ({reason})")
+        try:
+            os.kill(_xvfb_pid, signal.SIGTERM)
+            if _xvfb is not None:
+                _xvfb.wait(timeout=5)   # Recoger el proceso: sin zombis
+        except (OSError, subprocess.TimeoutExpired):
+            _kill(_xvfb_pid)
+        _xvfb, _xvfb_pid = None, None
+        os.environ.pop("DISPLAY", None)
+        _counters["display_stops"] += 1
+
+
+def _kill(pid: int) -> None:
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _argv(pid: int) -> list[str]:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().decode(errors="replace").split("\0")[:-1]
+    except OSError:
+        return []
+
+
+def _ppid(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _rss_mb(pid: int | None) -> float:
+    if not pid:
+        return 0.0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _reap_orphans(live: set[int]) -> int:
+    """
+    Mata Firefox con nuestro perfil y geckodriver hijos nuestros que no son
+    del navegador vivo (restos de un post caído o de un quit() fallido).
+    """
+    reaped = 0
+    for pid in set(_pgrep(X_PROFILE_DIR)) | set(_pgrep("geckodriver")):
+        if pid in live:
+            continue
+        argv = _argv(pid)
+        exe = os.path.basename(argv[0]) if argv else ""
+        # Por ejecutable, no por subcadena: un shell que mencione la ruta no es un Firefox
+        ours = (
+            (exe.startswith("firefox") and X_PROFILE_DIR in argv)
+            or (exe.startswith("geckodriver") and _ppid(pid) == os.getpid())
+        )
+        if not ours:
+            continue
+        logger.warning(f"[X/Resources] 🧹 Proceso huérfano {pid}: {' '.join(argv)[:80]}")
+        _kill(pid)
+        reaped += 1
+    _counters["reaped"] += reaped
+    return reaped
+
+
+def reap() -> dict:
+    """
+    Una pasada de limpieza (bloqueante, llamar desde un hilo):
+    navegador inactivo o por encima del límite de RSS, huérfanos y display sin uso.
+    Si hay un post en curso se salta el navegador y los huérfanos.
+    """
+    global _peak_rss_mb
+    browser = sys.modules.get("services.x_browser")
+    needs_display = False
+    if browser is None:
+        _reap_orphans(set())
+    else:
+        # Con el lock del navegador: ningún Firefox nuevo arranca mientras se buscan huérfanos
+        closed = browser.housekeeping(X_BROWSER_IDLE_SECS, _reap_orphans)
+        if closed:
+            _counters["browser_closes"] += 1
+        needs_display = closed is None or browser.needs_display()
+
+    with _lock:
+        if (
+            not needs_display and _xvfb_pid is not None
+            and time.monotonic() - _display_last_used > X_DISPLAY_IDLE_SECS
+        ):
+            _stop_display(f"{X_DISPLAY_IDLE_SECS}s sin uso")
+
+    stats = get_x_resources_stats()
+    _peak_rss_mb = max(_peak_rss_mb, stats["rss_mb"])
+    return stats
+
+
+def get_x_resources_stats() -> dict:
+    """Memoria residente (MB) de Xvfb + navegador y contadores del gestor."""
+    browser = sys.modules.get("services.x_browser")
+    browser_rss = browser.browser_rss_mb() if browser is not None else 0.0
+    xvfb_rss = _rss_mb(_xvfb_pid)
+    return {
+        "display": _xvfb_pid is not None,
+        "browser": bool(browser is not None and browser.get_browser_stats()["alive"]),
+        "rss_mb": round(browser_rss + xvfb_rss, 1),
+        "xvfb_rss_mb": round(xvfb_rss, 1),
+        "peak_rss_mb": round(max(_peak_rss_mb, browser_rss + xvfb_rss), 1),
+        **_counters,
+    }
+
+
+async def run_x_reaper(ctx) -> None:
+    """Job periódico: limpieza de display, navegador y huérfanos."""
+    try:
+        stats = await asyncio.to_thread(reap)
+        logger.debug(f"[X/Resources] {stats}")
+    except Exception as e:
+        logger.error(f"[X/Resources] ❌ Error en la limpieza: {e}", exc_info=True)
+
+
+def close_display() -> None:
+    """Cierre ordenado (shutdown del bot)."""
+    _stop_display("shutdown")
@@ -2,14 +2,10 @@
 """
 x_selenium.py - Publicador automatizado para X (Twitter)
 """
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from io import BytesIO
-import json
 import time
 import os
 try:
@@ -21,18 +17,16 @@ except ImportError:
         d = Dummy()
         d.weightedLength = len(text)
         return d
-from ai.openrouter import obtener_respuesta_con_reintentos
+from ai.openrouter import obtener_respuesta_con_reintentos, deadline_in, is_available
 import asyncio
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from config import IS_PROD
 from logger import logger
-
-# ✅ Ruta absoluta basada en ubicación del archivo
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-COOKIES_FILE = os.path.join(BASE_DIR, "cookies.json")
-GECKODRIVER_PATH = "/usr/local/bin/geckodriver"
+from services.x_browser import acquire_driver, release_driver, posts_in_session, PhaseTimer, record_post_metrics
+from services.llm_cache import get_shortened, store_shortened
 
 MAX_LENGTH = 280
+LLM_SHORTEN_DEADLINE = 30.0   # Plazo total (todos los intentos) para acortar un texto con el LLM
 
 async def optimize_title_for_x(original_title: str, max_chars: int, max_attempts: int = 3) -> str:
     """
@@ -246,7 +240,22 @@ async def optimize_recommendation_for_x(
     if not recommendation or len(recommendation) <= available_chars:
         return recommendation
 
+    # Los textos se repiten casi a diario: servir el acortado de la caché persistente
+    cached = get_shortened(recommendation, available_chars)
+    if cached is not None:
+        logger.info(f"[X_LLM] ♻️ Acortado servido desde caché ({len(cached)} chars)")
+        return cached
+
+    started  = time.monotonic()
+    deadline = deadline_in(LLM_SHORTEN_DEADLINE)
     for attempt in range(1, max_attempts + 1):
+        if not is_available():
+            logger.warning("[X_LLM] ⚡ OpenRouter no disponible (circuito abierto), corte directo")
+            break
+        if time.monotonic() - started >= LLM_SHORTEN_DEADLINE:
+            logger.error(f"[X_LLM] ⏱️ Deadline de {LLM_SHORTEN_DEADLINE:.0f}s agotado en el intento {attempt}")
+            break
+
         margin = 2 + (attempt - 1) * 3
         adjusted_limit = max(10, available_chars - margin)
 
@@ -265,32 +274,54 @@ async def optimize_recommendation_for_x(
         Responde SOLO con el texto acortado ({adjusted_limit} chars máx, sin comillas):"""
 
         try:
-            result = await asyncio.wait_for(
-                obtener_respuesta_con_reintentos(prompt),
-                timeout=30.0,
-            )
+            # El deadline baja hasta cada petición HTTP: nada se cancela a medias
+            result = await obtener_respuesta_con_reintentos(prompt, deadline=deadline)
             result = result.strip().strip('"').strip("'").strip('`').replace('\n', ' ').strip()
 
-            if len(result) <= available_chars:
+            if not result:
+                logger.warning(f"[X_LLM] ⚠️ Intento {attempt}: respuesta vacía")
+            elif len(result) <= available_chars:
+                store_shortened(recommendation, available_chars, result, time.monotonic() - started)
                 return result
             else:
                 logger.warning(f"[X_LLM] ⚠️ Intento {attempt}: Excede ({len(result)} > {available_chars})")
                 if attempt == max_attempts:
-                    cut = result[:available_chars].rsplit(' ', 1)[0].rstrip('.,;:- ')
-                    return cut
-
-        except asyncio.TimeoutError:
-            logger.error(f"[X_LLM] ⏱️ Timeout intento {attempt}")
-            if attempt == max_attempts:
-                return recommendation[:available_chars].rsplit(' ', 1)[0]
+                    # Corte a ciegas: no se cachea, mañana el LLM puede dar uno que quepa entero
+                    return result[:available_chars].rsplit(' ', 1)[0].rstrip('.,;:- ')
 
         except Exception as e:
             logger.error(f"[X_LLM] ❌ Error intento {attempt}: {e}")
-            if attempt == max_attempts:
-                return recommendation[:available_chars].rsplit(' ', 1)[0]
 
     return recommendation[:available_chars].rsplit(' ', 1)[0]
 
+COMPOSER_SELECTORS = ", ".join([
+    "div[data-testid='tweetTextarea_0']",
+    "div[data-testid='tweetTextarea_1']",
+    "div[role='textbox'][data-testid*='tweetTextarea']",
+    "div[role='textbox'][contenteditable='true']",
+])
+
+
+def _find_composer(driver, timeout: int = 10):
+    try:
+        return WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, COMPOSER_SELECTORS))
+        )
+    except TimeoutException:
+        logger.debug("[X] Composer no encontrado en %s", driver.current_url)
+        return None
+
+
+def _post_sent(driver, tweet_box) -> bool:
+    """Tras pulsar Publicar: aparece el toast de confirmación o el composer se vacía/re-renderiza."""
+    if driver.find_elements(By.CSS_SELECTOR, "[data-testid='toast']"):
+        return True
+    try:
+        return not tweet_box.text.strip()
+    except StaleElementReferenceException:
+        return True
+
+
 def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bool:
     """
     Publica un post en X con texto e imagen opcional.
@@ -300,48 +331,22 @@ def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bo
         logger.info("[X] 🛑 Modo DEV (IS_PROD=False): Saltando publicación en X")
         return True
 
-    driver = None
     temp_image_path = None
-    
-    try:     
-        # Configurar Firefox
-        options = Options()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--window-size=1920,1080")
-        if headless:
-            options.add_argument("--headless")
-        
-        service = Service(GECKODRIVER_PATH)
-        driver = webdriver.Firefox(service=service, options=options)
+    ok = False
+    timer = PhaseTimer()
+
+    # Navegador persistente ya en /home con sesión (ver services/x_browser.py)
+    try:
+        driver = acquire_driver(headless, timer)
+    except Exception as e:
+        logger.error(f"[X] ❌ No se pudo preparar el navegador: {e}")
+        record_post_metrics(timer, ok=False, reused=False)
+        return False
+    reused = posts_in_session() > 0
+
+    try:
         wait = WebDriverWait(driver, 30)
-        
-        # 1️⃣ Abrir X
-        driver.get("https://x.com")
-        time.sleep(2)
-        
-        # 2️⃣ Cargar cookies
-        if not os.path.exists(COOKIES_FILE):
-            logger.error(f"[X] ⚠️ Cookies no encontradas en {COOKIES_FILE}")
-            return False
-        
-        with open(COOKIES_FILE) as f:
-            cookies = json.load(f)
-        
-        for c in cookies:
-            c.pop("sameSite", None)
-            driver.add_cookie(c)
-        
-        
-        # 3️⃣ Ir al home logueado
-        driver.get("https://x.com/home")
-        time.sleep(4)
-
-        current_url = driver.current_url
-        if "/login" in current_url or "/i/flow/login" in current_url:
-            logger.error("[X] ❌ Sesión inválida: X redirigió a login (%s)", current_url)
-            return False
-        
+
         # Cerrar posibles modals
         try:
             close_btns = driver.find_elements(By.CSS_SELECTOR, "[aria-label*='Close'], [aria-label*='Cerrar']")
@@ -349,50 +354,30 @@ def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bo
                 for btn in close_btns:
                     if btn.is_displayed():
                         btn.click()
-                        time.sleep(0.5)
+                        WebDriverWait(driver, 2).until(EC.invisibility_of_element(btn))
         except:
             pass
         
-        # 4️⃣ Detectar textarea del composer
-        composer_selectors = [
-            "div[data-testid='tweetTextarea_0']",
-            "div[data-testid='tweetTextarea_1']",
-            "div[role='textbox'][data-testid*='tweetTextarea']",
-            "div[role='textbox'][contenteditable='true']",
-        ]
-
-        tweet_box = None
-        for selector in composer_selectors:
-            try:
-                tweet_box = WebDriverWait(driver, 8).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                break
-            except TimeoutException:
-                logger.debug("[X] Composer no encontrado con selector: %s", selector)
-
+        # 4️⃣ Detectar textarea del composer (todos los selectores en una sola espera)
+        tweet_box = _find_composer(driver)
         if tweet_box is None:
             logger.warning("[X] ⚠️ No aparece composer en /home, probando /compose/post...")
             driver.get("https://x.com/compose/post")
-            time.sleep(3)
-
-            for selector in composer_selectors:
-                try:
-                    tweet_box = WebDriverWait(driver, 8).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    break
-                except TimeoutException:
-                    logger.debug("[X] Composer no encontrado en /compose/post con selector: %s", selector)
+            tweet_box = _find_composer(driver)
 
         if tweet_box is None:
             raise TimeoutException("No se encontró el composer de X en /home ni /compose/post")
         
-        # Scroll y click
+        # Scroll y click: esperar a que el composer tenga el foco antes de escribir
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", tweet_box)
-        time.sleep(1)
         driver.execute_script("arguments[0].click();", tweet_box)
-        time.sleep(1)
+        try:
+            WebDriverWait(driver, 5).until(lambda d: d.execute_script(
+                "return arguments[0].contains(document.activeElement);", tweet_box
+            ))
+        except TimeoutException:
+            logger.debug("[X] El composer no tomó el foco; se escribe igualmente")
+        timer.mark("composer_found")
         
         # Enviar texto
         tweet_box.send_keys(text)
@@ -454,9 +439,8 @@ def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bo
                         
                         # Continuar de todas formas (puede que se haya cargado)
                         logger.warning("[X] ⚠️ Continuando sin confirmación visual...")
-                
-                # Espera adicional para que la UI se estabilice
-                time.sleep(2)
+
+                timer.mark("media_uploaded")
                 
             except TimeoutException:
                 logger.error("[X] ❌ No se encontró el input[data-testid='fileInput']")
@@ -465,7 +449,7 @@ def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bo
                 logger.error(f"[X] ❌ Error subiendo imagen: {e}", exc_info=True)
                 return False
 
-        # 6️⃣ Publicar
+        # 6️⃣ Publicar (el botón se habilita cuando la UI ha procesado texto e imagen)
         post_btn = wait.until(
             EC.element_to_be_clickable(
                 (By.CSS_SELECTOR, "[data-testid='tweetButtonInline']")
@@ -474,10 +458,14 @@ def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bo
         
         # Scroll al botón y click con JS
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", post_btn)
-        time.sleep(0.5)
         driver.execute_script("arguments[0].click();", post_btn)
-                
-        time.sleep(3)
+
+        try:
+            WebDriverWait(driver, 15).until(lambda d: _post_sent(d, tweet_box))
+        except TimeoutException:
+            logger.warning("[X] ⚠️ Sin confirmación visual del envío en 15s")
+        timer.mark("submitted")
+        ok = True
         return True
         
     except Exception as e:
@@ -495,9 +483,9 @@ def post_to_x(text: str, image_bytes: bytes = None, headless: bool = True) -> bo
         return False
         
     finally:
-        # Cleanup
-        if driver:
-            driver.quit()
+        record_post_metrics(timer, ok=ok, reused=reused)
+        # Cleanup: el navegador sigue vivo salvo fallo o reciclado
+        release_driver(ok)
         
         if temp_image_path:
             try:
@@ -0,0 +1,158 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config.py exige estas variables al importarse
+os.environ.setdefault("API_TOKEN", "123:test")
+os.environ.setdefault("DEV_CHAT_ID", "1")
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """Base de datos SQLite temporal con todas las migraciones aplicadas."""
+    from services import gasolina_db
+
+    gasolina_db.close_db()
+    monkeypatch.setattr(gasolina_db, "DB_FILE", str(tmp_path / "gasolina.db"))
+    gasolina_db.init_db()
+    yield gasolina_db
+    gasolina_db.close_db()
+
+
+@pytest.fixture
+def mock_http(monkeypatch):
+    """
+    Sustituye el cliente compartido de services.http_client por uno con
+    httpx.MockTransport. Uso: mock_http(handler) con handler(request) -> Response.
+    """
+    import httpx
+    from services import http_client
+
+    def install(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+        monkeypatch.setattr(http_client, "_client", client)
+        monkeypatch.setattr(http_client, "_global_semaphore", None)
+        http_client._host_semaphores.clear()
+        return client
+
+    yield install
+    http_client._host_semaphores.clear()
+
+
+@pytest.fixture
+def local_server():
+    """
+    Sirve una aiohttp.web.Application en loopback con puerto libre y la
+    para al salir. Uso, dentro del escenario:
+    `async with local_server(app, hosts=1) as bases:`; con hosts > 1 se
+    sirve también en 127.0.0.2... y `bases` lista las URL base en orden.
+    """
+    from contextlib import asynccontextmanager
+    from aiohttp import web
+
+    @asynccontextmanager
+    async def serve(app, hosts=1):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            bases = []
+            for i in range(1, hosts + 1):
+                site = web.TCPSite(runner, f"127.0.0.{i}", 0)
+                await site.start()
+                bases.append(f"http://127.0.0.{i}:{site._server.sockets[0].getsockname()[1]}")
+            yield bases
+        finally:
+            await runner.cleanup()
+
+    return serve
+
+
+@pytest.fixture
+def openrouter_stub(monkeypatch, local_server):
+    """
+    Servidor local que imita la API de OpenRouter (aiohttp.web en 127.0.0.1).
+    Uso: openrouter_stub(scenario) con `async def scenario(mode)`; `mode`
+    controla el retardo, el fallo (503) y el texto de las respuestas.
+    """
+    import asyncio
+    from aiohttp import web
+    from ai import openrouter
+
+    mode = {"fail": False, "delay": 0.01, "requests": 0, "content": "respuesta acortada ok"}
+
+    async def handler(request):
+        mode["requests"] += 1
+        await asyncio.sleep(mode["delay"])
+        if mode["fail"]:
+            return web.json_response({"error": "down"}, status=503)
+        return web.json_response({"choices": [{"message": {"content": mode["content"]}}]})
+
+    async def run(scenario):
+        app = web.Application()
+        app.router.add_post("/v1", handler)
+        async with local_server(app) as (base,):
+            monkeypatch.setitem(openrouter.OPENROUTER_CONFIG, "url", f"{base}/v1")
+            try:
+                return await scenario(mode)
+            finally:
+                await openrouter.close_openrouter()
+
+    monkeypatch.setattr(openrouter, "_breaker", openrouter.CircuitBreaker(3, 60.0))
+    monkeypatch.setattr(openrouter, "_latencies", openrouter.deque(maxlen=200))
+    monkeypatch.setattr(openrouter, "_counters", {"ok": 0, "failed": 0, "short_circuited": 0})
+    return lambda scenario: asyncio.run(run(scenario))
+
+
+@pytest.fixture
+def local_site(local_server):
+    """
+    Sitio local (aiohttp.web en 127.0.0.1) que sirve páginas con cards de
+    precios tras `mode["delay"]` segundos. La primera petición de cada
+    conexión espera además `mode["handshake"]` (coste de TCP+TLS contra el
+    sitio real, que en loopback no existe). Cuenta peticiones, conexiones y
+    el máximo de peticiones simultáneas (total y por host).
+    Uso: local_site(scenario, hosts=1) con `async def scenario(base_url, mode)`;
+    con hosts > 1 se sirve también en 127.0.0.2... y mode["bases"] los lista.
+    """
+    import asyncio
+    from aiohttp import web
+
+    with open(os.path.join(FIXTURES, "gasolinera_plenoil.html"), encoding="utf-8") as f:
+        page = f.read()
+
+    async def run(scenario, hosts):
+        mode = {
+            "delay": 0.005, "handshake": 0.0, "requests": 0, "connections": set(),
+            "in_flight": {}, "max_in_flight": 0, "max_in_flight_host": 0,
+        }
+
+        async def handler(request):
+            mode["requests"] += 1
+            delay = mode["delay"]
+            if request.transport not in mode["connections"]:
+                mode["connections"].add(request.transport)
+                delay += mode["handshake"]
+            in_flight = mode["in_flight"]
+            in_flight[request.host] = in_flight.get(request.host, 0) + 1
+            mode["max_in_flight"] = max(mode["max_in_flight"], sum(in_flight.values()))
+            mode["max_in_flight_host"] = max(mode["max_in_flight_host"], in_flight[request.host])
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                in_flight[request.host] -= 1
+            return web.Response(text=page, content_type="text/html")
+
+        app = web.Application()
+        app.router.add_get("/{path:.*}", handler)
+        async with local_server(app, hosts) as bases:
+            mode["bases"] = bases
+            return await scenario(bases[0], mode)
+
+    return lambda scenario, hosts=1: asyncio.run(run(scenario, hosts))
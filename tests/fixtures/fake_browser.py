@@ -0,0 +1,28 @@
+# tests/fixtures/fake_browser.py
+"""
+Proceso de pega para geckodriver/Firefox en los tests (aquí no hay
+navegador): reserva <mb> MB residentes y espera. Se lanza con argv[0]
+"geckodriver" o "firefox" para que /proc lo vea como tal.
+
+    fake_browser.py <mb> [--child <mb> <args...>]
+
+Con --child arranca además un hijo "firefox" con esos argumentos, como hace
+geckodriver. Termina solo si su padre desaparece.
+"""
+import os
+import subprocess
+import sys
+import time
+
+mb = int(sys.argv[1])
+memory = bytearray(mb * 1024 * 1024)
+for i in range(0, len(memory), 4096):
+    memory[i] = 1
+
+if len(sys.argv) > 3 and sys.argv[2] == "--child":
+    # Con argv[0] cambiado sys.executable queda vacío
+    subprocess.Popen(["firefox", __file__, *sys.argv[3:]], executable=os.readlink("/proc/self/exe"))
+
+parent = os.getppid()
+while os.getppid() == parent:
+    time.sleep(0.2)
@@ -0,0 +1,39 @@
+# tests/fixtures/fake_xvfb.py
+"""
+Xvfb de pega para los tests: crea el socket /tmp/.X11-unix/X<n>, reserva
+<mb> MB residentes y espera; con SIGTERM borra el socket y sale. Termina
+solo si su padre desaparece.
+
+    fake_xvfb.py :<n> <mb>
+"""
+import os
+import signal
+import socket
+import sys
+import time
+
+path = f"/tmp/.X11-unix/X{sys.argv[1].lstrip(':')}"
+memory = bytearray(int(sys.argv[2]) * 1024 * 1024)
+for i in range(0, len(memory), 4096):
+    memory[i] = 1
+
+
+def _stop(*args):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+    sys.exit(0)
+
+
+signal.signal(signal.SIGTERM, _stop)
+os.makedirs(os.path.dirname(path), exist_ok=True)
+if os.path.exists(path):
+    os.unlink(path)
+server = socket.socket(socket.AF_UNIX)
+server.bind(path)
+
+parent = os.getppid()
+while os.getppid() == parent:
+    time.sleep(0.2)
+_stop()
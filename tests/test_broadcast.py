@@ -0,0 +1,129 @@
+# tests/test_broadcast.py
+"""
+broadcast contra una Bot API local (aiohttp.web en 127.0.0.1) usando el
+telegram.Bot real: cientos de contextos, límite global y por chat, un
+RetryAfter (429) y resultados por contexto. Los ritmos se escalan para que
+la suite sea rápida; las proporciones son las de producción.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from publishers import telegram_broadcast
+from publishers.telegram_broadcast import broadcast
+from publishers.telegram_publisher import send_telegram_message
+
+GLOBAL_RATE = 200.0      # x~7 sobre los 30/s reales
+GROUP_RATE  = 2.0
+GROUP_BURST = 3
+FORUM_CHAT  = -1000      # Un foro con varios temas: comparten el bucket del chat
+LIMITED     = -2000      # Responde 429 (retry_after=1) a la primera petición
+MISSING     = -3000      # Responde 400 "chat not found"
+
+
+@pytest.fixture
+def bot_api(monkeypatch, local_server):
+    """
+    Bot API local que responde a getMe y sendMessage, apunta la hora de cada
+    envío y numera los mensajes. Uso: bot_api(scenario) con
+    `async def scenario(app, sent)`; `app.bot` es un telegram.Bot real.
+    """
+    from aiohttp import web
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    monkeypatch.setattr(telegram_broadcast, "GLOBAL_RATE", GLOBAL_RATE)
+    monkeypatch.setattr(telegram_broadcast, "GROUP_RATE", GROUP_RATE)
+    monkeypatch.setattr(telegram_broadcast, "GROUP_BURST", GROUP_BURST)
+    monkeypatch.setattr(telegram_broadcast, "_global_bucket", None)
+    monkeypatch.setattr(telegram_broadcast, "_chat_buckets", {})
+
+    async def run(scenario):
+        loop = asyncio.get_running_loop()
+        sent = []   # (hora, chat_id, thread_id, message_id | None)
+
+        async def handler(request):
+            method = request.match_info["method"]
+            if method == "getMe":
+                return web.json_response({"ok": True, "result": {
+                    "id": 123, "is_bot": True, "first_name": "Gasolina", "username": "gasolina_bot",
+                }})
+            data = await request.post()
+            chat_id = int(data["chat_id"])
+            thread_id = int(data["message_thread_id"]) if "message_thread_id" in data else None
+            if chat_id == LIMITED and not any(s[1] == LIMITED for s in sent):
+                sent.append((loop.time(), chat_id, thread_id, None))
+                return web.json_response({
+                    "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }, status=429)
+            if chat_id == MISSING:
+                sent.append((loop.time(), chat_id, thread_id, None))
+                return web.json_response(
+                    {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}, status=400)
+            message_id = len(sent) + 1
+            sent.append((loop.time(), chat_id, thread_id, message_id))
+            return web.json_response({"ok": True, "result": {
+                "message_id": message_id, "date": 0, "text": data["text"],
+                "chat": {"id": chat_id, "type": "supergroup"},
+            }})
+
+        api = web.Application()
+        api.router.add_post("/bot{token}/{method}", handler)
+        async with local_server(api) as (base,):
+            bot = Bot("123:test", base_url=f"{base}/bot", request=HTTPXRequest(connection_pool_size=64))
+            async with bot:
+                return await scenario(SimpleNamespace(bot=bot), sent)
+
+    return lambda scenario: asyncio.run(run(scenario))
+
+
+def _contexts(n: int) -> list[tuple[int, int | None]]:
+    contexts = [(-100000 - i, None) for i in range(n)]
+    contexts += [(FORUM_CHAT, t) for t in range(1, 7)]
+    contexts += [(LIMITED, None), (MISSING, None)]
+    return contexts
+
+
+def test_broadcast_against_local_bot_api(bot_api):
+    """Benchmark: 600 contextos a GLOBAL_RATE mensajes/s (ráfaga inicial = GLOBAL_RATE)."""
+    contexts = _contexts(600)
+
+    async def scenario(app, sent):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await broadcast(contexts, lambda c, t: send_telegram_message(app, c, t, "hola"), label="test")
+        return results, loop.time() - started, sent
+
+    results, elapsed, sent = bot_api(scenario)
+    delivered = [s for s in sent if s[3] is not None]
+    print(
+        f"\n[broadcast] {len(contexts)} contextos en {elapsed:.2f}s ({len(delivered) / elapsed:.0f}/s, "
+        f"límite {GLOBAL_RATE:.0f}/s + ráfaga {GLOBAL_RATE:.0f}); peticiones a la API: {len(sent)}"
+    )
+
+    # Resultado por contexto: el message_id que devolvió la API, None si falló
+    assert list(results) == contexts
+    by_ctx = {(c, t): m for _, c, t, m in delivered}
+    assert all(results[ctx] == by_ctx[ctx] for ctx in contexts if ctx[0] != MISSING)
+    assert results[(MISSING, None)] is None
+
+    # Límite global: nunca más de ráfaga + ritmo en ningún segundo
+    times = sorted(s[0] for s in sent)
+    assert max(sum(1 for u in times[i:] if u < t + 1.0) for i, t in enumerate(times)) <= GLOBAL_RATE * 2 + 1
+    # Sin ráfaga, la cola se vacía a GLOBAL_RATE: ni más rápido ni mucho más lento
+    minimum = (len(sent) - GLOBAL_RATE) / GLOBAL_RATE
+    assert minimum * 0.9 <= elapsed < minimum * 2 + 1.5
+
+    # Límite por chat: los temas del foro salen a GROUP_RATE tras la ráfaga
+    # (menos lo que cada uno espera después en la cola global, como mucho
+    # MAX_IN_FLIGHT turnos)
+    forum = sorted(s[0] for s in sent if s[1] == FORUM_CHAT)
+    queued = telegram_broadcast.MAX_IN_FLIGHT / GLOBAL_RATE
+    for i in range(GROUP_BURST, len(forum)):
+        assert forum[i] - forum[0] >= (i - GROUP_BURST + 1) / GROUP_RATE - queued
+
+    # RetryAfter: un reintento, no antes de retry_after
+    limited = [s for s in sent if s[1] == LIMITED]
+    assert len(limited) == 2 and limited[1][0] - limited[0][0] >= 0.9
@@ -0,0 +1,83 @@
+# tests/test_dataset.py
+"""
+Ingesta del dataset nacional offline: fixtures JSON/XML con el formato del
+Ministerio y un documento sintético de ~12k estaciones para medir filas/s.
+"""
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from conftest import FIXTURES
+from services.gasolina_dataset import ingest_dataset_file, iter_json_records, iter_xml_records, normalize_record
+
+JSON_FIXTURE = os.path.join(FIXTURES, "dataset_estaciones.json")
+XML_FIXTURE  = os.path.join(FIXTURES, "dataset_estaciones.xml")
+
+
+def _rows(db):
+    with db.transaction() as c:
+        return c.execute(
+            "SELECT ideess, tipo_combustible, precio FROM precios_estaciones ORDER BY ideess, tipo_combustible"
+        ).fetchall()
+
+
+def test_json_and_xml_normalise_identically():
+    with open(JSON_FIXTURE, encoding="utf-8-sig") as fp:
+        from_json = [normalize_record(r) for r in iter_json_records(fp)]
+    with open(XML_FIXTURE, "rb") as fp:
+        from_xml = [normalize_record(r) for r in iter_xml_records(fp)]
+    assert from_json == from_xml
+    assert from_json[2] is None                      # Registro sin IDEESS
+    assert from_json[0]["precios"] == {"Gasoleo A": 1.389, "Gasolina 95 E5": 1.459}
+    assert from_json[0]["longitud"] == -0.874528
+
+
+@pytest.mark.parametrize("path", [JSON_FIXTURE, XML_FIXTURE], ids=["json", "xml"])
+def test_ingest_fixture(tmp_db, path):
+    result = ingest_dataset_file(path, "2026-10-17")
+    assert (result["estaciones"], result["precios"]) == (3, 10)
+    rows = _rows(tmp_db)
+    assert len(rows) == 10
+    assert tuple(rows[0]) == ("11203", "Gasoleo A", 1.399)
+
+
+def test_json_record_split_across_chunks(monkeypatch):
+    from services import gasolina_dataset
+    monkeypatch.setattr(gasolina_dataset, "_CHUNK", 7)
+    with open(JSON_FIXTURE, encoding="utf-8-sig") as fp:
+        assert [r["IDEESS"] for r in iter_json_records(fp)] == ["4375", "11203", "", "2981"]
+
+
+def _synthetic_dataset(path, n: int) -> None:
+    with open(JSON_FIXTURE, encoding="utf-8-sig") as f:
+        template = json.load(f)["ListaEESSPrecio"][1]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"Fecha":"17/10/2026 9:30:12","ListaEESSPrecio":[')
+        for i in range(n):
+            record = dict(template, IDEESS=str(i))
+            record["Precio Gasoleo A"] = f"1,{300 + i % 200:03d}"
+            f.write(("," if i else "") + json.dumps(record, ensure_ascii=False))
+        f.write('],"ResultadoConsulta":"OK"}')
+
+
+def test_national_dataset_throughput(tmp_db, tmp_path):
+    """Benchmark: documento del tamaño del nacional (~12k estaciones, 4 precios cada una)."""
+    path = tmp_path / "dataset.json"
+    _synthetic_dataset(path, 12000)
+    size_mb = os.path.getsize(path) / 1e6
+
+    tracemalloc.start()
+    result = ingest_dataset_file(str(path), "2026-10-17")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"\n[dataset] {result['estaciones']} estaciones / {result['precios']} precios en "
+        f"{result['segundos']}s ({result['filas_por_segundo']} filas/s), fichero {size_mb:.1f} MB, "
+        f"pico Python {peak / 1e6:.1f} MB"
+    )
+    assert (result["estaciones"], result["precios"]) == (12000, 48000)
+    assert result["segundos"] < 10
+    assert peak < os.path.getsize(path)   # Streaming: nunca el documento entero en memoria
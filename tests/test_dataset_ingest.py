@@ -0,0 +1,75 @@
+# tests/test_dataset_ingest.py
+"""
+insert_dataset: una sola transacción sobre su propia conexión. Durante la
+carga el resto del bot sigue leyendo y escribiendo (sin ver el día a
+medias) y una carga cortada no deja nada.
+"""
+import threading
+
+import pytest
+
+
+def _record(i: int) -> dict:
+    return {
+        "ideess": str(i), "rotulo": f"Estación {i}", "direccion": "", "localidad": "",
+        "municipio": "Zaragoza", "provincia": "Zaragoza", "cp": "50001",
+        "latitud": 41.6, "longitud": -0.9,
+        "precios": {"Gasolina 95 E5": 1.459, "Gasoleo A": 1.389},
+    }
+
+
+def _count(db, table: str) -> int:
+    with db.transaction() as c:
+        return c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_bot_keeps_working_during_the_load(tmp_db, monkeypatch):
+    monkeypatch.setattr(tmp_db, "_DATASET_BATCH", 10)
+    seen = []
+
+    def bot_thread():
+        # Otro hilo del bot (update horario) a mitad de la carga
+        with tmp_db.transaction() as c:
+            seen.append(c.execute("SELECT COUNT(*) FROM estaciones").fetchone()[0])
+            c.execute(tmp_db._UPSERT_TOP, ("zgza", "2026-10-17", "A", "Gasoleo A", 1.5))
+
+    def records():
+        for i in range(30):
+            if i == 15:
+                t = threading.Thread(target=bot_thread)
+                t.start()
+                t.join(timeout=2)
+                assert not t.is_alive(), "insert_dataset bloquea la BD durante la carga"
+            yield _record(i)
+
+    assert tmp_db.insert_dataset("2026-10-17", records()) == (30, 60)
+    assert seen == [0]   # Nada visible antes del COMMIT final
+    assert (_count(tmp_db, "estaciones"), _count(tmp_db, "precios_estaciones"), _count(tmp_db, "precios_top")) == (30, 60, 1)
+
+
+def test_failed_load_leaves_nothing(tmp_db, monkeypatch):
+    monkeypatch.setattr(tmp_db, "_DATASET_BATCH", 10)
+
+    def records():
+        for i in range(12):
+            yield _record(i)
+        raise ValueError("JSON cortado")
+
+    with pytest.raises(ValueError):
+        tmp_db.insert_dataset("2026-10-17", records())
+    assert (_count(tmp_db, "estaciones"), _count(tmp_db, "precios_estaciones")) == (0, 0)
+    # Relanzarla carga el día completo; repetirla es idempotente
+    for _ in range(2):
+        assert tmp_db.insert_dataset("2026-10-17", (_record(i) for i in range(12))) == (12, 24)
+    assert (_count(tmp_db, "estaciones"), _count(tmp_db, "precios_estaciones")) == (12, 24)
+
+
+def test_reload_updates_prices(tmp_db):
+    tmp_db.insert_dataset("2026-10-17", [_record(1)])
+    record = dict(_record(1), rotulo="Plenoil", precios={"Gasoleo A": 1.299})
+    tmp_db.insert_dataset("2026-10-17", [record])
+    with tmp_db.transaction() as c:
+        assert c.execute("SELECT rotulo FROM estaciones").fetchone()[0] == "Plenoil"
+        assert c.execute(
+            "SELECT precio FROM precios_estaciones WHERE tipo_combustible = 'Gasoleo A'"
+        ).fetchone()[0] == 1.299
@@ -0,0 +1,161 @@
+# tests/test_db.py
+"""
+services/gasolina_db.py: upserts por lotes sobre la conexión persistente
+frente a la versión anterior (conexión nueva y un INSERT por fila) con
+miles de filas por ciclo, y migraciones desde cualquier PRAGMA user_version
+anterior.
+"""
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from services import gasolina_db, gasolina_stats
+from services.gasolina_price import Price
+
+CYCLES   = 5
+STATIONS = 1000    # x 4 combustibles = 4000 filas por ciclo
+FUELS    = ["Gasolina 95 E5", "Gasolina 98 E5", "Gasoleo A", "Gasoleo Premium"]
+
+
+def _rows(cycle: int) -> list[tuple]:
+    # Mismo día en todos los ciclos, como el update horario: en cada ciclo
+    # cambia de precio una de cada 20 gasolineras
+    return [
+        ("zgza", "2026-10-17", f"Estación {s}", fuel,
+         round(1.4 + i * 0.1 + ((s * 31 + (cycle if s % 20 == cycle % 20 else 0) * 7) % 97) / 1000, 3))
+        for s in range(STATIONS) for i, fuel in enumerate(FUELS)
+    ]
+
+
+def _legacy_upsert(db_file: str, rows: list[tuple]) -> None:
+    """Implementación anterior (con la clave de ciudad actual): conexión nueva por llamada y un INSERT por fila."""
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    for row in rows:
+        c.execute('''
+            INSERT INTO precios_top (ciudad, date, estacion, tipo_combustible, precio)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(ciudad, date, estacion, tipo_combustible)
+            DO UPDATE SET precio = excluded.precio, timestamp = CURRENT_TIMESTAMP
+        ''', row)
+    conn.commit()
+    conn.close()
+
+
+def _batched_upsert(rows: list[tuple]) -> None:
+    with gasolina_db.transaction() as c:
+        c.executemany(gasolina_db._UPSERT_TOP, rows)
+
+
+def _timed(fn, cycles: list[list[tuple]]) -> float:
+    """Mejor de cinco pasadas por todos los ciclos."""
+    times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for rows in cycles:
+            fn(rows)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def _snapshot(conn) -> list[tuple]:
+    return [tuple(r) for r in conn.execute(
+        "SELECT ciudad, date, estacion, tipo_combustible, precio FROM precios_top ORDER BY 1, 2, 3, 4")]
+
+
+def test_batched_upserts_benchmark(tmp_db, tmp_path):
+    cycles = [_rows(n) for n in range(CYCLES)]
+    # Antes: base sin WAL (journal por defecto, synchronous=FULL) con el mismo esquema
+    legacy_file = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(legacy_file, isolation_level=None)
+    tmp_db._migration_1(conn)
+    legacy_s = _timed(lambda rows: _legacy_upsert(legacy_file, rows), cycles)
+    legacy = _snapshot(conn)
+    conn.close()
+
+    batched_s = _timed(_batched_upsert, cycles)
+    with tmp_db.transaction() as c:
+        assert _snapshot(c) == legacy and len(legacy) == STATIONS * len(FUELS)
+
+    print(f"\n[db] {CYCLES} ciclos x {STATIONS * len(FUELS)} filas: por fila {legacy_s / CYCLES * 1000:.1f} ms/ciclo, "
+          f"por lotes {batched_s / CYCLES * 1000:.1f} ms/ciclo")
+    assert batched_s < legacy_s
+
+
+def test_repeated_day_folds_only_price_changes(tmp_db):
+    version = tmp_db.get_data_version()
+    for precio in ("1,500 €", "1,500 €", "1,500 €", "1,400 €", "1,400 €", "1,500 €"):
+        tmp_db.insert_precios_top("2026-10-17", {"A": {"Gasoleo A": Price.parse(precio)}})
+
+    with tmp_db.transaction() as c:
+        assert tuple(c.execute(
+            "SELECT precio_min, precio_max, round(precio_sum, 3), n, precio_last FROM rollup_diario"
+        ).fetchone()) == (1.4, 1.5, 4.4, 3, 1.5)
+        assert c.execute("SELECT precio_min FROM rollup_ciudad_diario").fetchone()[0] == 1.4
+        assert c.execute("SELECT precio FROM precios_top").fetchone()[0] == 1.5
+        assert c.execute("SELECT COUNT(*) FROM rollup_bloques").fetchone()[0] == tmp_db.ROLLUP_NIVELES
+    assert tmp_db.get_data_version() == version + 3   # Las repeticiones no invalidan la caché de estadísticas
+
+
+def _baseline_schema(conn: sqlite3.Connection) -> None:
+    """Base de antes de las migraciones: sin ciudad, con duplicados y los índices antiguos."""
+    conn.execute('''
+        CREATE TABLE precios_top (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            date TEXT,
+            estacion TEXT,
+            tipo_combustible TEXT,
+            precio REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_precios_fuel_date ON precios_top(tipo_combustible, date)")
+
+
+@pytest.mark.parametrize("version", range(len(gasolina_db.MIGRATIONS)))
+def test_upgrade_from_older_version(tmp_path, monkeypatch, version):
+    gasolina_db.close_db()
+    monkeypatch.setattr(gasolina_db, "DB_FILE", str(tmp_path / "gasolina.db"))
+    monkeypatch.setattr(gasolina_stats, "DB_FILE", gasolina_db.DB_FILE)
+    hoy = date.today()
+    dias = [(hoy - timedelta(days=d)).isoformat() for d in (2, 1)]
+
+    # Base creada por una versión anterior del bot, con datos de dos días
+    if version == 0:
+        conn = sqlite3.connect(gasolina_db.DB_FILE)
+        _baseline_schema(conn)
+        for fecha in dias:
+            for precio in (1.5, 1.4):   # Duplicado: la dedup se queda con el primero
+                conn.execute(
+                    "INSERT INTO precios_top (date, estacion, tipo_combustible, precio) VALUES (?, 'A', 'Gasoleo A', ?)",
+                    (fecha, precio))
+        conn.commit()
+        conn.close()
+    else:
+        with gasolina_db.transaction() as c:
+            for migration in gasolina_db.MIGRATIONS[:version]:
+                migration(c)
+            c.execute(f"PRAGMA user_version = {version}")
+        for fecha in dias:
+            if version >= 3:
+                gasolina_db.insert_precios_top(fecha, {"A": {"Gasoleo A": Price.parse("1,500 €")}})
+            else:
+                with gasolina_db.transaction() as c:
+                    c.execute(
+                        "INSERT INTO precios_top (ciudad, date, estacion, tipo_combustible, precio) "
+                        "VALUES ('zgza', ?, 'A', 'Gasoleo A', 1.5)", (fecha,))
+
+    gasolina_db.init_db()
+    gasolina_db.init_db()   # Ya al día: no vuelve a aplicar nada
+
+    with gasolina_db.transaction() as c:
+        assert c.execute("PRAGMA user_version").fetchone()[0] == len(gasolina_db.MIGRATIONS)
+        assert [tuple(r) for r in c.execute(
+            "SELECT ciudad, date, precio FROM precios_top ORDER BY date")] == [("zgza", d, 1.5) for d in dias]
+        assert c.execute("SELECT COUNT(*) FROM rollup_diario").fetchone()[0] == 2
+        assert c.execute("SELECT COUNT(*) FROM cache_llm").fetchone()[0] == 0
+    stats = gasolina_stats._calcular_estadisticas("zgza", dias[0])
+    assert stats["picos"]["Gasoleo A"]["max"] == {"estacion": "A", "precio": 1.5, "fecha": dias[0]}
+    gasolina_db.close_db()
@@ -0,0 +1,118 @@
+# tests/test_fetch_backend.py
+"""
+Cadena de backends de fetch contra un sitio con challenge y un FlareSolverr
+falso, ambos locales (aiohttp.web en 127.0.0.1).
+"""
+import asyncio
+
+import httpx
+import pytest
+from aiohttp import web
+
+from services import http_client
+from services.flaresolverr import FlareSolverr
+
+CHALLENGE = (
+    "<html><head><title>Just a moment...</title></head>"
+    "<body><div id='challenge-platform'></div></body></html>"
+)
+SOLVED_UA = "FlareSolverr-UA"
+
+
+@pytest.mark.parametrize("status, headers, body, expected", [
+    (403, {"cf-mitigated": "challenge"}, "", True),
+    (503, {}, CHALLENGE, True),
+    (200, {}, CHALLENGE, True),
+    (200, {"cf-mitigated": "challenge"}, "<html></html>", True),
+    # Página real tras Cloudflare: carga el script de challenge-platform pero no es un challenge
+    (200, {}, "<html><script src='/cdn-cgi/challenge-platform/scripts/jsd/main.js'></script>"
+              "<div class='cuadro-precios'>1,459</div></html>", False),
+    (404, {}, CHALLENGE, False),
+])
+def test_is_challenge(status, headers, body, expected):
+    assert http_client.is_challenge(httpx.Response(status, headers=headers, text=body)) is expected
+
+
+@pytest.fixture
+def challenged_site(monkeypatch, local_server):
+    """Sitio que exige cf_clearance + el User-Agent de FlareSolverr, y el FlareSolverr falso."""
+    calls = {"site": 0, "solves": 0, "sessions": 0, "destroyed": 0}
+
+    async def site(request):
+        calls["site"] += 1
+        if request.cookies.get("cf_clearance") == "ok" and request.headers.get("User-Agent") == SOLVED_UA:
+            return web.Response(text=f"<div class='cuadro-precios'>{request.path}</div>", content_type="text/html")
+        return web.Response(status=403, text=CHALLENGE, content_type="text/html",
+                            headers={"cf-mitigated": "challenge"})
+
+    async def flaresolverr(request):
+        body = await request.json()
+        if body["cmd"] == "sessions.create":
+            calls["sessions"] += 1
+            return web.json_response({"status": "ok", "session": "s1"})
+        if body["cmd"] == "sessions.destroy":
+            calls["destroyed"] += 1
+            return web.json_response({"status": "ok"})
+        assert body["session"] == "s1"
+        calls["solves"] += 1
+        await asyncio.sleep(0.2)   # Navegador real: la vía cara
+        return web.json_response({"status": "ok", "solution": {
+            "url": body["url"], "status": 200, "headers": {"content-type": "text/html"},
+            "response": "<div class='cuadro-precios'>solved</div>",
+            "cookies": [{"name": "cf_clearance", "value": "ok", "domain": "127.0.0.1", "path": "/"}],
+            "userAgent": SOLVED_UA,
+        }})
+
+    async def run(scenario):
+        app = web.Application()
+        app.router.add_post("/v1", flaresolverr)
+        app.router.add_get("/{path:.*}", site)
+        async with local_server(app) as (base,):
+            monkeypatch.setattr(http_client, "_flaresolverr", FlareSolverr(f"{base}/v1"))
+            try:
+                return await scenario(base)
+            finally:
+                await http_client.close_client()
+
+    monkeypatch.setattr(http_client, "_backend_stats", {"plain": 0, "challenged": 0, "solved": 0, "failed": 0})
+    return calls, lambda scenario: asyncio.run(run(scenario))
+
+
+def test_challenge_solved_once_and_reused(challenged_site):
+    calls, run = challenged_site
+
+    async def scenario(base):
+        burst = await asyncio.gather(*[http_client.fetch(f"{base}/p{i}") for i in range(4)])
+        later = [await http_client.fetch(f"{base}/q{i}") for i in range(20)]
+        client = http_client.get_client()
+        return burst, later, client.cookies.get("cf_clearance"), dict(http_client._host_headers)
+
+    burst, later, cookie, host_headers = run(scenario)
+
+    assert all(r.status_code == 200 for r in burst + later)
+    assert calls["sessions"] == 1 and calls["solves"] == 1     # Una resolución para toda la ráfaga
+    assert calls["destroyed"] == 1                              # close_client libera la sesión
+    assert cookie == "ok"
+    assert list(host_headers.values()) == [{"User-Agent": SOLVED_UA}]
+    assert [r.text for r in later] == [f"<div class='cuadro-precios'>/q{i}</div>" for i in range(20)]
+
+    stats = http_client.get_fetch_backend_stats()
+    assert stats["challenged"] == 4 and stats["plain"] == 20
+    assert stats["expensive_ratio"] == round(1 / 24, 3)
+
+
+def test_fallback_disabled_unless_configured(challenged_site, monkeypatch):
+    import importlib
+    import config
+
+    monkeypatch.delenv("FLARESOLVERR_URL", raising=False)
+    assert importlib.reload(config).FLARESOLVERR_URL == ""
+    calls, run = challenged_site
+
+    async def scenario(base):
+        monkeypatch.setattr(http_client, "_flaresolverr", None)   # Lo que crea http_client con la URL vacía
+        with pytest.raises(httpx.HTTPStatusError):
+            await http_client.fetch(f"{base}/p")
+
+    run(scenario)
+    assert calls["site"] == 1 and calls["sessions"] == calls["solves"] == 0
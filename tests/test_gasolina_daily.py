@@ -0,0 +1,94 @@
+# tests/test_gasolina_daily.py
+"""
+Job diario: el pipeline de España y el de cada ciudad son independientes
+(un España caído no retrasa a Zaragoza) y el post de España en X consta
+como enviado solo cuando la cola lo confirma.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import gasolina_scheduler, gasolina_state
+from services.gasolina_price import Price
+from services.gasolina_registry import get_city, DEFAULT_CITY_KEY
+
+CHEAPEST = {"Gasolina 95 E5": {"precio": Price.parse("1,459 €"), "estacion": "Plenoil", "direccion": ""}}
+TOP      = {"Plenoil": {"Gasolina 95 E5": Price.parse("1,459 €")}}
+
+
+@pytest.fixture
+def daily(tmp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(gasolina_state, "_cache", None)
+    monkeypatch.setattr(gasolina_state, "_flush_handle", None)
+    monkeypatch.setattr(gasolina_state, "LEGACY_STATE_FILE", str(tmp_path / "gasolina_state.json"))
+    gasolina_state._dirty.clear()
+    city = get_city(DEFAULT_CITY_KEY)
+    monkeypatch.setattr(gasolina_scheduler, "load_cities", lambda: [city])
+    monkeypatch.setattr(gasolina_scheduler, "DAILY_RETRY_DELAY", 3600)
+    sent = []
+
+    async def fetch_city(c):
+        return CHEAPEST, TOP
+
+    async def send_telegram_photo(app, chat_id, thread_id, text, image):
+        sent.append(chat_id)
+        return 100 + len(sent)
+
+    async def format_cheapest_x(data, name):
+        return f"X {name}"
+
+    monkeypatch.setattr(gasolina_scheduler, "fetch_city", fetch_city)
+    monkeypatch.setattr(gasolina_scheduler, "send_telegram_photo", send_telegram_photo)
+    monkeypatch.setattr(gasolina_scheduler, "format_cheapest_x", format_cheapest_x)
+    monkeypatch.setattr(gasolina_scheduler, "schedule_delayed_pin", lambda *a, **k: None)
+    return SimpleNamespace(city=city, sent=sent)
+
+
+def test_failing_spain_does_not_delay_the_city(daily, monkeypatch):
+    attempts = []
+
+    async def send_spain_daily():
+        attempts.append(1)
+        raise RuntimeError("scrape de España caído")
+
+    monkeypatch.setattr(gasolina_scheduler, "_send_spain_daily", send_spain_daily)
+    combined = gasolina_scheduler._k(daily.city, "combined")
+
+    async def scenario():
+        job = asyncio.create_task(gasolina_scheduler.run_gasolina_daily(SimpleNamespace(application=None)))
+        try:
+            # España espera DAILY_RETRY_DELAY (1 h) para reintentar; la ciudad no
+            for _ in range(100):
+                if gasolina_scheduler._already_sent_today(combined):
+                    break
+                await asyncio.sleep(0.01)
+            return job.done()
+        finally:
+            job.cancel()
+
+    assert asyncio.run(scenario()) is False          # España sigue esperando su reintento
+    assert gasolina_scheduler._already_sent_today(combined)
+    assert not gasolina_scheduler._already_sent_today("spain_x")
+    assert daily.sent and attempts == [1]
+    assert gasolina_state.get_state(gasolina_scheduler._k(daily.city, "messages"))
+
+
+@pytest.mark.parametrize("ok", [True, False])
+def test_spain_marked_sent_when_the_queue_confirms(daily, monkeypatch, ok):
+    callbacks = []
+
+    async def fetch_spain_cheapest():
+        return CHEAPEST
+
+    monkeypatch.setattr(gasolina_scheduler, "IS_PROD", True)
+    monkeypatch.setattr(gasolina_scheduler, "fetch_spain_cheapest", fetch_spain_cheapest)
+    monkeypatch.setattr(gasolina_scheduler, "queue_x_text_with_image",
+                        lambda text, image, on_done=None: callbacks.append(on_done))
+
+    asyncio.run(gasolina_scheduler._run_spain_daily())
+    assert len(callbacks) == 1
+    assert not gasolina_scheduler._already_sent_today("spain_x")   # Encolado, aún sin publicar
+
+    callbacks[0](ok)
+    assert gasolina_scheduler._already_sent_today("spain_x") is ok
@@ -0,0 +1,65 @@
+# tests/test_gasolina_update.py
+import asyncio
+
+import pytest
+
+from services import gasolina_scheduler, gasolina_state
+from services.gasolina_price import Price
+from services.gasolina_registry import get_city, DEFAULT_CITY_KEY
+from services.gasolina_snapshot import PriceSnapshot
+
+CHEAPEST = {"Gasolina 95 E5": {"precio": Price.parse("1,459 €"), "estacion": "Plenoil", "direccion": ""}}
+TOP      = {"Plenoil": {"Gasolina 95 E5": Price.parse("1,459 €")}}
+
+
+@pytest.fixture
+def city(tmp_db, monkeypatch):
+    monkeypatch.setattr(gasolina_state, "_cache", None)
+    monkeypatch.setattr(gasolina_state, "_flush_handle", None)
+    gasolina_state._dirty.clear()
+    monkeypatch.setattr(gasolina_scheduler, "insert_precios_top", lambda *a, **k: None)
+
+    async def edit_captions(app, messages, caption, image, label="", body=None):
+        return {}
+
+    monkeypatch.setattr(gasolina_scheduler, "edit_captions", edit_captions)
+
+    city = get_city(DEFAULT_CITY_KEY)
+    snapshot = PriceSnapshot.from_data(CHEAPEST, TOP)
+    gasolina_state.set_state(gasolina_scheduler._k(city, "messages"), [[1, None, 10]])
+    gasolina_state.set_state(gasolina_scheduler._k(city, "last_snapshot"), snapshot.to_json())
+    gasolina_state.set_state(gasolina_scheduler._k(city, "last_fingerprint"), snapshot.fingerprint)
+    return city
+
+
+def _update(city, cheapest, top):
+    async def run():
+        await gasolina_scheduler._update_city(None, city, cheapest, top, "12:10")
+        gasolina_state.flush_state()
+    asyncio.run(run())
+
+
+def test_unchanged_prices_skip_deserialising(city, monkeypatch):
+    def from_json(data):
+        raise AssertionError("no debe deserializarse el snapshot si la huella coincide")
+
+    monkeypatch.setattr(PriceSnapshot, "from_json", staticmethod(from_json))
+    _update(city, CHEAPEST, TOP)
+
+
+def test_changed_prices_update_fingerprint(city):
+    top = {"Plenoil": {"Gasolina 95 E5": Price.parse("1,449 €")}}
+    _update(city, CHEAPEST, top)
+
+    stored = gasolina_state.get_state(gasolina_scheduler._k(city, "last_fingerprint"))
+    assert stored == PriceSnapshot.from_data(CHEAPEST, top).fingerprint
+    assert gasolina_state.get_state(gasolina_scheduler._k(city, "last_snapshot"))["top"]["Plenoil"] == {
+        "Gasolina 95 E5": "1,449 €",
+    }
+
+
+def test_missing_fingerprint_is_backfilled(city):
+    key = gasolina_scheduler._k(city, "last_fingerprint")
+    gasolina_state.delete_state(key)
+    _update(city, CHEAPEST, TOP)
+    assert gasolina_state.get_state(key) == PriceSnapshot.from_data(CHEAPEST, TOP).fingerprint
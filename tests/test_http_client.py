@@ -0,0 +1,67 @@
+# tests/test_http_client.py
+"""
+Benchmark del cliente compartido contra el camino anterior (una conexión
+nueva por petición en un hilo del executor) sobre un sitio local: ciclos
+horarios de una página de ciudad + 4 gasolineras. El sitio cobra un
+handshake simulado por conexión nueva.
+"""
+import asyncio
+import threading
+import time
+import urllib.request
+
+from services import http_client
+
+CYCLES    = 10
+HANDSHAKE = 0.03   # ~2 RTT de TCP+TLS contra un servidor remoto
+PATHS  = ["/gasolineras/zaragoza"] + [f"/gasolinera/estacion-{i}" for i in range(4)]
+
+
+def _cycle_urls(base: str) -> list[str]:
+    return [base + p for p in PATHS]
+
+
+async def _run_cycles(base, fetch_one) -> tuple[float, int]:
+    threads_before = threading.active_count()
+    started = time.perf_counter()
+    for _ in range(CYCLES):
+        await asyncio.gather(*[fetch_one(u) for u in _cycle_urls(base)])
+    return (time.perf_counter() - started) / CYCLES, threading.active_count() - threads_before
+
+
+def _fresh_connection(url: str) -> str:
+    # Como antes: sin sesión, conexión nueva por petición
+    with urllib.request.urlopen(url, timeout=10) as r:
+        return r.read().decode()
+
+
+def test_pooled_client_vs_fresh_connections(local_site, monkeypatch):
+    monkeypatch.setattr(http_client, "_client", None)
+    monkeypatch.setattr(http_client, "_global_semaphore", None)
+    http_client._host_semaphores.clear()
+
+    async def baseline(base, mode):
+        mode["handshake"] = HANDSHAKE
+        cycle_s, threads = await _run_cycles(base, lambda u: asyncio.to_thread(_fresh_connection, u))
+        return cycle_s, threads, len(mode["connections"])
+
+    async def pooled(base, mode):
+        mode["handshake"] = HANDSHAKE
+        http_client.get_client()   # Se crea una vez al arrancar el proceso, no en cada ciclo
+        try:
+            cycle_s, threads = await _run_cycles(base, http_client.get_html)
+        finally:
+            await http_client.close_client()
+        return cycle_s, threads, len(mode["connections"])
+
+    old_s, old_threads, old_conns = local_site(baseline)
+    new_s, new_threads, new_conns = local_site(pooled)
+    print(
+        f"\n[http_client] {CYCLES} ciclos x {len(PATHS)} páginas: "
+        f"antes {old_s * 1000:.1f} ms/ciclo, {old_conns} conexiones, +{old_threads} hilos | "
+        f"ahora {new_s * 1000:.1f} ms/ciclo, {new_conns} conexiones, +{new_threads} hilos"
+    )
+    assert old_conns == CYCLES * len(PATHS)
+    assert new_conns <= http_client.MAX_PER_HOST     # Keep-alive: el pool se reutiliza entre ciclos
+    assert new_threads < old_threads
+    assert new_s < old_s
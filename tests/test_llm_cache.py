@@ -0,0 +1,82 @@
+# tests/test_llm_cache.py
+"""
+Caché persistente de acortados del LLM: caducidad a los
+LLM_CACHE_TTL_DAYS días, expulsión LRU por `usado` al pasar de
+LLM_CACHE_MAX_ENTRIES, contadores de aciertos y latencia ahorrada, y el
+corte a ciegas de una respuesta demasiado larga, que no se cachea.
+"""
+import pytest
+
+from services import llm_cache
+
+DAY = 86400
+
+
+@pytest.fixture
+def cache(tmp_db, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(llm_cache, "time", type("Clock", (), {"time": staticmethod(lambda: clock[0])}))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL_DAYS", 7)
+    monkeypatch.setattr(llm_cache, "_counters", {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evicted": 0})
+    monkeypatch.setattr(llm_cache, "_latency", {"saved_s": 0.0, "llm_s": 0.0})
+    return clock
+
+
+def test_entries_expire_after_ttl(cache):
+    llm_cache.store_shortened("Gasolinera Muy Larga", 10, "G. Larga", latency=2.0, model="m")
+    cache[0] += 7 * DAY - 1
+    assert llm_cache.get_shortened("Gasolinera Muy Larga", 10, model="m") == "G. Larga"
+    cache[0] += 2                                    # Cuenta desde que se creó, no desde el último uso
+    assert llm_cache.get_shortened("Gasolinera Muy Larga", 10, model="m") is None
+    assert llm_cache.get_llm_cache_stats()["expired"] == 1
+    with llm_cache.transaction() as c:
+        assert c.execute("SELECT COUNT(*) FROM cache_llm").fetchone()[0] == 0
+
+
+def test_key_includes_budget_and_model(cache):
+    llm_cache.store_shortened("texto", 10, "corto", latency=1.0, model="m")
+    assert llm_cache.get_shortened("texto", 9, model="m") is None
+    assert llm_cache.get_shortened("texto", 10, model="otro") is None
+    assert llm_cache.get_shortened("texto", 10, model="m") == "corto"
+
+
+def test_lru_evicts_least_recently_used(cache, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_ENTRIES", 3)
+    for name in ("a", "b", "c"):
+        llm_cache.store_shortened(name, 10, name.upper(), latency=1.0, model="m")
+        cache[0] += 1
+    llm_cache.get_shortened("a", 10, model="m")     # a pasa a ser la más reciente: b es la más antigua
+    cache[0] += 1
+    llm_cache.store_shortened("d", 10, "D", latency=1.0, model="m")
+
+    assert [llm_cache.get_shortened(n, 10, model="m") for n in ("a", "b", "c", "d")] == ["A", None, "C", "D"]
+    assert llm_cache.get_llm_cache_stats()["evicted"] == 1
+
+
+def test_counters_and_saved_latency(cache):
+    llm_cache.store_shortened("uno", 10, "1", latency=2.5, model="m")
+    llm_cache.store_shortened("dos", 10, "2", latency=1.25, model="m")
+    for text in ("uno", "uno", "dos", "tres"):
+        llm_cache.get_shortened(text, 10, model="m")
+
+    assert llm_cache.get_llm_cache_stats() == {
+        "hits": 3, "misses": 1, "expired": 0, "stores": 2, "evicted": 0,
+        "hit_rate": 0.75, "saved_s": 6.25, "llm_s": 3.75,
+    }
+    with llm_cache.transaction() as c:
+        assert dict(c.execute("SELECT salida, hits FROM cache_llm").fetchall()) == {"1": 2, "2": 1}
+
+
+def test_hard_cut_is_not_cached(tmp_db, openrouter_stub):
+    from services.x_selenium import optimize_recommendation_for_x
+
+    text, budget = "Plenoil 1,459 € · Ballenoil 1,469 € · Petroprix 1,479 € · Costco 1,489 €", 40
+
+    async def scenario(mode):
+        mode["content"] = "una respuesta del modelo que nunca cabe en el presupuesto pedido"
+        cut = await optimize_recommendation_for_x(text, budget)
+        return cut, mode["requests"]
+
+    cut, requests = openrouter_stub(scenario)
+    assert requests == 3 and len(cut) <= budget
+    assert llm_cache.get_shortened(text, budget) is None   # El siguiente día se vuelve a pedir al LLM
@@ -0,0 +1,73 @@
+# tests/test_openrouter.py
+"""
+Cliente de OpenRouter contra un servidor local que imita la API
+(aiohttp.web en 127.0.0.1): reutilización del pool, latencias, circuit
+breaker y deadline compartido.
+"""
+import asyncio
+import time
+
+import pytest
+
+from ai import openrouter
+
+
+def test_pooled_session_latency(openrouter_stub):
+    async def scenario(mode):
+        for _ in range(50):
+            assert await openrouter.get_deepseek_response("hola") == "respuesta acortada ok"
+        connector = openrouter.get_session().connector
+        return openrouter.get_openrouter_stats(), sum(len(c) for c in connector._conns.values())
+
+    stats, idle_conns = openrouter_stub(scenario)
+    print(f"\n[openrouter] p50={stats['p50']}s p95={stats['p95']}s p99={stats['p99']}s")
+    assert stats["ok"] == 50
+    assert idle_conns == 1          # Una sola conexión keep-alive para 50 peticiones secuenciales
+    assert stats["p95"] < 0.5
+
+
+def test_breaker_short_circuits_when_down(openrouter_stub):
+    async def scenario(mode):
+        mode["fail"] = True
+        started = time.monotonic()
+        results = [await openrouter.get_deepseek_response("hola") for _ in range(10)]
+        return results, time.monotonic() - started, mode["requests"]
+
+    results, elapsed, requests = openrouter_stub(scenario)
+    assert results == [""] * 10
+    assert requests == openrouter._breaker.threshold   # El resto ni sale del proceso
+    assert openrouter.get_openrouter_stats()["short_circuited"] == 7
+    assert openrouter._breaker.state == "open"
+    assert elapsed < 1.0
+
+
+def test_cancelled_probe_releases_half_open(openrouter_stub):
+    async def scenario(mode):
+        breaker = openrouter._breaker
+        breaker.failures, breaker.opened_at = 3, time.monotonic() - 61   # half-open
+        mode["delay"] = 1
+        probe = asyncio.create_task(openrouter.get_deepseek_response("hola"))
+        await asyncio.sleep(0.2)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.state == "half-open"
+        mode["delay"] = 0.01
+        # Sin la liberación del probe esto devolvería "" para siempre
+        return await openrouter.get_deepseek_response("hola"), breaker.state
+
+    answer, state = openrouter_stub(scenario)
+    assert answer == "respuesta acortada ok"
+    assert state == "closed"
+
+
+def test_deadline_bounds_retries(openrouter_stub):
+    async def scenario(mode):
+        mode["delay"] = 1
+        started = time.monotonic()
+        answer = await openrouter.obtener_respuesta_con_reintentos("x", deadline=openrouter.deadline_in(0.3))
+        return answer, time.monotonic() - started
+
+    answer, elapsed = openrouter_stub(scenario)
+    assert not answer
+    assert elapsed < 0.8
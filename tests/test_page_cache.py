@@ -0,0 +1,78 @@
+# tests/test_page_cache.py
+import asyncio
+
+import httpx
+import pytest
+
+from services import gasolina_scraper
+
+URL = "https://preciocombustible.es/test/conditional"
+HTML = "<html><div class='cuadro-precios'>1,459</div></html>"
+
+
+def test_304_returns_cached_parse(mock_http, monkeypatch):
+    monkeypatch.setattr(gasolina_scraper, "_page_cache", {})
+    seen_headers = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_headers.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, text=HTML, headers={"ETag": '"v1"'})
+
+    mock_http(handler)
+    parses = []
+
+    def parse(html):
+        parses.append(html)
+        return {"Gasolina 95 E5": {"precio": "1,459 €"}}
+
+    before = gasolina_scraper.get_page_cache_stats()["not_modified"]
+    first = asyncio.run(gasolina_scraper._fetch_parsed(URL, parse))
+    second = asyncio.run(gasolina_scraper._fetch_parsed(URL, parse))
+
+    assert first == second == {"Gasolina 95 E5": {"precio": "1,459 €"}}
+    assert len(parses) == 1
+    assert seen_headers[1]["if-none-match"] == '"v1"'
+    assert gasolina_scraper.get_page_cache_stats()["not_modified"] == before + 1
+
+
+def test_error_status_still_raises(mock_http, monkeypatch):
+    monkeypatch.setattr(gasolina_scraper, "_page_cache", {})
+    mock_http(lambda request: httpx.Response(500, text="boom"))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(gasolina_scraper._fetch_parsed(URL, lambda html: {}))
+
+
+def _page(head: str, last_card: str, tail: str) -> str:
+    return (
+        f"<html><head><script>{head}</script></head><body><div class='uk-grid'>"
+        "<div><div class='cuadro-precios'><h2>Gasolina 95 E5</h2><div itemprop='price'>1,459 €</div></div></div>"
+        f"<div><div class='cuadro-precios'><span>{'Polígono ' * 400}</span><div><div itemprop='price'>{last_card}</div></div></div></div>"
+        f"</div><table><tr><td>{tail}</td></tr></table></body></html>"
+    )
+
+
+def test_region_is_the_cards_only():
+    region = gasolina_scraper._relevant_region(_page("gtag(1)", "1,389 €", "1,500 €"))
+    assert region.count("cuadro-precios") == 2 and "1,389 €" in region   # Última card entera (> 3000 caracteres)
+    assert "gtag" not in region and "1,500 €" not in region
+    assert region.endswith("</div></div></div>")
+
+
+def test_hash_hit_ignores_everything_but_the_cards(mock_http, monkeypatch):
+    monkeypatch.setattr(gasolina_scraper, "_page_cache", {})
+    pages = iter([
+        _page("gtag(1)", "1,389 €", "1,500 €"),
+        _page("gtag(2)", "1,389 €", "1,490 €"),    # Cambian el script y la tabla: mismo parseo
+        _page("gtag(2)", "1,379 €", "1,490 €"),    # Cambia el precio al final de la última card
+    ])
+    mock_http(lambda request: httpx.Response(200, text=next(pages)))
+    parses = []
+
+    def parse(html):
+        parses.append(html)
+        return {"n": len(parses)}
+
+    results = [asyncio.run(gasolina_scraper._fetch_parsed(URL, parse)) for _ in range(3)]
+    assert results == [{"n": 1}, {"n": 1}, {"n": 2}]
@@ -0,0 +1,69 @@
+# tests/test_parsers.py
+"""
+Equivalencia y benchmark de los backends de parseo sobre páginas guardadas
+en tests/fixtures (misma estructura de cards que preciocombustible.es, con
+scripts, estilos, comentarios y entidades).
+"""
+import glob
+import os
+import time
+
+import pytest
+
+from conftest import FIXTURES
+from services.gasolina_parsers import Bs4Parser, LxmlParser
+
+PAGES = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_backends_are_equivalent(path):
+    html = _read(path)
+    bs4, lxml = Bs4Parser(), LxmlParser()
+    assert lxml.cheapest_cards(html) == bs4.cheapest_cards(html)
+    assert lxml.station_cards(html) == bs4.station_cards(html)
+    assert bs4.station_cards(html)   # La fixture tiene cards
+
+
+@pytest.mark.parametrize("html", [
+    '<div class="cuadro-precios"><h2 class="uk-h4">Gasoleo<!-- x --> A</h2><span itemprop="price" content="1.459"></span></div>',
+    '<div class="cuadro-precios"><h2 class="uk-h4">Gas A</h2><div class="uk-h2">1,4<script>var a=1</script>59 €</div></div>',
+    '<div class="cuadro-precios"><h2 class="uk-h4">Gas A</h2><div class="uk-h2">1,459<style>b{}</style> €</div></div>',
+    '<p><div class="cuadro-precios"><h2 class="uk-h4">G</h2><span class="uk-h2">1.5</span></div></p>',
+    '<div class="cuadro-precios"><h2 class="uk-h4">G &amp; A</h2><span class="uk-h2">1.5</span>'
+    '<span>dir <b>x</b></span><a href="/a?x=1&amp;y=2">l</a></div>',
+    '<div class="cuadro-precios"><table><h2 class="uk-h4">T</h2></table><span class="uk-h2">1.5</span></div>',
+    "",
+])
+def test_backends_agree_on_edge_cases(html):
+    bs4, lxml = Bs4Parser(), LxmlParser()
+    assert lxml.cheapest_cards(html) == bs4.cheapest_cards(html)
+    assert lxml.station_cards(html) == bs4.station_cards(html)
+
+
+def test_script_text_is_not_part_of_the_price():
+    html = _read(os.path.join(FIXTURES, "gasolinera_plenoil.html"))
+    assert dict(LxmlParser().station_cards(html))["Gasoleo Premium"] == "1,499€/l"
+
+
+def test_lxml_is_faster():
+    """Benchmark: cards de todas las fixtures, N pasadas por backend."""
+    pages = [_read(p) for p in PAGES]
+    runs = 20
+
+    def bench(parser):
+        started = time.perf_counter()
+        for _ in range(runs):
+            for html in pages:
+                parser.cheapest_cards(html)
+                parser.station_cards(html)
+        return (time.perf_counter() - started) / runs
+
+    bs4_s, lxml_s = bench(Bs4Parser()), bench(LxmlParser())
+    print(f"\n[parsers] bs4={bs4_s * 1000:.2f} ms  lxml={lxml_s * 1000:.2f} ms  x{bs4_s / lxml_s:.1f}")
+    assert lxml_s * 2 < bs4_s
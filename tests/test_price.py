@@ -0,0 +1,21 @@
+# tests/test_price.py
+import pytest
+
+from services.gasolina_price import Price
+
+
+@pytest.mark.parametrize("raw, milli, text", [
+    ("1.459", 1459, "1,459 €"),
+    ("1,459€", 1459, "1,459 €"),
+    ("1,459\xa0€", 1459, "1,459 €"),
+    ("N/D", None, "N/D €"),
+    ("", None, " €"),
+    # Decimal los acepta, pero no son precios: int() lanza ValueError / OverflowError
+    ("NaN", None, "NaN €"),
+    ("sNaN", None, "sNaN €"),
+    ("Infinity", None, "Infinity €"),
+    ("-inf", None, "-inf €"),
+])
+def test_parse(raw, milli, text):
+    price = Price.parse(raw)
+    assert (price.milli, str(price)) == (milli, text)
@@ -0,0 +1,95 @@
+# tests/test_registry_scaling.py
+"""
+Registro de ciudades desde CITIES_FILE y benchmark de escalado de
+fetch_cities contra un sitio local: tiempo de ciclo frente a nº de
+gasolineras, respetando los límites global y por host.
+"""
+import json
+import time
+
+import pytest
+
+from config import SCRAPER_MAX_CONCURRENCY
+from services import gasolina_registry, gasolina_scraper, http_client
+
+STATIONS_PER_CITY = 10
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Escribe un CITIES_FILE con las ciudades dadas y recarga el registro."""
+    path = tmp_path / "ciudades.json"
+    monkeypatch.setattr(gasolina_registry, "CITIES_FILE", str(path))
+    monkeypatch.setattr(gasolina_registry, "_cities", None)
+    monkeypatch.setattr(gasolina_scraper, "_page_cache", {})
+    monkeypatch.setattr(http_client, "_client", None)
+    monkeypatch.setattr(http_client, "_global_semaphore", None)
+    http_client._host_semaphores.clear()
+
+    def write(cities):
+        path.write_text(json.dumps(cities), encoding="utf-8")
+        return gasolina_registry.load_cities(reload=True)
+
+    return write
+
+
+def _cities(bases: list[str], n_stations: int) -> list[dict]:
+    cities = []
+    for c in range(n_stations // STATIONS_PER_CITY):
+        base = bases[c % len(bases)]
+        cities.append({
+            "key": f"c{c}",
+            "name": f"Ciudad {c}",
+            "url": f"{base}/ciudad-{c}",
+            "stations": {f"Estación {c}-{s}": f"{base}/ciudad-{c}/{s}" for s in range(STATIONS_PER_CITY)},
+        })
+    return cities
+
+
+def test_registry_defaults_and_normalisation(registry):
+    cities = registry([{"key": "hu", "url": "https://preciocombustible.es/huesca/huesca"}])
+    assert cities == [{
+        "key": "hu", "name": "hu", "url": "https://preciocombustible.es/huesca/huesca",
+        "stations": {}, "image": "data/image_hu.jpg", "chat_id": None, "x": False,
+    }]
+    assert gasolina_registry.get_city("hu") is cities[0]
+
+
+def _cycle(local_site, registry, n_stations: int, hosts: int) -> tuple[float, dict]:
+    async def scenario(base, mode):
+        mode["delay"] = 0.01
+        cities = registry(_cities(mode["bases"], n_stations))
+        http_client.get_client()
+        try:
+            started = time.perf_counter()
+            scraped = await gasolina_scraper.fetch_cities(cities)
+            elapsed = time.perf_counter() - started
+        finally:
+            await http_client.close_client()
+        assert all(result is not None and len(result[1]) == STATIONS_PER_CITY for result in scraped.values())
+        return elapsed, mode
+
+    return local_site(scenario, hosts=hosts)
+
+
+def test_cycle_time_scales_with_stations(local_site, registry):
+    """Benchmark: un solo host (como preciocombustible.es): manda el límite por host."""
+    rows = []
+    for n in (20, 100, 400):
+        elapsed, mode = _cycle(local_site, registry, n, hosts=1)
+        rows.append((n, elapsed, mode["max_in_flight_host"]))
+        assert mode["requests"] == n + n // STATIONS_PER_CITY
+        assert mode["max_in_flight_host"] <= http_client.MAX_PER_HOST
+    print("\n[registry] estaciones  ciclo(s)  simultáneas/host")
+    for n, elapsed, peak in rows:
+        print(f"[registry] {n:>10}  {elapsed:8.3f}  {peak:>5}")
+    # Lineal en nº de páginas (no se serializa por ciudad ni explota con N)
+    (n0, t0, _), (n1, t1, _) = rows[0], rows[-1]
+    assert t1 < t0 * (n1 / n0) * 1.5
+
+
+def test_global_cap_across_hosts(local_site, registry):
+    elapsed, mode = _cycle(local_site, registry, 400, hosts=8)
+    print(f"\n[registry] 400 estaciones en 8 hosts: {elapsed:.3f}s, máx. simultáneas {mode['max_in_flight']}")
+    assert mode["max_in_flight_host"] <= http_client.MAX_PER_HOST
+    assert http_client.MAX_PER_HOST < mode["max_in_flight"] <= SCRAPER_MAX_CONCURRENCY
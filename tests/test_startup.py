@@ -0,0 +1,35 @@
+# tests/test_startup.py
+"""
+Arranque del bot: `import bot.app` no carga el scheduler ni los módulos
+pesados, y tarda menos que importar también el scheduler como antes.
+Cada import se mide en un proceso limpio (mejor de tres).
+"""
+import os
+import subprocess
+import sys
+import time
+
+from conftest import ROOT
+
+HEAVY = ("services.gasolina_scheduler", "selenium", "bs4", "aiohttp", "ai.openrouter")
+
+
+def _import(code: str) -> tuple[float, str]:
+    times = []
+    for _ in range(3):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=os.environ.copy(),
+                              capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - started)
+    return min(times), proc.stdout
+
+
+def test_bot_app_import_is_light():
+    check = f"import sys; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    after_s, loaded = _import(f"import bot.app; {check}")
+    # Antes bot.app importaba el scheduler al cargarse
+    before_s, _ = _import("import bot.app, services.gasolina_scheduler")
+
+    print(f"\n[startup] import bot.app: antes {before_s * 1000:.0f} ms, ahora {after_s * 1000:.0f} ms")
+    assert loaded.split() == []
+    assert after_s < before_s
@@ -0,0 +1,106 @@
+# tests/test_state.py
+"""
+Almacén de estado por clave (tabla `estado`) y benchmark frente al antiguo
+data/gasolina_state.json reescrito entero en cada guardado, con estado de
+cientos de chats.
+"""
+import json
+import time
+
+import pytest
+
+from services import gasolina_state
+from services.gasolina_state import get_state, set_state, delete_state, flush_state, state_keys
+
+CHATS = 500
+
+
+@pytest.fixture
+def state(tmp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(gasolina_state, "_cache", None)
+    monkeypatch.setattr(gasolina_state, "_flush_handle", None)
+    monkeypatch.setattr(gasolina_state, "LEGACY_STATE_FILE", str(tmp_path / "gasolina_state.json"))
+    gasolina_state._dirty.clear()
+    return gasolina_state
+
+
+def _reload(state):
+    flush_state()
+    state._cache = None
+
+
+def _chat_state(i: int) -> dict:
+    snapshot = {
+        "zgza": {f: f"1,{400 + i % 100:03d} €" for f in ("Gasolina 95 E5", "Gasolina 98 E5", "Gasoleo A", "Gasoleo Premium")},
+        "top": {f"Estación {s}": {"Gasolina 95 E5": "1,459 €", "Gasoleo A": "1,389 €"} for s in range(10)},
+    }
+    return {
+        f"c{i}_messages": [[-100000 - i, None, 1000 + i]],
+        f"c{i}_message_date": "2026-10-17",
+        f"c{i}_last_snapshot": snapshot,
+        f"c{i}_initial_snapshot": snapshot,
+    }
+
+
+def test_per_key_roundtrip(state):
+    set_state("a", {"x": [1, 2]})
+    set_state("b", "hola")
+    delete_state("b")
+    _reload(state)
+    assert get_state("a") == {"x": [1, 2]}
+    assert get_state("b", "por defecto") == "por defecto"
+    assert state_keys() == ["a"]
+
+
+def test_legacy_file_is_imported_once(state, tmp_path):
+    legacy = tmp_path / "gasolina_state.json"
+    legacy.write_text(json.dumps({"zgza_message_date": "2026-10-16"}), encoding="utf-8")
+    assert get_state("zgza_message_date") == "2026-10-16"
+    assert not legacy.exists() and (tmp_path / "gasolina_state.json.migrated").exists()
+    _reload(state)
+    assert get_state("zgza_message_date") == "2026-10-16"
+
+
+def test_state_store_vs_json_file(state, tmp_path):
+    """Benchmark: una actualización de clave con estado de CHATS chats."""
+    full = {}
+    for i in range(CHATS):
+        full.update(_chat_state(i))
+    updates = [(f"c{i}_message_date", "2026-10-18") for i in range(0, CHATS, CHATS // 20)]
+
+    # Antes: cargar, modificar y reescribir el JSON entero (indent=2) en cada guardado
+    path = tmp_path / "legacy.json"
+    path.write_text(json.dumps(full, indent=2), encoding="utf-8")
+    started = time.perf_counter()
+    for key, value in updates:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        data[key] = value
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    legacy_s = (time.perf_counter() - started) / len(updates)
+
+    for key, value in full.items():
+        set_state(key, value)
+    _reload(state)
+
+    started = time.perf_counter()
+    get_state("c0_messages")
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key, value in updates:
+        get_state(key)
+        set_state(key, value)
+        flush_state()   # Peor caso: sin agrupar escrituras (el debounce las junta)
+    store_s = (time.perf_counter() - started) / len(updates)
+
+    print(
+        f"\n[state] {CHATS} chats ({path.stat().st_size / 1e6:.1f} MB en JSON): "
+        f"JSON {legacy_s * 1000:.2f} ms/actualización | tabla {store_s * 1000:.3f} ms/actualización, "
+        f"carga inicial {load_s * 1000:.0f} ms (una vez por proceso)"
+    )
+    _reload(state)
+    assert get_state(updates[-1][0]) == "2026-10-18"
+    assert get_state("c1_last_snapshot") == full["c1_last_snapshot"]
+    assert store_s * 10 < legacy_s
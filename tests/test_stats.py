@@ -0,0 +1,196 @@
+# tests/test_stats.py
+"""
+obtener_estadisticas_periodo frente a la implementación anterior (12
+consultas sobre precios_top) en un histórico sintético de un año con 1000
+gasolineras: mismos resultados y benchmark.
+"""
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services import gasolina_db, gasolina_stats
+from services.gasolina_stats import FUEL_ORDER, DIAS_NOMBRE
+
+YEARS    = 1
+STATIONS = 1000
+CIUDAD   = "zgza"
+
+
+def _legacy_estadisticas(conn, ciudad: str, fecha_inicio: str) -> dict:
+    """Implementación anterior: 3 consultas por combustible (más el MAX/MIN por separado)."""
+    stats = {"picos": {}, "variacion": {}, "dias_baratos": {}}
+    args = lambda fuel: (ciudad, fuel, fecha_inicio)   # noqa: E731
+    for fuel in FUEL_ORDER:
+        row_max = conn.execute(
+            "SELECT estacion, MAX(precio) AS p, date FROM precios_top "
+            "WHERE ciudad = ? AND tipo_combustible = ? AND date >= ?", args(fuel)).fetchone()
+        row_min = conn.execute(
+            "SELECT estacion, MIN(precio) AS p, date FROM precios_top "
+            "WHERE ciudad = ? AND tipo_combustible = ? AND date >= ?", args(fuel)).fetchone()
+        if row_max["p"] is not None and row_min["p"] is not None:
+            stats["picos"][fuel] = {
+                "max": {"estacion": row_max["estacion"], "precio": row_max["p"], "fecha": row_max["date"]},
+                "min": {"estacion": row_min["estacion"], "precio": row_min["p"], "fecha": row_min["date"]},
+            }
+    for fuel in FUEL_ORDER:
+        row = conn.execute(
+            "SELECT estacion, MAX(precio) - MIN(precio) AS v FROM precios_top "
+            "WHERE ciudad = ? AND tipo_combustible = ? AND date >= ? "
+            "GROUP BY estacion ORDER BY v DESC LIMIT 1", args(fuel)).fetchone()
+        if row and row["v"] is not None and row["v"] > 0:
+            stats["variacion"][fuel] = {"estacion": row["estacion"], "variacion": round(row["v"], 3)}
+    for fuel in FUEL_ORDER:
+        row = conn.execute(
+            "SELECT strftime('%w', date) AS d, AVG(precio) AS p FROM ("
+            "  SELECT date, MIN(precio) AS precio FROM precios_top"
+            "  WHERE ciudad = ? AND tipo_combustible = ? AND date >= ? GROUP BY date"
+            ") GROUP BY d ORDER BY p ASC LIMIT 1", args(fuel)).fetchone()
+        if row:
+            stats["dias_baratos"][fuel] = {"dia": DIAS_NOMBRE[row["d"]], "precio_medio": round(row["p"], 3)}
+    return stats
+
+
+def _generar(c, dias: int, stations: int) -> None:
+    """Histórico de los últimos `dias` días en precios_top y rollups recalculados desde él."""
+    first = (date.today() - timedelta(days=dias)).isoformat()
+    fuels = " UNION ALL ".join(f"SELECT {i}, '{f}'" for i, f in enumerate(FUEL_ORDER))
+    c.execute(f'''
+        WITH RECURSIVE
+            d(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM d WHERE n < {dias}),
+            s(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM s WHERE n < {stations - 1}),
+            f(i, fuel) AS ({fuels})
+        INSERT INTO precios_top (ciudad, date, estacion, tipo_combustible, precio)
+        SELECT '{CIUDAD}', date('{first}', '+' || d.n || ' days'), 'Estación ' || s.n, f.fuel,
+               -- Determinista, con efecto por día de la semana y por estación
+               round(1.3 + f.i * 0.1 + ((s.n * 7919 + d.n * 104729 + f.i * 31) % 997) / 10000.0
+                     + (CAST(strftime('%w', date('{first}', '+' || d.n || ' days')) AS INTEGER) * 0.003), 3)
+        FROM d, s, f
+    ''')
+    c.execute("DELETE FROM rollup_diario")
+    c.execute("DELETE FROM rollup_ciudad_diario")
+    c.execute("DELETE FROM rollup_bloques")
+    c.execute("DELETE FROM rollup_bloques_ciudad")
+    gasolina_db._migration_3(c)   # Backfill de los rollups desde precios_top
+
+
+@pytest.fixture(scope="module")
+def history(tmp_path_factory):
+    """Histórico sintético generado en SQL: YEARS años x STATIONS gasolineras x 4 combustibles."""
+    mp = pytest.MonkeyPatch()
+    gasolina_db.close_db()
+    db_file = str(tmp_path_factory.mktemp("stats") / "gasolina.db")
+    mp.setattr(gasolina_db, "DB_FILE", db_file)
+    mp.setattr(gasolina_stats, "DB_FILE", db_file)
+    gasolina_db.init_db()
+    with gasolina_db.transaction() as c:
+        _generar(c, 365 * YEARS, STATIONS)
+    yield gasolina_db
+    gasolina_db.close_db()
+    mp.undo()
+
+
+def _best_of(n: int, fn):
+    times = []
+    for _ in range(n):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, min(times)
+
+
+def _comparable(stats: dict) -> dict:
+    # Los empates los resolvía SQLite arbitrariamente (columnas sueltas): comparar valores
+    return {
+        "picos": {f: (p["max"]["precio"], p["min"]["precio"]) for f, p in stats["picos"].items()},
+        "variacion": {f: v["variacion"] for f, v in stats["variacion"].items()},
+        "dias_baratos": stats["dias_baratos"],
+    }
+
+
+@pytest.mark.parametrize("dias", [7, 30, 365])
+def test_matches_legacy_benchmark(history, dias):
+    fecha_inicio = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d")
+
+    def legacy_run():
+        with history.transaction() as conn:
+            return _legacy_estadisticas(conn, CIUDAD, fecha_inicio)
+
+    legacy, legacy_s = _best_of(3, legacy_run)
+    current, current_s = _best_of(3, lambda: gasolina_stats._calcular_estadisticas(CIUDAD, fecha_inicio))
+
+    print(f"\n[stats] {dias:>3} días, {STATIONS} estaciones: antes {legacy_s * 1000:.0f} ms, ahora {current_s * 1000:.0f} ms")
+    assert list(current["picos"]) == FUEL_ORDER
+    assert _comparable(current) == _comparable(legacy)
+    assert current_s < legacy_s
+
+
+def test_ties_are_deterministic(tmp_db, monkeypatch):
+    from services.gasolina_price import Price
+
+    monkeypatch.setattr(gasolina_stats, "DB_FILE", tmp_db.DB_FILE)
+    hoy = date.today()
+    for days_ago, top in [
+        (3, {"B": {"Gasoleo A": "1,500 €"}, "A": {"Gasoleo A": "1,500 €"}}),
+        (1, {"C": {"Gasoleo A": "1,500 €"}, "A": {"Gasoleo A": "1,400 €"}}),
+    ]:
+        fecha = (hoy - timedelta(days=days_ago)).isoformat()
+        tmp_db.insert_precios_top(fecha, {st: {f: Price.parse(p) for f, p in fuels.items()} for st, fuels in top.items()}, CIUDAD)
+
+    stats = gasolina_stats._calcular_estadisticas(CIUDAD, (hoy - timedelta(days=7)).isoformat())
+    picos = stats["picos"]["Gasoleo A"]
+    # Máximo empatado en tres filas: la fecha más antigua y, dentro de ella, el nombre
+    assert (picos["max"]["estacion"], picos["max"]["fecha"]) == ("A", (hoy - timedelta(days=3)).isoformat())
+    assert picos["min"]["estacion"] == "A" and picos["min"]["precio"] == 1.4
+    assert stats["variacion"]["Gasoleo A"] == {"estacion": "A", "variacion": 0.1}
+
+
+def test_blocks_cover_the_range_exactly():
+    from services.gasolina_db import ROLLUP_NIVELES, bloques_rango
+
+    hoy = date.today()
+    for dias in range(0, 800, 7):
+        desde = hoy - timedelta(days=dias)
+        bloques = bloques_rango(desde.isoformat(), hoy.isoformat())
+        cubiertos = [inicio + i for nivel, inicio in bloques for i in range(1 << nivel)]
+        assert all(inicio % (1 << nivel) == 0 and nivel < ROLLUP_NIVELES for nivel, inicio in bloques)
+        assert cubiertos == list(range(cubiertos[0], cubiertos[0] + dias + 1))
+        assert len(bloques) <= 2 * ROLLUP_NIVELES + dias // (1 << (ROLLUP_NIVELES - 1))
+
+
+def test_incremental_blocks_match_the_backfill(tmp_db):
+    from services.gasolina_price import Price
+
+    hoy = date.today()
+    for days_ago in range(40):
+        fecha = (hoy - timedelta(days=days_ago)).isoformat()
+        top = {f"E{s}": {"Gasoleo A": Price.parse(f"1,{(s * 37 + days_ago * 11) % 50 + 400} €")} for s in range(6)}
+        for _ in range(2):   # El update horario repite el día
+            tmp_db.insert_precios_top(fecha, top, CIUDAD)
+
+    def blocks():
+        with tmp_db.transaction() as c:
+            return [[tuple(r) for r in c.execute(f"SELECT * FROM {t} ORDER BY 1, 2, 3, 4, 5")]
+                    for t in ("rollup_bloques", "rollup_bloques_ciudad")]
+
+    incremental = blocks()
+    with tmp_db.transaction() as c:
+        c.execute("DELETE FROM rollup_bloques")
+        c.execute("DELETE FROM rollup_bloques_ciudad")
+        tmp_db._migration_3(c)
+    assert blocks() == incremental and len(incremental[1]) > 40
+
+
+def test_latency_is_flat_as_history_grows(tmp_db, monkeypatch):
+    monkeypatch.setattr(gasolina_stats, "DB_FILE", tmp_db.DB_FILE)
+    fecha_inicio = (date.today() - timedelta(days=30)).isoformat()
+    tiempos = {}
+    for dias in (60, 960):
+        with tmp_db.transaction() as c:
+            c.execute("DELETE FROM precios_top")
+            _generar(c, dias, 200)
+        _, tiempos[dias] = _best_of(5, lambda: gasolina_stats._calcular_estadisticas(CIUDAD, fecha_inicio))
+
+    print(f"\n[stats] 30 días con {', '.join(f'{d} días de histórico: {t * 1000:.1f} ms' for d, t in tiempos.items())}")
+    # 16 veces más histórico: se leen los mismos bloques, solo crece la profundidad de los índices
+    assert tiempos[960] < 2 * tiempos[60]
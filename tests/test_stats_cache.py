@@ -0,0 +1,67 @@
+# tests/test_stats_cache.py
+"""
+Caché de obtener_estadisticas_periodo: aciertos, invalidación por versión
+de datos al guardar precios nuevos y expulsión LRU al llenarse.
+"""
+from datetime import date
+
+import pytest
+
+from services import gasolina_stats
+from services.gasolina_price import Price
+
+
+@pytest.fixture
+def stats(tmp_db, monkeypatch):
+    monkeypatch.setattr(gasolina_stats, "DB_FILE", tmp_db.DB_FILE)
+    monkeypatch.setattr(gasolina_stats, "_stats_cache", gasolina_stats.OrderedDict())
+    monkeypatch.setattr(gasolina_stats, "_stats_cache_counters", {"hits": 0, "misses": 0})
+    calls = []
+    calcular = gasolina_stats._calcular_estadisticas
+    monkeypatch.setattr(gasolina_stats, "_calcular_estadisticas",
+                        lambda *args: calls.append(args) or calcular(*args))
+    _insert(tmp_db, "1,500 €")
+    return calls
+
+
+def _insert(db, precio: str) -> None:
+    db.insert_precios_top(date.today().isoformat(), {"A": {"Gasoleo A": Price.parse(precio)}})
+
+
+def test_repeated_call_is_a_hit(stats):
+    first = gasolina_stats.obtener_estadisticas_periodo(7)
+    first["picos"].clear()                  # El llamador recibe una copia
+    second = gasolina_stats.obtener_estadisticas_periodo(7)
+
+    assert second["picos"]["Gasoleo A"]["max"]["precio"] == 1.5
+    assert len(stats) == 1
+    assert gasolina_stats.get_stats_cache_stats() == {"hits": 1, "misses": 1, "size": 1, "hit_rate": 0.5}
+
+
+def test_new_prices_invalidate_the_cache(stats, tmp_db):
+    gasolina_stats.obtener_estadisticas_periodo(7)
+    version = tmp_db.get_data_version()
+
+    _insert(tmp_db, "1,500 €")              # Mismo precio: nada que invalidar
+    gasolina_stats.obtener_estadisticas_periodo(7)
+    assert tmp_db.get_data_version() == version and len(stats) == 1
+
+    _insert(tmp_db, "1,600 €")
+    assert tmp_db.get_data_version() == version + 1
+    fresh = gasolina_stats.obtener_estadisticas_periodo(7)
+    assert len(stats) == 2 and fresh["picos"]["Gasoleo A"]["max"]["precio"] == 1.6
+
+
+def test_lru_eviction_at_cache_size(stats, monkeypatch):
+    monkeypatch.setattr(gasolina_stats, "STATS_CACHE_SIZE", 3)
+    for dias in (1, 2, 3):
+        gasolina_stats.obtener_estadisticas_periodo(dias)
+    gasolina_stats.obtener_estadisticas_periodo(1)    # 1 pasa a ser la más reciente
+    gasolina_stats.obtener_estadisticas_periodo(4)    # Expulsa la menos usada: 2
+
+    assert [key[0] for key in gasolina_stats._stats_cache] == [3, 1, 4]
+    assert gasolina_stats.get_stats_cache_stats()["size"] == 3
+    calls_before = len(stats)
+    gasolina_stats.obtener_estadisticas_periodo(2)    # Recalculada (expulsa 3)
+    gasolina_stats.obtener_estadisticas_periodo(4)    # Sigue en caché
+    assert len(stats) == calls_before + 1
@@ -0,0 +1,135 @@
+# tests/test_telegram_edits.py
+"""
+edit_captions contra una Bot API local (aiohttp.web en 127.0.0.1) usando el
+telegram.Bot real: ediciones sustituidas mientras otra está en vuelo, el
+salto de ediciones idénticas (solo cambia la hora) y un mensaje que ya no
+se puede editar ni reenviar.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from publishers import telegram_broadcast, telegram_edits, telegram_publisher
+from publishers.telegram_edits import edit_captions
+from services import gasolina_state
+
+MESSAGES = [(-100 - i, None, 10 + i) for i in range(3)]
+GONE     = -999        # editMessageCaption y sendPhoto fallan: mensaje borrado y chat inaccesible
+DELAY    = 0.05        # Latencia de cada edición en la Bot API local
+
+
+def _caption(hora: str, precio: str) -> str:
+    return f"⛽️ <b>#Gasolina Zaragoza ({hora})</b>\n\nGasoleo A: {precio}"
+
+
+@pytest.fixture
+def bot_api(tmp_db, tmp_path, monkeypatch, local_server):
+    """
+    Bot API local que responde a getMe, editMessageCaption y sendPhoto y
+    apunta cada llamada. Uso: bot_api(scenario) con `async def scenario(app, calls)`.
+    """
+    from aiohttp import web
+    from telegram import Bot
+
+    monkeypatch.setattr(gasolina_state, "_cache", None)
+    monkeypatch.setattr(gasolina_state, "_flush_handle", None)
+    monkeypatch.setattr(gasolina_state, "LEGACY_STATE_FILE", str(tmp_path / "gasolina_state.json"))
+    gasolina_state._dirty.clear()
+    monkeypatch.setattr(telegram_publisher, "_digest_cache", {})
+    monkeypatch.setattr(telegram_edits, "_pending", {})
+    monkeypatch.setattr(telegram_edits, "_workers", {})
+    monkeypatch.setattr(telegram_edits, "_sent_hashes", None)
+    for rate in ("GLOBAL_RATE", "GROUP_RATE", "GROUP_BURST"):
+        monkeypatch.setattr(telegram_broadcast, rate, 1000)
+    monkeypatch.setattr(telegram_broadcast, "_global_bucket", None)
+    monkeypatch.setattr(telegram_broadcast, "_chat_buckets", {})
+    image = tmp_path / "image.jpg"
+    image.write_bytes(b"\xff\xd8" + b"x" * 1000)
+
+    async def run(scenario):
+        calls = []   # (método, chat_id, message_id, caption)
+
+        async def handler(request):
+            method = request.match_info["method"]
+            if method == "getMe":
+                return web.json_response({"ok": True, "result": {
+                    "id": 123, "is_bot": True, "first_name": "Gasolina", "username": "gasolina_bot",
+                }})
+            data = await request.post()
+            chat_id = int(data["chat_id"])
+            calls.append((method, chat_id, data.get("message_id") and int(data["message_id"]), data["caption"]))
+            await asyncio.sleep(DELAY)
+            if chat_id == GONE:
+                description = "message to edit not found" if method == "editMessageCaption" else "chat not found"
+                return web.json_response(
+                    {"ok": False, "error_code": 400, "description": f"Bad Request: {description}"}, status=400)
+            return web.json_response({"ok": True, "result": {
+                "message_id": int(data.get("message_id", 500)), "date": 0, "caption": data["caption"],
+                "chat": {"id": chat_id, "type": "supergroup"},
+            }})
+
+        api = web.Application()
+        api.router.add_post("/bot{token}/{method}", handler)
+        async with local_server(api) as (base,):
+            async with Bot("123:test", base_url=f"{base}/bot") as bot:
+                app = SimpleNamespace(bot=bot, image=str(image))
+                return await scenario(app, calls)
+
+    return lambda scenario: asyncio.run(run(scenario))
+
+
+def test_edits_queued_while_in_flight_are_coalesced(bot_api):
+    async def scenario(app, calls):
+        first = asyncio.create_task(edit_captions(app, MESSAGES, _caption("12:10", "1,389 €"), app.image))
+        await asyncio.sleep(DELAY / 5)   # La primera edición de cada mensaje ya está en vuelo
+        rest = [edit_captions(app, MESSAGES, _caption(f"12:1{i}", f"1,37{i} €"), app.image) for i in range(1, 4)]
+        return await asyncio.gather(first, *rest), calls
+
+    results, calls = bot_api(scenario)
+
+    expected = {(c, t): m for c, t, m in MESSAGES}
+    assert all(r == expected for r in results)
+    # Por mensaje: la edición en vuelo y la última pedida; las dos intermedias nunca llegan a la API
+    for chat_id, _, message_id in MESSAGES:
+        captions = [caption for method, c, m, caption in calls if (c, m) == (chat_id, message_id)]
+        assert captions == [_caption("12:10", "1,389 €"), _caption("12:13", "1,373 €")]
+    assert not telegram_edits._pending and not telegram_edits._workers
+
+
+def test_identical_body_is_skipped(bot_api):
+    async def scenario(app, calls):
+        for hora in ("12:10", "13:10", "14:10"):
+            caption = _caption(hora, "1,389 €")
+            await edit_captions(app, MESSAGES, caption, app.image, body=caption.split("\n", 1)[-1])
+        edited = len(calls)
+        # Sin body se compara el caption completo: la hora nueva sí se envía
+        await edit_captions(app, MESSAGES, _caption("15:10", "1,389 €"), app.image)
+        return edited, len(calls)
+
+    edited, total = bot_api(scenario)
+    assert edited == len(MESSAGES)          # Solo la primera hora; las otras dos son idénticas
+    assert total == 2 * len(MESSAGES)
+    # Los hashes se guardan en el estado: tras un reinicio siguen evitando la llamada
+    assert len(gasolina_state.get_state(telegram_edits.CAPTION_HASHES_KEY)) == len(MESSAGES)
+
+
+def test_failed_edit_drops_its_pending_edits(bot_api):
+    async def scenario(app, calls):
+        messages = [(GONE, None, 7)]
+        first = asyncio.create_task(edit_captions(app, messages, _caption("12:10", "1,389 €"), app.image))
+        await asyncio.sleep(DELAY / 5)   # Edición en vuelo: la siguiente queda pendiente
+        queued = await edit_captions(app, messages, _caption("12:11", "1,379 €"), app.image)
+        assert await first == queued == {(GONE, None): None}
+        assert not telegram_edits._pending and not telegram_edits._workers
+        tried = len(calls)
+        # La siguiente hora vuelve a intentarlo desde cero
+        again = await edit_captions(app, messages, _caption("13:10", "1,379 €"), app.image)
+        return tried, again, [(method, caption) for method, _, _, caption in calls]
+
+    tried, again, calls = bot_api(scenario)
+    assert again == {(GONE, None): None}
+    # editMessageCaption y el reenvío de la foto para la primera edición; la encolada se descarta
+    assert tried == 2
+    assert calls[2:] == [("editMessageCaption", _caption("13:10", "1,379 €")),
+                         ("sendPhoto", _caption("13:10", "1,379 €"))]
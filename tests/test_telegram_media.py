@@ -0,0 +1,68 @@
+# tests/test_telegram_media.py
+"""
+Caché de file_id de send_telegram_photo: reutilización, invalidación solo
+cuando Telegram rechaza el file_id y errores ajenos a la foto.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+from publishers import telegram_publisher
+from publishers.telegram_publisher import send_telegram_photo
+from services import gasolina_state
+
+
+@pytest.fixture
+def app(tmp_db, tmp_path, monkeypatch):
+    """Bot de pega: la subida devuelve un file_id; con file_id falla si `reject` lo indica."""
+    monkeypatch.setattr(gasolina_state, "_cache", None)
+    monkeypatch.setattr(gasolina_state, "_flush_handle", None)
+    monkeypatch.setattr(gasolina_state, "LEGACY_STATE_FILE", str(tmp_path / "gasolina_state.json"))
+    gasolina_state._dirty.clear()
+    monkeypatch.setattr(telegram_publisher, "_digest_cache", {})
+    image = tmp_path / "image.jpg"
+    image.write_bytes(b"\xff\xd8" + b"x" * 1000)
+    calls = []
+
+    async def send_photo(chat_id, photo, caption, parse_mode, **kw):
+        uploaded = not isinstance(photo, str)
+        calls.append("upload" if uploaded else photo)
+        if not uploaded and bot.reject:
+            raise BadRequest(bot.reject)
+        return SimpleNamespace(message_id=len(calls), photo=[SimpleNamespace(file_id=f"id{len(calls)}")])
+
+    bot = SimpleNamespace(id=42, send_photo=send_photo, reject=None)
+    return SimpleNamespace(bot=bot, image=str(image), calls=calls)
+
+
+def _send(app, chat_id=-1):
+    return asyncio.run(send_telegram_photo(app, chat_id, None, "hola", app.image))
+
+
+def test_file_id_is_reused(app):
+    assert _send(app) == 1
+    assert _send(app) == 2
+    assert app.calls == ["upload", "id1"]
+
+
+def test_rejected_file_id_is_invalidated_and_uploaded_again(app):
+    _send(app)
+    app.bot.reject = "Bad Request: wrong file identifier/HTTP URL specified"
+    assert _send(app) == 3
+    assert app.calls == ["upload", "id1", "upload"]
+    app.bot.reject = None
+    _send(app)
+    assert app.calls[-1] == "id3"
+
+
+@pytest.mark.parametrize("error", ["Bad Request: chat not found", "Bad Request: message caption is too long"])
+def test_other_bad_requests_keep_the_cached_file_id(app, error):
+    _send(app)
+    app.bot.reject = error
+    assert _send(app) is None                 # Sin resubir la foto a un chat que no la acepta
+    assert app.calls == ["upload", "id1"]
+    app.bot.reject = None
+    _send(app)
+    assert app.calls[-1] == "id1"
@@ -0,0 +1,302 @@
+# tests/test_x_browser.py
+"""
+Sesión de Firefox persistente (services/x_browser.py) contra una página
+local que imita x.com (/home con sesión, redirección a login sin ella).
+El WebDriver es de pega: cada navegador es un árbol geckodriver -> firefox
+de procesos reales (tests/fixtures/fake_browser.py) para medir su RSS, y el
+arranque en frío de Firefox se modela con LAUNCH_DELAY. Benchmark de
+tiempo hasta publicar y pico de RSS frente al flujo anterior (un Firefox
+nuevo por post, con cookies.json inyectadas siempre).
+"""
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from selenium.common.exceptions import NoSuchElementException
+
+from conftest import FIXTURES
+from services import x_browser
+
+LAUNCH_DELAY = 0.3       # Arranque en frío de Firefox (aquí no existe)
+PAGE_DELAY   = 0.03      # Carga de una página de x.com
+GECKO_MB, FIREFOX_MB = 5, 120
+POSTS = 6
+
+
+class _XPage(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(PAGE_DELAY)
+        if self.path == "/home" and "auth_token=" not in self.headers.get("Cookie", ""):
+            self.send_response(302)
+            self.send_header("Location", "/i/flow/login")
+            self.end_headers()
+            return
+        body = (b'<div data-testid="primaryColumn"><div data-testid="tweetTextarea_0"></div>'
+                b'<input data-testid="fileInput"><button data-testid="tweetButtonInline"></button></div>')
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+class _Element:
+    """WebElement mínimo: lo que post_to_x lee y escribe del composer, el input y los botones."""
+
+    def __init__(self, driver, key: str):
+        self.driver, self.key, self.typed = driver, key, ""
+
+    @property
+    def text(self) -> str:
+        return self.typed
+
+    def send_keys(self, value: str) -> None:
+        self.typed += value
+        if self.key == "fileInput":
+            self.driver._shown.add("Remove media")   # Preview de la imagen subida
+
+    def is_displayed(self) -> bool:
+        return True
+
+    def is_enabled(self) -> bool:
+        return True
+
+
+class StandInDriver:
+    """Lo que x_browser usa de selenium.webdriver.Firefox, contra la página local."""
+
+    def __init__(self, base: str, profile: str | None):
+        started = time.monotonic()
+        child = ["--child", str(FIREFOX_MB)] + (["-profile", profile] if profile else [])
+        process = subprocess.Popen(
+            ["geckodriver", os.path.join(FIXTURES, "fake_browser.py"), str(GECKO_MB), *child],
+            executable=sys.executable,
+        )
+        self.service = type("Service", (), {"process": process})()
+        # Como webdriver.Firefox(): vuelve con Firefox ya arrancado
+        while x_browser._tree_rss_mb(process.pid) < GECKO_MB + FIREFOX_MB:
+            time.sleep(0.01)
+        time.sleep(max(0.0, LAUNCH_DELAY - (time.monotonic() - started)))
+        self._base, self._profile = base, profile
+        self._jar = {}
+        if profile and os.path.exists(os.path.join(profile, "cookies.json")):
+            with open(os.path.join(profile, "cookies.json")) as f:
+                self._jar = json.load(f)
+        self._opener = urllib.request.build_opener(_NoRedirect)
+        self.current_url, self.page_source = "about:blank", ""
+        self._elements, self._shown = {}, set()   # Elementos ya buscados y los que la UI muestra tras una acción
+
+    def get(self, url: str) -> None:
+        path = url.removeprefix("https://x.com") or "/"
+        while True:
+            request = urllib.request.Request(self._base + path)
+            request.add_header("Cookie", "; ".join(f"{k}={v}" for k, v in self._jar.items()))
+            try:
+                with self._opener.open(request) as response:
+                    self.page_source = response.read().decode()
+                break
+            except urllib.error.HTTPError as e:
+                if e.code != 302:
+                    raise
+                path = e.headers["Location"]
+        self.current_url = "https://x.com" + path
+
+    def find_elements(self, by, selector: str) -> list:
+        # data-testid o aria-label de cada alternativa del selector, si la página lo tiene
+        keys = re.findall(r"(?:data-testid|aria-label)\*?='([^']+)'", selector)
+        return [self._elements.setdefault(k, _Element(self, k)) for k in keys
+                if f'data-testid="{k}"' in self.page_source or k in self._shown][:1]
+
+    def find_element(self, by, selector: str):
+        found = self.find_elements(by, selector)
+        if not found:
+            raise NoSuchElementException(selector)
+        return found[0]
+
+    def execute_script(self, script: str, *args):
+        if "click()" in script and args and args[0].key == "tweetButtonInline":
+            time.sleep(PAGE_DELAY)   # La petición que publica el post
+            self._elements["tweetTextarea_0"].typed = ""
+            self._shown.add("toast")
+        return "complete"
+
+    @property
+    def window_handles(self) -> list:
+        return ["main"] if self.service.process.poll() is None else []
+
+    def add_cookie(self, cookie: dict) -> None:
+        self._jar[cookie["name"]] = cookie["value"]
+        if self._profile:
+            with open(os.path.join(self._profile, "cookies.json"), "w") as f:
+                json.dump(self._jar, f)
+
+    def quit(self) -> None:
+        for pid in reversed(x_browser._tree(self.service.process.pid)):
+            try:
+                os.kill(pid, 9)
+            except OSError:
+                pass
+        self.service.process.wait()
+
+
+@pytest.fixture
+def x_site(tmp_path, monkeypatch):
+    """Página local, cookies.json y un x_browser limpio que lanza StandInDriver."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _XPage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    cookies = tmp_path / "cookies.json"
+    cookies.write_text(json.dumps([{"name": "auth_token", "value": "abc", "sameSite": "Lax"}]))
+    profile = tmp_path / "x_profile"
+    monkeypatch.setattr(x_browser, "COOKIES_FILE", str(cookies))
+    monkeypatch.setattr(x_browser, "X_PROFILE_DIR", str(profile))
+    monkeypatch.setattr(x_browser, "_launch", lambda headless: StandInDriver(base, str(profile)))
+    monkeypatch.setattr(x_browser, "_driver", None)
+    monkeypatch.setattr(x_browser, "_posts", 0)
+    monkeypatch.setattr(x_browser, "_peak_rss_mb", 0.0)
+    profile.mkdir()
+    yield base
+    x_browser.close_browser()
+    server.shutdown()
+
+
+def _warm_post() -> float:
+    """Un post con la sesión persistente: lo que hace post_to_x con el navegador."""
+    timer = x_browser.PhaseTimer()
+    driver = x_browser.acquire_driver(True, timer)
+    ok = bool(driver.find_elements(None, "div[data-testid='tweetTextarea_0']"))
+    x_browser.release_driver(ok)
+    return timer.total
+
+
+def _legacy_post(base: str) -> tuple[float, float]:
+    """Flujo anterior: Firefox nuevo sin perfil, x.com, cookies, /home y quit."""
+    started = time.monotonic()
+    driver = StandInDriver(base, None)
+    driver.get("https://x.com")
+    with open(x_browser.COOKIES_FILE) as f:
+        for c in json.load(f):
+            driver.add_cookie(c)
+    driver.get(x_browser.X_HOME)
+    assert driver.find_elements(None, "div[data-testid='tweetTextarea_0']")
+    elapsed = time.monotonic() - started
+    rss = x_browser._tree_rss_mb(driver.service.process.pid)
+    driver.quit()
+    return elapsed, rss
+
+
+def test_profile_keeps_the_session(x_site):
+    _warm_post()
+    x_browser.close_browser()
+    driver = x_browser.acquire_driver(True)
+    try:
+        assert driver.current_url == x_browser.X_HOME   # Sin pasar por login ni cookies.json
+    finally:
+        x_browser.release_driver(True)
+
+
+def test_recycled_after_max_posts_and_rss(x_site, monkeypatch):
+    monkeypatch.setattr(x_browser, "X_BROWSER_MAX_POSTS", 2)
+    launches = []
+    first = x_browser._driver
+    for _ in range(3):
+        _warm_post()
+        launches.append(x_browser._driver)
+    assert launches[0] is not first and launches[1] is None and launches[2] is not None
+
+    monkeypatch.setattr(x_browser, "X_BROWSER_MAX_POSTS", 100)
+    monkeypatch.setattr(x_browser, "X_BROWSER_MAX_RSS_MB", FIREFOX_MB / 2)
+    _warm_post()
+    assert x_browser._driver is None and x_browser.get_browser_stats()["peak_rss_mb"] > FIREFOX_MB / 2
+
+
+def test_warm_session_vs_new_firefox_per_post(x_site):
+    """Benchmark: POSTS posts seguidos, tiempo hasta publicar y pico de RSS."""
+    legacy = [_legacy_post(x_site) for _ in range(POSTS)]
+    legacy_s = [t for t, _ in legacy]
+    legacy_rss = max(rss for _, rss in legacy)
+
+    warm_s = []
+    for _ in range(POSTS):
+        warm_s.append(_warm_post())
+    warm_rss = x_browser.get_browser_stats()["peak_rss_mb"]
+
+    print(
+        f"\n[x_browser] {POSTS} posts: antes {sum(legacy_s) / POSTS * 1000:.0f} ms/post, "
+        f"pico {legacy_rss:.0f} MB | sesión caliente primero {warm_s[0] * 1000:.0f} ms, "
+        f"luego {sum(warm_s[1:]) / (POSTS - 1) * 1000:.0f} ms/post, pico {warm_rss:.0f} MB"
+    )
+    assert max(warm_s[1:]) * 3 < min(legacy_s)
+    # Un solo navegador vivo en ambos casos: la sesión caliente no acumula memoria
+    assert warm_rss < legacy_rss * 1.2
+
+
+def test_post_median_vs_fixed_sleeps(x_site, monkeypatch):
+    """Benchmark: post_to_x completo (texto e imagen) contra la página local; mediana por post."""
+    from services import x_selenium
+
+    monkeypatch.setattr(x_selenium, "IS_PROD", True)
+    monkeypatch.setattr(x_browser, "_post_times", x_browser.deque(maxlen=50))
+    for i in range(POSTS):
+        assert x_selenium.post_to_x(f"Post {i}", image_bytes=b"\xff\xd8jpg")
+    median = statistics.median(x_browser._post_times)
+
+    # Lo que dormía el flujo anterior en cada post con imagen, aparte de las esperas reales
+    legacy_sleeps = 1 + 1 + 2 + 0.5 + 3
+    print(f"\n[x_post] {POSTS} posts: mediana {median * 1000:.0f} ms/post (antes {legacy_sleeps:.1f} s solo en sleeps fijos)")
+    assert len(x_browser._post_times) == POSTS
+    assert median < legacy_sleeps / 10
+
+
+def test_phase_timer_accumulates_per_phase(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(x_browser, "time", type("Clock", (), {"monotonic": staticmethod(lambda: now[0])}))
+    timer = x_browser.PhaseTimer()
+    for phase, elapsed in [("launch", 1.234), ("navigation", 0.5), ("navigation", 0.25)]:
+        now[0] += elapsed
+        timer.mark(phase)
+    now[0] += 0.1
+
+    assert timer.phases == {"launch": 1.23, "navigation": 0.75}   # Una fase repetida suma
+    assert timer.total == 2.08
+
+
+def test_record_post_metrics_median_of_successful_posts(monkeypatch):
+    lines = []
+    monkeypatch.setattr(x_browser, "_post_times", x_browser.deque(maxlen=3))
+    monkeypatch.setattr(x_browser, "browser_rss_mb", lambda: 321.6)
+    monkeypatch.setattr(x_browser, "logger", type("Log", (), {"info": staticmethod(lines.append)}))
+
+    def record(total: float, ok: bool):
+        timer = x_browser.PhaseTimer()
+        timer.start -= total
+        timer.phases = {"submitted": total}
+        x_browser.record_post_metrics(timer, ok=ok, reused=True)
+        return json.loads(lines[-1].removeprefix("[X/Metrics] "))
+
+    record(1.0, True)
+    record(3.0, True)
+    failed = record(30.0, False)                 # Un fallo no entra en la mediana
+    assert failed == {"ok": False, "reused": True, "total": 30.0, "median_recent": 2.0,
+                      "rss_mb": 322, "phases": {"submitted": 30.0}}
+    for total in (5.0, 6.0):                     # Solo los últimos posts (maxlen)
+        last = record(total, True)
+    assert last["median_recent"] == 5.0 and list(x_browser._post_times) == [3.0, 5.0, 6.0]
@@ -0,0 +1,80 @@
+# tests/test_x_packer.py
+import time
+
+import pytest
+
+from services.gasolina_x_packer import STEPS, _station, pack_fuel_lines, parse_tweet, render_lines
+
+ENTRIES = [
+    ("Gasolina 95 E5",  "1,459 €", "Estación de Servicio Petroprix La Mesa, S.L."),
+    ("Gasolina 98 E5",  "1,589 €", "Cooperativa del Campo de Cariñena"),
+    ("Gasoleo A",       "1,389 €", "Plenoil Casa"),
+    ("Gasoleo Premium", "1,499 €", "Repsol Mensa"),
+]
+
+
+@pytest.mark.parametrize("name, expected", [
+    # Nombres que terminan en "sa"/"sl" sin ser sufijo societario
+    ("Petroprix La Mesa", "Petroprix La Mesa"),
+    ("Plenoil Casa", "Plenoil Casa"),
+    ("Repsol Mensa", "Repsol Mensa"),
+    # Sufijos societarios separados del nombre
+    ("Gasolinera Pepe, S.L.", "Gas. Pepe"),
+    ("Carburantes Ebro SA", "Carb. Ebro"),
+    ("Hermanos Gil S.L.U.", "Hermanos Gil"),
+    ("Estación de Servicio Las Fuentes", "E.S. Las Fuentes"),
+])
+def test_station_abbreviation(name, expected):
+    assert _station(name, 1) == expected
+
+
+def test_station_truncation_levels():
+    name = "Estación de Servicio Petroprix La Mesa"
+    assert _station(name, 0) == name
+    assert _station(name, 2) == "E.S. Petroprix"   # Sin conector colgando ("La")
+    assert _station(name, 3) == "E.S."
+    assert _station("Supercarburantesmonegros", 3) == "Supercarbur."
+
+
+def test_ladder_is_monotonic():
+    weights = [parse_tweet(render_lines(ENTRIES, step)).weightedLength for step in STEPS]
+    assert weights == sorted(weights, reverse=True)
+    assert weights[0] > weights[-1]
+
+
+def test_pack_picks_least_abbreviated_step_that_fits():
+    weights = [parse_tweet(render_lines(ENTRIES, step)).weightedLength for step in STEPS]
+    assert pack_fuel_lines(ENTRIES, weights[0]) == render_lines(ENTRIES, STEPS[0])
+    for i in range(1, len(STEPS)):
+        if weights[i] == weights[i - 1]:
+            continue
+        assert pack_fuel_lines(ENTRIES, weights[i - 1] - 1) == render_lines(ENTRIES, STEPS[i])
+    assert pack_fuel_lines(ENTRIES, weights[-1] - 1) is None
+
+
+def test_most_aggressive_step_keeps_every_station():
+    text = render_lines(ENTRIES, STEPS[-1])
+    assert [line.endswith(")") for line in text.splitlines()] == [True] * len(ENTRIES)
+
+
+def test_packer_vs_llm_latency(tmp_db, openrouter_stub, monkeypatch):
+    """Benchmark: escalera local frente al camino LLM (OpenRouter local, caché vacía)."""
+    from services.x_selenium import optimize_recommendation_for_x
+
+    budget = parse_tweet(render_lines(ENTRIES, STEPS[3])).weightedLength
+    runs = 50
+    started = time.perf_counter()
+    for _ in range(runs):
+        assert pack_fuel_lines(ENTRIES, budget) is not None
+    packer_s = (time.perf_counter() - started) / runs
+
+    async def scenario(mode):
+        mode["delay"] = 0.5   # Por debajo de un LLM real (segundos)
+        started = time.perf_counter()
+        text = await optimize_recommendation_for_x(render_lines(ENTRIES, STEPS[0]), budget)
+        return text, time.perf_counter() - started
+
+    text, llm_s = openrouter_stub(scenario)
+    print(f"\n[x_packer] packer={packer_s * 1000:.3f} ms  llm_path={llm_s * 1000:.1f} ms")
+    assert text == "respuesta acortada ok"
+    assert packer_s * 10 < llm_s
@@ -0,0 +1,63 @@
+# tests/test_x_queue.py
+"""
+Cola de publicación en X: el worker sobrevive a un fallo al importar
+Selenium y los callbacks asíncronos terminan aunque nadie los espere.
+"""
+import asyncio
+import gc
+import sys
+import types
+
+import pytest
+
+from publishers import x_publisher
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(x_publisher, "_queue", None)
+    monkeypatch.setattr(x_publisher, "_worker_task", None)
+    monkeypatch.setattr(x_publisher, "_counters", {"done": 0, "failed": 0, "retries": 0})
+    monkeypatch.setattr(x_publisher, "X_MAX_ATTEMPTS", 1)
+    return monkeypatch
+
+
+def _fake_selenium(posted: list) -> types.ModuleType:
+    module = types.ModuleType("services.x_selenium")
+    module.post_to_x = lambda text, image_bytes, headless: posted.append(text) or True
+    return module
+
+
+def test_import_error_fails_the_job_not_the_worker(queue):
+    posted = []
+
+    async def scenario():
+        queue.setitem(sys.modules, "services.x_selenium", None)   # import -> ImportError
+        first = await asyncio.wait_for(x_publisher.enqueue_x_post("uno"), 5)
+        queue.setitem(sys.modules, "services.x_selenium", _fake_selenium(posted))
+        second = await asyncio.wait_for(x_publisher.enqueue_x_post("dos"), 5)
+        x_publisher._worker_task.cancel()
+        return first, second
+
+    assert asyncio.run(scenario()) == (False, True)
+    assert posted == ["dos"] and x_publisher._counters == {"done": 1, "failed": 1, "retries": 0}
+
+
+def test_async_callback_is_kept_alive(queue):
+    queue.setitem(sys.modules, "services.x_selenium", _fake_selenium([]))
+    done = []
+
+    async def on_done(ok):
+        await asyncio.sleep(0.05)
+        gc.collect()
+        await asyncio.sleep(0.05)
+        done.append(ok)
+
+    async def scenario():
+        await x_publisher.enqueue_x_post("tres", on_done=on_done)
+        assert len(x_publisher._pending_callbacks) == 1
+        await asyncio.sleep(0.2)
+        x_publisher._worker_task.cancel()
+
+    asyncio.run(scenario())
+    assert done == [True] and not x_publisher._pending_callbacks
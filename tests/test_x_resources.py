@@ -0,0 +1,154 @@
+# tests/test_x_resources.py
+"""
+Display virtual bajo demanda y limpieza de services/x_resources.py en un
+día simulado (24 horas comprimidas): Xvfb, geckodriver y Firefox son
+procesos reales de pega (tests/fixtures) para medir la memoria residente
+hora a hora, con un post headless, el diario no headless y un Firefox
+huérfano de un post caído.
+"""
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import FIXTURES
+from services import x_browser, x_resources
+
+HOUR        = 0.25                 # Segundos por hora simulada
+REAP_EVERY  = HOUR * 300 / 3600    # X_REAPER_INTERVAL = 300 s
+DISPLAY_NUM = 150                  # Lejos del :99 de producción
+XVFB_MB, GECKO_MB, FIREFOX_MB = 40, 5, 120
+FAKE_BROWSER = os.path.join(FIXTURES, "fake_browser.py")
+
+
+def _wait_rss(pid: int, mb: float) -> None:
+    while x_browser._tree_rss_mb(pid) < mb:
+        time.sleep(0.01)
+
+
+class _Firefox:
+    """webdriver.Firefox de pega: árbol geckodriver -> firefox, sin páginas."""
+
+    def __init__(self, service=None, options=None):
+        args = options.arguments
+        if "--headless" not in args:
+            assert os.environ.get("DISPLAY") == f":{DISPLAY_NUM}"
+        profile = args[args.index("-profile") + 1]
+        process = subprocess.Popen(
+            ["geckodriver", FAKE_BROWSER, str(GECKO_MB), "--child", str(FIREFOX_MB), "-profile", profile],
+            executable=sys.executable,
+        )
+        self.service = SimpleNamespace(process=process)
+        self.window_handles = ["main"]
+        _wait_rss(process.pid, GECKO_MB + FIREFOX_MB)
+
+    def execute_script(self, script: str, *args):
+        return "complete"
+
+    def quit(self) -> None:
+        for pid in reversed(x_browser._tree(self.service.process.pid)):
+            x_resources._kill(pid)
+        self.service.process.wait()
+
+
+@pytest.fixture
+def resources(tmp_path, monkeypatch):
+    """x_browser y x_resources limpios, con Xvfb y Firefox de pega y horas de HOUR segundos."""
+    profile = str(tmp_path / "x_profile")
+    monkeypatch.delenv("DISPLAY", raising=False)
+    monkeypatch.setattr(x_resources, "_external_display", False)
+    monkeypatch.setattr(x_resources, "DISPLAY_NUM", DISPLAY_NUM)
+    monkeypatch.setattr(x_resources, "XVFB_CMD", [sys.executable, os.path.join(FIXTURES, "fake_xvfb.py"), f":{DISPLAY_NUM}", str(XVFB_MB)])
+    monkeypatch.setattr(x_resources, "X_PROFILE_DIR", profile)
+    monkeypatch.setattr(x_resources, "X_BROWSER_IDLE_SECS", HOUR * 900 / 3600)
+    monkeypatch.setattr(x_resources, "X_DISPLAY_IDLE_SECS", HOUR * 300 / 3600)
+    monkeypatch.setattr(x_resources, "_counters", dict.fromkeys(x_resources._counters, 0))
+    monkeypatch.setattr(x_resources, "_peak_rss_mb", 0.0)
+    monkeypatch.setattr(x_browser, "X_PROFILE_DIR", profile)
+    monkeypatch.setattr(x_browser, "webdriver", SimpleNamespace(Firefox=_Firefox))
+    monkeypatch.setattr(x_browser, "_restore_login", lambda driver, timer=None: None)
+    monkeypatch.setattr(x_browser, "_driver", None)
+    monkeypatch.setattr(x_browser, "_posts", 0)
+    leaked = []
+    yield leaked
+    x_browser.close_browser()
+    x_resources.close_display()
+    for process in leaked:
+        process.kill()
+        process.wait()
+
+
+def _post(headless: bool) -> None:
+    x_browser.acquire_driver(headless)
+    x_browser.release_driver(True)
+
+
+def _leak_firefox(leaked: list) -> None:
+    """Firefox con nuestro perfil que sobrevivió a un post caído."""
+    process = subprocess.Popen(
+        ["firefox", FAKE_BROWSER, str(FIREFOX_MB), "-profile", x_resources.X_PROFILE_DIR],
+        executable=sys.executable,
+    )
+    leaked.append(process)
+    _wait_rss(process.pid, FIREFOX_MB)
+
+
+def _leaked_mb(live: set[int]) -> float:
+    return sum(x_resources._rss_mb(p) for p in x_resources._pgrep(x_resources.X_PROFILE_DIR) if p not in live)
+
+
+def test_headless_post_never_starts_a_display(resources):
+    _post(True)
+    assert not x_resources.get_x_resources_stats()["display"] and "DISPLAY" not in os.environ
+    _post(False)
+    assert x_resources.get_x_resources_stats()["display"]
+
+
+def test_orphans_are_reaped_but_the_live_browser_is_not(resources, monkeypatch):
+    monkeypatch.setattr(x_resources, "X_BROWSER_IDLE_SECS", 3600)
+    _post(True)
+    _leak_firefox(resources)
+    live = x_browser.browser_pids()
+    x_resources.reap()
+    assert resources[0].wait(timeout=5) is not None
+    assert x_browser.browser_pids() == live and x_resources.get_x_resources_stats()["reaped"] == 1
+
+
+def test_simulated_day(resources):
+    """Informe: memoria residente (MB) por hora con el job de limpieza cada X_REAPER_INTERVAL."""
+    posts = {9: [True], 10: [False, False]}   # Un post headless y el diario con ventana
+    leak_at = 15
+    rows = []
+    for hour in range(24):
+        for headless in posts.get(hour, []):
+            _post(headless)
+        if hour == leak_at:
+            _leak_firefox(resources)
+        end = time.monotonic() + HOUR
+        peak = x_resources.get_x_resources_stats()["rss_mb"] + _leaked_mb(x_browser.browser_pids())
+        while time.monotonic() < end:
+            stats = x_resources.reap()
+            peak = max(peak, stats["rss_mb"] + _leaked_mb(x_browser.browser_pids()))
+            time.sleep(REAP_EVERY)
+        rows.append((hour, peak, stats["rss_mb"] + _leaked_mb(set()), stats["display"], stats["browser"]))
+
+    stats = x_resources.get_x_resources_stats()
+    browser_mb = GECKO_MB + FIREFOX_MB
+    # Antes: Xvfb desde el arranque todo el día, un Firefox por post y el huérfano sin recoger
+    before = [XVFB_MB + (browser_mb if h in posts else 0) + (FIREFOX_MB if h >= leak_at else 0) for h in range(24)]
+    print("\n[x_resources] hora  pico MB  fin MB  display  navegador  | antes MB")
+    for (hour, peak, end_mb, display, browser), old in zip(rows, before):
+        print(f"[x_resources] {hour:>4}  {peak:7.0f}  {end_mb:6.0f}  {display!s:>7}  {browser!s:>9}  | {old:8.0f}")
+    print(f"[x_resources] MB·h: ahora {sum(r[1] for r in rows):.0f}, antes {sum(before):.0f}; {stats}")
+
+    assert not any(display for hour, _, _, display, _ in rows if hour < 10)
+    assert rows[10][1] >= XVFB_MB + browser_mb * 0.9
+    # Cada recurso se libera en la misma hora en que deja de usarse
+    assert all(end_mb < 1 and not display and not browser for _, _, end_mb, display, browser in rows)
+    assert all(peak < 1 for hour, peak, *_ in rows if hour not in posts and hour != leak_at)
+    assert rows[leak_at][1] >= FIREFOX_MB * 0.9
+    assert (stats["display_starts"], stats["display_stops"], stats["reaped"]) == (1, 1, 1)
+    assert sum(r[1] for r in rows) * 3 < sum(before)